@@ -1,17 +1,26 @@
 """
 CRUD 数据库操作
 """
+import json
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
+from sqlalchemy import case, func, select, update
+from typing import Dict, Iterable, List, Optional, Tuple
 from . import models
 
 
 # ==================== 书籍操作 ====================
 
-def create_book(db: Session, title: str, author: str, file_path: str) -> models.Book:
-    """创建书籍"""
-    book = models.Book(title=title, author=author, file_path=file_path)
+def create_book(
+    db: Session,
+    title: str,
+    author: str,
+    file_path: str,
+    import_status: str = "completed"
+) -> models.Book:
+    """创建书籍（流式导入时 import_status 为 importing，导入结束后改为 completed/failed）"""
+    book = models.Book(title=title, author=author, file_path=file_path, import_status=import_status)
     db.add(book)
     db.commit()
     db.refresh(book)
@@ -54,18 +63,21 @@ def update_book_stats(db: Session, book_id: int):
         db.commit()
 
 
+def finish_book_import(db: Session, book_id: int, status: str = "completed"):
+    """结束导入：记录导入状态（统计已随每批写入累加）"""
+    db.query(models.Book).filter(models.Book.id == book_id).update(
+        {models.Book.import_status: status}, synchronize_session=False
+    )
+    db.commit()
+
+
 def update_book_tts_progress(db: Session, book_id: int):
-    """更新 TTS 进度"""
+    """更新 TTS 进度（读取状态计数，不再扫描段落表）"""
     book = get_book(db, book_id)
     if book:
-        total = db.query(models.Paragraph).filter(
-            models.Paragraph.book_id == book_id
-        ).count()
-        completed = db.query(models.Paragraph).filter(
-            models.Paragraph.book_id == book_id,
-            models.Paragraph.tts_status == "completed"
-        ).count()
-        book.tts_progress = (completed / total * 100) if total > 0 else 0
+        counts = get_status_counts(book)
+        total = sum(counts.values())
+        book.tts_progress = (counts["completed"] / total * 100) if total > 0 else 0
         db.commit()
 
 
@@ -128,6 +140,7 @@ def create_paragraph(
         end_time_ms=end_time_ms
     )
     db.add(paragraph)
+    _apply_status_deltas(db, [(book_id, chapter_id, None, "pending", 1)])
     db.commit()
     db.refresh(paragraph)
     return paragraph
@@ -153,6 +166,11 @@ def create_paragraphs_batch(db: Session, paragraphs_data: List[dict]) -> int:
         paragraphs.append(paragraph)
     
     db.add_all(paragraphs)
+    created = Counter((p.book_id, p.chapter_id) for p in paragraphs)
+    _apply_status_deltas(db, [
+        (book_id, chapter_id, None, "pending", count)
+        for (book_id, chapter_id), count in created.items()
+    ])
     db.commit()
     return len(paragraphs)
 
@@ -176,6 +194,50 @@ def get_book_paragraphs(db: Session, book_id: int) -> List[models.Paragraph]:
     ).order_by(models.Paragraph.chapter_id, models.Paragraph.paragraph_index).all()
 
 
+def get_book_paragraph_summaries(db: Session, book_id: int):
+    """
+    获取书籍所有段落的轻量投影（导出分组用）
+
+    单条查询按章节、段落顺序返回，不加载 content / sentence_timings 等大字段。
+    每行可按属性访问: id, chapter_id, audio_path, audio_duration_ms,
+    estimated_duration_ms, char_count
+    """
+    return db.query(
+        models.Paragraph.id,
+        models.Paragraph.chapter_id,
+        models.Paragraph.audio_path,
+        models.Paragraph.audio_duration_ms,
+        models.Paragraph.estimated_duration_ms,
+        models.Paragraph.char_count,
+    ).join(
+        models.Chapter, models.Chapter.id == models.Paragraph.chapter_id
+    ).filter(
+        models.Paragraph.book_id == book_id
+    ).order_by(
+        models.Chapter.chapter_index, models.Paragraph.paragraph_index
+    ).yield_per(1000)
+
+
+def get_paragraphs_for_lrc(db: Session, paragraph_ids: List[int], chunk_size: int = 500) -> list:
+    """
+    按给定顺序获取生成 LRC 所需的段落字段（分批 IN 查询）
+
+    每行可按属性访问: id, content, sentence_timings, audio_duration_ms, estimated_duration_ms
+    """
+    rows = {}
+    for start in range(0, len(paragraph_ids), chunk_size):
+        chunk = paragraph_ids[start:start + chunk_size]
+        for row in db.query(
+            models.Paragraph.id,
+            models.Paragraph.content,
+            models.Paragraph.sentence_timings,
+            models.Paragraph.audio_duration_ms,
+            models.Paragraph.estimated_duration_ms,
+        ).filter(models.Paragraph.id.in_(chunk)):
+            rows[row.id] = row
+    return [rows[pid] for pid in paragraph_ids if pid in rows]
+
+
 def get_pending_paragraphs(db: Session, book_id: int) -> List[models.Paragraph]:
     """获取待合成的段落"""
     return db.query(models.Paragraph).filter(
@@ -201,7 +263,7 @@ def update_paragraph_audio(
         paragraph.audio_duration_ms = audio_duration_ms
         if sentence_timings is not None:
             paragraph.sentence_timings = sentence_timings
-        paragraph.tts_status = status
+        _set_paragraph_status(db, paragraph, status)
         db.commit()
 
 
@@ -211,11 +273,48 @@ def update_paragraph_status(db: Session, paragraph_id: int, status: str, error:
         models.Paragraph.id == paragraph_id
     ).first()
     if paragraph:
-        paragraph.tts_status = status
+        _set_paragraph_status(db, paragraph, status)
         paragraph.tts_error = error
         db.commit()
 
 
+def bulk_update_paragraph_results(db: Session, rows: List[dict]) -> int:
+    """
+    批量写回段落合成结果（单事务）
+
+    Args:
+        rows: 每项包含主键 'id' 及需要更新的字段；
+              字段集合相同的行合并为一次 executemany
+    """
+    if not rows:
+        return 0
+
+    # 读取旧状态以更新计数（与写入在同一事务内）
+    new_statuses = {row['id']: row['tts_status'] for row in rows if 'tts_status' in row}
+    transitions = []
+    ids = list(new_statuses)
+    for start in range(0, len(ids), 500):
+        for current in db.query(
+            models.Paragraph.id,
+            models.Paragraph.book_id,
+            models.Paragraph.chapter_id,
+            models.Paragraph.tts_status,
+        ).filter(models.Paragraph.id.in_(ids[start:start + 500])):
+            transitions.append((
+                current.book_id, current.chapter_id,
+                current.tts_status, new_statuses[current.id], 1
+            ))
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for group in groups.values():
+        db.execute(update(models.Paragraph), group)
+    _apply_status_deltas(db, transitions)
+    db.commit()
+    return len(rows)
+
+
 def update_chapter(db: Session, chapter_id: int, title: str) -> Optional[models.Chapter]:
     """更新章节标题"""
     chapter = get_chapter(db, chapter_id)
@@ -232,7 +331,7 @@ def update_paragraph(db: Session, paragraph_id: int, content: str) -> Optional[m
         paragraph.content = content
         
         # 重置 TTS 状态
-        paragraph.tts_status = "pending"
+        _set_paragraph_status(db, paragraph, "pending")
         paragraph.audio_path = None
         paragraph.audio_duration_ms = None
         paragraph.sentence_timings = None
@@ -250,6 +349,13 @@ def delete_chapter(db: Session, chapter_id: int) -> bool:
     """删除章节及其关联段落"""
     chapter = get_chapter(db, chapter_id)
     if chapter:
+        # 从书籍计数中扣除该章节的段落
+        _apply_status_deltas(db, [
+            (book_id, None, status, None, count)
+            for book_id, _, status, count in _status_group_counts(
+                db, [models.Paragraph.chapter_id == chapter_id]
+            )
+        ])
         db.delete(chapter)
         db.commit()
         return True
@@ -262,6 +368,7 @@ def delete_paragraph(db: Session, paragraph_id: int) -> bool:
     if paragraph:
         # 更新章节统计
         chapter_id = paragraph.chapter_id
+        _set_paragraph_status(db, paragraph, None)
         db.delete(paragraph)
         db.commit()
         
@@ -269,3 +376,768 @@ def delete_paragraph(db: Session, paragraph_id: int) -> bool:
         update_chapter_stats(db, chapter_id)
         return True
     return False
+
+
+# ==================== 批量导入操作 ====================
+
+def estimate_duration_ms(content: str) -> int:
+    """按每分钟 300 字估算朗读时长"""
+    return int(len(content) / 300 * 60 * 1000)
+
+
+def _paragraph_rows(book_id: int, chapter_id: int, paragraphs: List[dict]) -> List[dict]:
+    """生成段落表的插入参数（字数与估算时长在此计算）"""
+    rows = []
+    for data in paragraphs:
+        rows.append({
+            'book_id': book_id,
+            'chapter_id': chapter_id,
+            'paragraph_index': data['paragraph_index'],
+            'content': data['content'],
+            'char_count': len(data['content']),
+            'estimated_duration_ms': estimate_duration_ms(data['content']),
+            'start_time_ms': data.get('start_time_ms', 0),
+            'end_time_ms': data.get('end_time_ms', 0),
+            'tts_status': "pending",
+        })
+    return rows
+
+
+def _add_book_totals(db: Session, book_id: int, chapters: int, paragraphs: int, duration_ms: int):
+    """累加书籍的章节数、段落数、总时长与待合成计数（不提交）"""
+    db.execute(
+        update(models.Book).where(models.Book.id == book_id).values(
+            total_chapters=func.coalesce(models.Book.total_chapters, 0) + chapters,
+            total_paragraphs=func.coalesce(models.Book.total_paragraphs, 0) + paragraphs,
+            total_duration_ms=func.coalesce(models.Book.total_duration_ms, 0) + duration_ms,
+            pending_paragraphs=func.coalesce(models.Book.pending_paragraphs, 0) + paragraphs,
+        )
+    )
+
+
+def _insert_chapter_rows(db: Session, rows: List[dict]) -> List[int]:
+    """
+    批量插入章节行，按参数顺序返回主键
+
+    executemany + RETURNING 需要 SQLAlchemy >= 2.0.10 与 SQLite >= 3.35；
+    方言不支持时逐行插入（章节数远少于段落数）。
+    """
+    table = models.Chapter.__table__
+    if getattr(db.get_bind().dialect, "insert_executemany_returning_sort_by_parameter_order", False):
+        return db.execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+    return [db.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+
+def bulk_insert_chapters(db: Session, book_id: int, chapters: List[dict]) -> Dict:
+    """
+    批量插入章节及其段落（Core executemany，不经过 ORM 对象，不提交）
+
+    Args:
+        chapters: [{'chapter_index', 'title', 'paragraphs': [
+            {'paragraph_index', 'content', 'start_time_ms', 'end_time_ms'}, ...]}, ...]
+            延迟解码的章节另带 'decode_status': 'pending', 'page_start', 'page_end'，段落为空
+
+    章节的段落数/待合成数、书籍的章节数/段落数/总时长在内存中计算，
+    随插入一起累加到书籍，不再 COUNT 重新统计。
+
+    Returns:
+        本次插入的 {'chapters', 'paragraphs', 'duration_ms', 'chapter_ids'}
+    """
+    stats = {'chapters': len(chapters), 'paragraphs': 0, 'duration_ms': 0, 'chapter_ids': []}
+    if not chapters:
+        return stats
+
+    chapter_ids = _insert_chapter_rows(db, [
+        {
+            'book_id': book_id,
+            'chapter_index': chapter['chapter_index'],
+            'title': chapter.get('title', ""),
+            'total_paragraphs': len(chapter['paragraphs']),
+            'pending_paragraphs': len(chapter['paragraphs']),
+            'processing_paragraphs': 0,
+            'completed_paragraphs': 0,
+            'failed_paragraphs': 0,
+            'decode_status': chapter.get('decode_status', "decoded"),
+            'page_start': chapter.get('page_start'),
+            'page_end': chapter.get('page_end'),
+        }
+        for chapter in chapters
+    ])
+    stats['chapter_ids'] = chapter_ids
+
+    paragraph_rows = []
+    for chapter_id, chapter in zip(chapter_ids, chapters):
+        paragraph_rows.extend(_paragraph_rows(book_id, chapter_id, chapter['paragraphs']))
+    stats['paragraphs'] = len(paragraph_rows)
+    stats['duration_ms'] = sum(row['estimated_duration_ms'] for row in paragraph_rows)
+
+    if paragraph_rows:
+        db.execute(models.Paragraph.__table__.insert(), paragraph_rows)
+
+    _add_book_totals(db, book_id, stats['chapters'], stats['paragraphs'], stats['duration_ms'])
+    return stats
+
+
+def append_chapter_paragraphs(db: Session, book_id: int, chapter_id: int, paragraphs: List[dict]) -> Dict[str, int]:
+    """
+    向已插入的章节追加段落（不提交）
+
+    流式导入时超长章节按段落分批写入，后续批次通过此函数追加，
+    同时累加章节与书籍的段落数、待合成数和总时长。
+
+    Returns:
+        本次追加的 {'paragraphs', 'duration_ms'}
+    """
+    rows = _paragraph_rows(book_id, chapter_id, paragraphs)
+    stats = {'paragraphs': len(rows), 'duration_ms': sum(row['estimated_duration_ms'] for row in rows)}
+    if not rows:
+        return stats
+
+    db.execute(models.Paragraph.__table__.insert(), rows)
+    db.execute(
+        update(models.Chapter).where(models.Chapter.id == chapter_id).values(
+            total_paragraphs=func.coalesce(models.Chapter.total_paragraphs, 0) + len(rows),
+            pending_paragraphs=func.coalesce(models.Chapter.pending_paragraphs, 0) + len(rows),
+        )
+    )
+    _add_book_totals(db, book_id, 0, stats['paragraphs'], stats['duration_ms'])
+    return stats
+
+
+def fill_chapter_paragraphs(db: Session, chapter: models.Chapter, paragraphs: List[dict]) -> int:
+    """
+    写入延迟解码章节的段落并标记为已解码（不提交）
+
+    以 decode_status != 'decoded' 为条件更新章节，已被其他会话解码时不重复写入。
+    创建整书任务时未解码章节的段落不在 total 中，解码后计入该书未结束的整书任务。
+
+    Returns:
+        写入的段落数；章节已解码时返回 -1
+    """
+    rows = _paragraph_rows(chapter.book_id, chapter.id, paragraphs)
+    claimed = db.query(models.Chapter).filter(
+        models.Chapter.id == chapter.id,
+        models.Chapter.decode_status != "decoded"
+    ).update({
+        models.Chapter.decode_status: "decoded",
+        models.Chapter.total_paragraphs: len(rows),
+        models.Chapter.pending_paragraphs: len(rows),
+    }, synchronize_session=False)
+    if not claimed:
+        return -1
+
+    if rows:
+        db.execute(models.Paragraph.__table__.insert(), rows)
+        db.query(models.TTSJob).filter(
+            models.TTSJob.book_id == chapter.book_id,
+            models.TTSJob.scope == "book",
+            models.TTSJob.status.in_(ACTIVE_JOB_STATUSES)
+        ).update({models.TTSJob.total: models.TTSJob.total + len(rows)}, synchronize_session=False)
+    _add_book_totals(db, chapter.book_id, 0, len(rows), sum(row['estimated_duration_ms'] for row in rows))
+    return len(rows)
+
+
+def rebase_chapter_timelines(db: Session, book_id: int) -> int:
+    """
+    按章节顺序平移已解码章节的段落时间轴（不提交）
+
+    延迟章节解码时时间轴从 0 起算；平移后每章紧接前面已解码章节的结束时间，
+    全部解码后与完整导入的时间轴一致。章节乱序解码时，先解码的后续章节在前面章节解码后再次平移。
+
+    Returns:
+        平移的章节数
+    """
+    rows = db.query(
+        models.Chapter.id,
+        func.min(models.Paragraph.start_time_ms),
+        func.sum(models.Paragraph.estimated_duration_ms)
+    ).outerjoin(
+        models.Paragraph, models.Paragraph.chapter_id == models.Chapter.id
+    ).filter(
+        models.Chapter.book_id == book_id
+    ).group_by(models.Chapter.id).order_by(models.Chapter.chapter_index).all()
+
+    shifted = 0
+    offset = 0
+    for chapter_id, start_ms, duration_ms in rows:
+        if start_ms is None:
+            continue
+        if start_ms != offset:
+            delta = offset - start_ms
+            db.query(models.Paragraph).filter(models.Paragraph.chapter_id == chapter_id).update({
+                models.Paragraph.start_time_ms: models.Paragraph.start_time_ms + delta,
+                models.Paragraph.end_time_ms: models.Paragraph.end_time_ms + delta,
+            }, synchronize_session=False)
+            shifted += 1
+        offset += duration_ms or 0
+    return shifted
+
+
+def set_chapter_decode_status(db: Session, chapter_id: int, status: str):
+    """更新章节解码状态"""
+    db.query(models.Chapter).filter(models.Chapter.id == chapter_id).update(
+        {models.Chapter.decode_status: status}, synchronize_session=False
+    )
+    db.commit()
+
+
+def get_next_undecoded_chapter(
+    db: Session,
+    book_id: int,
+    chapter_id: int = None,
+    statuses: Tuple[str, ...] = ("pending",)
+) -> Optional[models.Chapter]:
+    """按章节顺序获取下一个待解码的章节（chapter_id 指定时只看该章节）"""
+    query = db.query(models.Chapter).filter(
+        models.Chapter.book_id == book_id,
+        models.Chapter.decode_status.in_(statuses)
+    )
+    if chapter_id is not None:
+        query = query.filter(models.Chapter.id == chapter_id)
+    return query.order_by(models.Chapter.chapter_index).first()
+
+
+def get_books_with_undecoded_chapters(db: Session) -> List[int]:
+    """有待解码章节的书籍 ID（启动时恢复后台预取）"""
+    rows = db.query(models.Chapter.book_id).filter(
+        models.Chapter.decode_status == "pending"
+    ).distinct().all()
+    return [row[0] for row in rows]
+
+
+def count_undecoded_chapters(
+    db: Session,
+    book_id: int,
+    statuses: Tuple[str, ...] = ("pending", "failed")
+) -> int:
+    """书籍中尚未解码的章节数（默认包括待解码与解码失败）"""
+    return db.query(models.Chapter).filter(
+        models.Chapter.book_id == book_id,
+        models.Chapter.decode_status.in_(statuses)
+    ).count()
+
+
+def bulk_import_book(
+    db: Session,
+    title: str,
+    author: str,
+    file_path: str,
+    chapters: List[dict]
+) -> int:
+    """
+    在一个事务中导入整本书（书籍、章节、段落各一次批量插入，只提交一次）
+
+    chapters 格式同 bulk_insert_chapters；失败时整体回滚，不留下不完整的书籍。
+
+    Returns:
+        书籍 ID
+    """
+    try:
+        book_id = db.execute(
+            models.Book.__table__.insert().returning(models.Book.__table__.c.id),
+            {'title': title, 'author': author, 'file_path': file_path, 'import_status': "completed"}
+        ).scalar_one()
+        bulk_insert_chapters(db, book_id, chapters)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return book_id
+
+
+# ==================== 合成任务操作 ====================
+
+# 仍需 worker 处理（或可恢复）的任务状态
+ACTIVE_JOB_STATUSES = ("queued", "running", "paused")
+
+# 任务范围对应的优先级（数值越小越优先，与 TTS 限流器的优先级一致）：
+# 单章与选中段落由编辑器发起，优先于整本书的后台合成
+JOB_SCOPE_PRIORITY = {"chapter": 1, "batch": 1, "book": 2}
+DEFAULT_JOB_PRIORITY = 2
+
+
+def get_job_priority(job: models.TTSJob) -> int:
+    """任务的调度优先级"""
+    return JOB_SCOPE_PRIORITY.get(job.scope, DEFAULT_JOB_PRIORITY)
+
+
+def _job_priority_order():
+    return case(JOB_SCOPE_PRIORITY, value=models.TTSJob.scope, else_=DEFAULT_JOB_PRIORITY)
+
+
+def create_tts_job(
+    db: Session,
+    book_id: int,
+    scope: str = "book",
+    voice: str = "zh-CN-XiaoxiaoNeural",
+    max_concurrent: int = 5,
+    chapter_id: int = None,
+    paragraph_ids: List[int] = None,
+    total: int = 0
+) -> models.TTSJob:
+    """创建合成任务（进入队列等待 worker 领取）"""
+    job = models.TTSJob(
+        book_id=book_id,
+        scope=scope,
+        chapter_id=chapter_id,
+        paragraph_ids=json.dumps(paragraph_ids) if paragraph_ids is not None else None,
+        voice=voice,
+        max_concurrent=max_concurrent,
+        total=total,
+        status="queued"
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_tts_job(db: Session, job_id: int) -> Optional[models.TTSJob]:
+    """获取合成任务"""
+    return db.query(models.TTSJob).filter(models.TTSJob.id == job_id).first()
+
+
+def get_book_tts_jobs(db: Session, book_id: int, limit: int = 20) -> List[models.TTSJob]:
+    """获取书籍最近的合成任务"""
+    return db.query(models.TTSJob).filter(
+        models.TTSJob.book_id == book_id
+    ).order_by(models.TTSJob.id.desc()).limit(limit).all()
+
+
+def get_active_tts_job(
+    db: Session,
+    book_id: int,
+    scope: str,
+    chapter_id: int = None
+) -> Optional[models.TTSJob]:
+    """获取同范围内尚未结束的任务（避免重复入队）"""
+    query = db.query(models.TTSJob).filter(
+        models.TTSJob.book_id == book_id,
+        models.TTSJob.scope == scope,
+        models.TTSJob.status.in_(ACTIVE_JOB_STATUSES)
+    )
+    if chapter_id is not None:
+        query = query.filter(models.TTSJob.chapter_id == chapter_id)
+    return query.order_by(models.TTSJob.id).first()
+
+
+def _job_paragraph_filters(job: models.TTSJob) -> list:
+    """任务范围对应的段落过滤条件"""
+    filters = [models.Paragraph.book_id == job.book_id]
+    if job.scope == "chapter":
+        filters.append(models.Paragraph.chapter_id == job.chapter_id)
+    elif job.scope == "batch":
+        filters.append(models.Paragraph.id.in_(json.loads(job.paragraph_ids or "[]")))
+    return filters
+
+
+def get_job_pending_paragraphs(db: Session, job: models.TTSJob, limit: int = 100) -> List[models.Paragraph]:
+    """获取任务范围内的下一批待合成段落"""
+    return db.query(models.Paragraph).filter(
+        *_job_paragraph_filters(job),
+        models.Paragraph.tts_status == "pending"
+    ).order_by(models.Paragraph.id).limit(limit).all()
+
+
+def claim_job_paragraphs(db: Session, job: models.TTSJob, limit: int = 100) -> List[models.Paragraph]:
+    """
+    领取任务范围内的下一批待合成段落，并在同一事务中标记为 processing
+
+    一条 "UPDATE ... WHERE id IN (候选) AND tts_status='pending' RETURNING" 完成领取，
+    同一本书上的多个任务（如整本书任务与单章任务）同时领取时，每个段落只会被一个任务领到。
+
+    Returns:
+        本次实际领取到的段落（已是 processing 状态）
+    """
+    candidates = select(models.Paragraph.id).where(
+        *_job_paragraph_filters(job),
+        models.Paragraph.tts_status == "pending"
+    ).order_by(models.Paragraph.id).limit(limit)
+
+    try:
+        claimed = db.execute(
+            update(models.Paragraph).where(
+                models.Paragraph.id.in_(candidates),
+                models.Paragraph.tts_status == "pending"
+            ).values(
+                tts_status="processing",
+                tts_error=None,
+                claimed_by_job_id=job.id
+            ).returning(models.Paragraph.id, models.Paragraph.book_id, models.Paragraph.chapter_id),
+            execution_options={"synchronize_session": False}
+        ).all()
+        _apply_status_deltas(db, [
+            (p.book_id, p.chapter_id, "pending", "processing", 1) for p in claimed
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if not claimed:
+        return []
+    # 提交后对象已过期，按主键一次重新加载
+    return db.query(models.Paragraph).filter(
+        models.Paragraph.id.in_([p.id for p in claimed])
+    ).order_by(models.Paragraph.id).all()
+
+
+def claim_paragraph(db: Session, paragraph_id: int) -> Optional[str]:
+    """
+    领取单个段落（试听等不经任务队列的合成），条件更新为 processing
+
+    以读取到的旧状态为条件更新（比较并交换），与任务领取互斥：
+    正被任务或其他试听合成（processing）的段落不会被领取。
+
+    Returns:
+        领取前的状态（中断时据此恢复）；段落不存在、正被合成或状态已被并发修改时返回 None
+    """
+    current = db.query(
+        models.Paragraph.book_id, models.Paragraph.chapter_id, models.Paragraph.tts_status
+    ).filter(models.Paragraph.id == paragraph_id).first()
+    if current is None or current.tts_status == "processing":
+        db.rollback()
+        return None
+
+    try:
+        updated = db.query(models.Paragraph).filter(
+            models.Paragraph.id == paragraph_id,
+            models.Paragraph.tts_status == current.tts_status
+        ).update({
+            models.Paragraph.tts_status: "processing",
+            models.Paragraph.claimed_by_job_id: None,
+        }, synchronize_session=False)
+        if updated:
+            _apply_status_deltas(db, [
+                (current.book_id, current.chapter_id, current.tts_status, "processing", 1)
+            ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return current.tts_status if updated else None
+
+
+def release_claimed_paragraphs(
+    db: Session,
+    paragraph_ids: List[int],
+    job_id: int = None,
+    owner: str = None
+) -> int:
+    """
+    将已领取但未开始合成的段落（仍为 processing）放回 pending
+
+    Args:
+        job_id: 只放回该任务领取的段落（为 None 时只放回不属于任何任务的领取，如试听）
+        owner: 任务租约的持有者；租约已被回收（段落已重置、可能已被重新领取）时不放回
+    """
+    if not paragraph_ids:
+        return 0
+    filters = [
+        models.Paragraph.id.in_(paragraph_ids),
+        models.Paragraph.tts_status == "processing",
+        models.Paragraph.claimed_by_job_id == job_id,
+    ]
+    if owner is not None:
+        filters.append(models.Paragraph.claimed_by_job_id.in_(
+            select(models.TTSJob.id).where(models.TTSJob.id == job_id, models.TTSJob.lease_owner == owner)
+        ))
+    _bulk_status_deltas(db, filters, "pending")
+    updated = db.query(models.Paragraph).filter(*filters).update({
+        models.Paragraph.tts_status: "pending",
+        models.Paragraph.claimed_by_job_id: None,
+    }, synchronize_session=False)
+    db.commit()
+    return updated
+
+
+def get_next_queued_tts_job(db: Session) -> Optional[models.TTSJob]:
+    """获取下一个将被领取的任务（优先级最高、最早入队）"""
+    return db.query(models.TTSJob).filter(
+        models.TTSJob.status == "queued"
+    ).order_by(_job_priority_order(), models.TTSJob.id).first()
+
+
+def claim_next_tts_job(db: Session, owner: str, lease_seconds: int) -> Optional[models.TTSJob]:
+    """
+    领取优先级最高、最早入队的任务
+
+    使用 "WHERE status='queued'" 条件更新实现比较并交换，
+    多个 worker 同时领取时只有一个能成功。
+    """
+    while True:
+        candidate = db.query(models.TTSJob.id).filter(
+            models.TTSJob.status == "queued"
+        ).order_by(_job_priority_order(), models.TTSJob.id).first()
+        if not candidate:
+            return None
+
+        now = datetime.now()
+        claimed = db.query(models.TTSJob).filter(
+            models.TTSJob.id == candidate.id,
+            models.TTSJob.status == "queued"
+        ).update({
+            models.TTSJob.status: "running",
+            models.TTSJob.lease_owner: owner,
+            models.TTSJob.lease_expires_at: now + timedelta(seconds=lease_seconds),
+            models.TTSJob.heartbeat_at: now,
+            models.TTSJob.started_at: func.coalesce(models.TTSJob.started_at, now),
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return get_tts_job(db, candidate.id)
+
+
+def renew_tts_job_lease(db: Session, job_id: int, owner: str, lease_seconds: int) -> Optional[str]:
+    """
+    心跳续约
+
+    Returns:
+        续约成功时返回任务当前状态；租约已不属于 owner 时返回 None
+    """
+    now = datetime.now()
+    renewed = db.query(models.TTSJob).filter(
+        models.TTSJob.id == job_id,
+        models.TTSJob.lease_owner == owner
+    ).update({
+        models.TTSJob.lease_expires_at: now + timedelta(seconds=lease_seconds),
+        models.TTSJob.heartbeat_at: now,
+    }, synchronize_session=False)
+    db.commit()
+    if not renewed:
+        return None
+    return db.query(models.TTSJob.status).filter(models.TTSJob.id == job_id).scalar()
+
+
+def release_tts_job(db: Session, job_id: int, owner: str, status: str = None, error: str = None):
+    """
+    释放任务租约
+
+    Args:
+        status: 同时更新的任务状态；为 None 时保留当前状态（如 paused/cancelled）
+    """
+    values = {
+        models.TTSJob.lease_owner: None,
+        models.TTSJob.lease_expires_at: None,
+    }
+    if status is not None:
+        values[models.TTSJob.status] = status
+        if status in ("completed", "failed", "cancelled"):
+            values[models.TTSJob.finished_at] = datetime.now()
+    if error is not None:
+        values[models.TTSJob.error] = error
+
+    db.query(models.TTSJob).filter(
+        models.TTSJob.id == job_id,
+        models.TTSJob.lease_owner == owner
+    ).update(values, synchronize_session=False)
+    db.commit()
+
+
+def update_tts_job_counts(db: Session, job_id: int, completed: int = 0, failed: int = 0):
+    """累加任务完成/失败计数"""
+    db.query(models.TTSJob).filter(models.TTSJob.id == job_id).update({
+        models.TTSJob.completed: models.TTSJob.completed + completed,
+        models.TTSJob.failed: models.TTSJob.failed + failed,
+    }, synchronize_session=False)
+    db.commit()
+
+
+def set_tts_job_status(db: Session, job_id: int, status: str, from_statuses: tuple) -> bool:
+    """仅当任务处于 from_statuses 之一时更新状态（用于取消/暂停/恢复）"""
+    values = {models.TTSJob.status: status}
+    if status == "cancelled":
+        values[models.TTSJob.finished_at] = datetime.now()
+    updated = db.query(models.TTSJob).filter(
+        models.TTSJob.id == job_id,
+        models.TTSJob.status.in_(from_statuses)
+    ).update(values, synchronize_session=False)
+    db.commit()
+    return updated > 0
+
+
+def reset_paragraphs_to_pending(db: Session, book_id: int, paragraph_ids: List[int]) -> int:
+    """将指定段落重新标记为待合成（批量重合成入队时使用）"""
+    if not paragraph_ids:
+        return 0
+    filters = [
+        models.Paragraph.book_id == book_id,
+        models.Paragraph.id.in_(paragraph_ids),
+        models.Paragraph.tts_status != "processing"
+    ]
+    _bulk_status_deltas(db, filters, "pending")
+    updated = db.query(models.Paragraph).filter(*filters).update({
+        models.Paragraph.tts_status: "pending",
+        models.Paragraph.tts_error: None,
+    }, synchronize_session=False)
+    db.commit()
+    return updated
+
+
+def reclaim_expired_tts_jobs(db: Session) -> int:
+    """
+    回收租约过期的任务
+
+    - 将该任务领取、仍卡在 processing 的段落重置为 pending（同一本书上其他存活任务领取的段落不受影响）
+    - running 状态的任务重新放回队列，paused/cancelled 保持原状态
+    """
+    now = datetime.now()
+    expired = db.query(models.TTSJob).filter(
+        models.TTSJob.status.in_(("running", "paused", "cancelled")),
+        models.TTSJob.lease_owner.isnot(None),
+        models.TTSJob.lease_expires_at < now
+    ).all()
+
+    for job in expired:
+        filters = [
+            *_job_paragraph_filters(job),
+            models.Paragraph.tts_status == "processing",
+            models.Paragraph.claimed_by_job_id == job.id,
+        ]
+        _bulk_status_deltas(db, filters, "pending")
+        db.query(models.Paragraph).filter(*filters).update({
+            models.Paragraph.tts_status: "pending",
+            models.Paragraph.claimed_by_job_id: None,
+        }, synchronize_session=False)
+
+        if job.status == "running":
+            job.status = "queued"
+        job.lease_owner = None
+        job.lease_expires_at = None
+
+    db.commit()
+    return len(expired)
+
+
+def reset_orphan_processing_paragraphs(db: Session) -> int:
+    """
+    重置没有存活任务的 processing 段落
+
+    服务异常退出时正在合成的段落会一直停留在 processing，
+    worker 启动时调用，将其恢复为 pending 以便重新领取。
+    """
+    now = datetime.now()
+    live_books = select(models.TTSJob.book_id).where(
+        models.TTSJob.lease_owner.isnot(None),
+        models.TTSJob.lease_expires_at >= now
+    )
+    filters = [
+        models.Paragraph.tts_status == "processing",
+        models.Paragraph.book_id.notin_(live_books)
+    ]
+    _bulk_status_deltas(db, filters, "pending")
+    updated = db.query(models.Paragraph).filter(*filters).update(
+        {models.Paragraph.tts_status: "pending"}, synchronize_session=False
+    )
+    db.commit()
+    return updated
+
+
+# ==================== 状态计数操作 ====================
+
+# TTS 状态 -> Book / Chapter 上的计数列
+STATUS_COUNTER_COLUMNS = {
+    "pending": "pending_paragraphs",
+    "processing": "processing_paragraphs",
+    "completed": "completed_paragraphs",
+    "failed": "failed_paragraphs",
+}
+
+# (book_id, chapter_id, 旧状态, 新状态, 段落数)；新建段落旧状态为 None，删除段落新状态为 None
+StatusTransition = Tuple[int, Optional[int], Optional[str], Optional[str], int]
+
+
+def get_status_counts(obj) -> Dict[str, int]:
+    """读取书籍或章节上的各状态段落数"""
+    return {
+        status: getattr(obj, column) or 0
+        for status, column in STATUS_COUNTER_COLUMNS.items()
+    }
+
+
+def _apply_status_deltas(db: Session, transitions: Iterable[StatusTransition]):
+    """
+    按状态变化增减书籍/章节计数（不提交，由调用方与段落更新一起提交）
+
+    chapter_id 为 None 时只更新书籍计数。
+    """
+    book_deltas: Dict[int, Counter] = defaultdict(Counter)
+    chapter_deltas: Dict[int, Counter] = defaultdict(Counter)
+    for book_id, chapter_id, old, new, count in transitions:
+        if old == new or not count:
+            continue
+        for status, sign in ((old, -1), (new, 1)):
+            if status not in STATUS_COUNTER_COLUMNS:
+                continue
+            book_deltas[book_id][status] += sign * count
+            if chapter_id is not None:
+                chapter_deltas[chapter_id][status] += sign * count
+
+    for model, deltas in ((models.Book, book_deltas), (models.Chapter, chapter_deltas)):
+        for row_id, delta in deltas.items():
+            values = {}
+            for status, n in delta.items():
+                if n:
+                    column = getattr(model, STATUS_COUNTER_COLUMNS[status])
+                    values[column] = func.coalesce(column, 0) + n
+            if values:
+                db.query(model).filter(model.id == row_id).update(values, synchronize_session=False)
+
+
+def _set_paragraph_status(db: Session, paragraph: models.Paragraph, status: Optional[str]):
+    """修改单个段落状态并同步计数（status 为 None 表示段落将被删除）"""
+    _apply_status_deltas(db, [(paragraph.book_id, paragraph.chapter_id, paragraph.tts_status, status, 1)])
+    if status is not None:
+        paragraph.tts_status = status
+
+
+def _status_group_counts(db: Session, filters: list) -> List[Tuple[int, int, str, int]]:
+    """按 (book_id, chapter_id, tts_status) 统计满足条件的段落数"""
+    return db.query(
+        models.Paragraph.book_id,
+        models.Paragraph.chapter_id,
+        models.Paragraph.tts_status,
+        func.count(models.Paragraph.id)
+    ).filter(*filters).group_by(
+        models.Paragraph.book_id, models.Paragraph.chapter_id, models.Paragraph.tts_status
+    ).all()
+
+
+def _bulk_status_deltas(db: Session, filters: list, new_status: str):
+    """条件批量更新段落状态前调用，按将被更新的段落同步计数"""
+    _apply_status_deltas(db, [
+        (book_id, chapter_id, status, new_status, count)
+        for book_id, chapter_id, status, count in _status_group_counts(db, filters)
+    ])
+
+
+def reconcile_status_counters(db: Session, book_id: int = None) -> int:
+    """
+    按段落表重新统计书籍/章节状态计数，修正偏差
+
+    Returns:
+        被修正的书籍与章节行数
+    """
+    filters = [models.Paragraph.book_id == book_id] if book_id is not None else []
+    book_actual: Dict[int, Counter] = defaultdict(Counter)
+    chapter_actual: Dict[int, Counter] = defaultdict(Counter)
+    for row_book_id, chapter_id, status, count in _status_group_counts(db, filters):
+        book_actual[row_book_id][status] += count
+        chapter_actual[chapter_id][status] += count
+
+    fixed = 0
+    for model, actual in ((models.Book, book_actual), (models.Chapter, chapter_actual)):
+        query = db.query(model)
+        if book_id is not None:
+            query = query.filter((model.id if model is models.Book else model.book_id) == book_id)
+        for obj in query:
+            expected = {status: actual[obj.id][status] for status in STATUS_COUNTER_COLUMNS}
+            if get_status_counts(obj) != expected:
+                for status, column in STATUS_COUNTER_COLUMNS.items():
+                    setattr(obj, column, expected[status])
+                fixed += 1
+
+    db.commit()
+    return fixed
@@ -1,18 +1,80 @@
 """
 SQLAlchemy 数据库连接配置
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-# SQLite 数据库路径
-SQLALCHEMY_DATABASE_URL = "sqlite:///./voicebook.db"
+from app.config import Settings, get_settings
+
+settings = get_settings()
+
+# 数据库 URL（默认 sqlite:///./voicebook.db，可通过 DATABASE_URL 替换）
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+
+
+def _sqlite_pragmas(config: Settings) -> dict:
+    """每个 SQLite 连接需要执行的 PRAGMA"""
+    return {
+        # WAL: 读写互不阻塞，合成写库时 API 仍可读取进度
+        "journal_mode": config.SQLITE_JOURNAL_MODE,
+        # WAL 下 NORMAL 足够安全，且每次提交不必 fsync
+        "synchronous": config.SQLITE_SYNCHRONOUS,
+        # 遇到写锁时等待而不是立即报 database is locked
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+        # 负数表示以 KiB 为单位
+        "cache_size": -config.SQLITE_CACHE_SIZE_KB,
+        "mmap_size": config.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+    }
+
+
+def create_db_engine(url: str = None, config: Settings = None) -> Engine:
+    """
+    根据配置创建数据库引擎
+
+    - SQLite: 关闭同线程检查，每个新连接执行 WAL / synchronous / busy_timeout 等 PRAGMA
+    - 文件数据库（SQLite 文件或服务器数据库）: 按 DB_POOL_SIZE 等配置连接池
+    - 内存 SQLite: 使用 SQLAlchemy 默认连接池
+    """
+    config = config or settings
+    url = make_url(url or config.DATABASE_URL)
+    is_sqlite = url.get_backend_name() == "sqlite"
+    in_memory = is_sqlite and url.database in (None, "", ":memory:")
+
+    kwargs = {}
+    if is_sqlite:
+        kwargs["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+    if not in_memory:
+        kwargs.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_pre_ping=not is_sqlite,
+        )
+
+    db_engine = create_engine(url, **kwargs)
+
+    if is_sqlite:
+        pragmas = _sqlite_pragmas(config)
+
+        @event.listens_for(db_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+            finally:
+                cursor.close()
+
+    return db_engine
+
 
 # 创建引擎
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
-)
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 
 # 创建会话
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -31,5 +93,9 @@ def get_db():
 
 
 def init_db():
-    """初始化数据库表"""
+    """初始化数据库表，并为已有数据库补齐新增的列和索引"""
+    from app import models  # noqa: F401  确保模型已注册到 Base.metadata
+    from app.migrations import run_migrations
+
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine, Base.metadata)
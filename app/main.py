@@ -9,9 +9,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.database import init_db
+from app import crud
+from app.database import SessionLocal, init_db
 from app.routers import books, tts, export
 from app.config import get_settings
+from app.services import lazy_import, tts_queue
+from app.services.tts_providers.local import shutdown_local_pool
 
 settings = get_settings()
 
@@ -45,8 +48,17 @@ app.include_router(export.router)
 
 @app.on_event("startup")
 def startup():
-    """启动时初始化数据库"""
+    """启动时初始化数据库、校准状态计数并启动合成任务 worker 与延迟解码预取"""
     init_db()
+    db = SessionLocal()
+    try:
+        crud.reconcile_status_counters(db)
+    finally:
+        db.close()
+    if settings.TTS_WORKER_ENABLED:
+        tts_queue.start_worker()
+    # 继续预取上次未解码完的延迟章节
+    lazy_import.resume_prefetch()
     print("=" * 60)
     print(f"🎙️  {settings.PROJECT_NAME} v{settings.VERSION}")
     print("=" * 60)
@@ -55,6 +67,14 @@ def startup():
     print("=" * 60)
 
 
+@app.on_event("shutdown")
+def shutdown():
+    """关闭时停止 worker 与延迟解码预取，未完成的任务重新入队"""
+    tts_queue.stop_worker()
+    lazy_import.stop_prefetch()
+    shutdown_local_pool()
+
+
 @app.get("/")
 def index():
     """API 根路径"""
@@ -0,0 +1,59 @@
+"""
+轻量数据库迁移
+create_all 只会创建缺失的表，已存在的 voicebook.db 不会获得新加的列和索引；
+这里在启动时对比模型与实际表结构，补齐缺失的列和索引（只增不删）
+"""
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import Column
+
+
+def _column_ddl(column: Column, engine: Engine) -> str:
+    """生成 ADD COLUMN 语句中的列定义"""
+    ddl = f"{column.name} {column.type.compile(dialect=engine.dialect)}"
+    default = column.default
+    if default is not None and default.is_scalar:
+        value = default.arg
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, str):
+            value = "'" + value.replace("'", "''") + "'"
+        ddl += f" DEFAULT {value}"
+    return ddl
+
+
+def run_migrations(engine: Engine, metadata) -> List[str]:
+    """
+    补齐已有表中缺失的列和索引
+
+    Returns:
+        执行的变更列表（如 "paragraphs.ix_paragraphs_book_status"）
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    changes = []
+
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(column, engine)}"))
+                changes.append(f"{table.name}.{column.name}")
+
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                index.create(bind=conn, checkfirst=True)
+                changes.append(f"{table.name}.{index.name}")
+
+    if changes:
+        print(f"[数据库] 已迁移: {', '.join(changes)}")
+    return changes
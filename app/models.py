@@ -1,7 +1,7 @@
 """
 SQLAlchemy ORM 模型定义
 """
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -20,12 +20,20 @@ class Book(Base):
     total_paragraphs = Column(Integer, default=0)
     total_duration_ms = Column(Integer, default=0)
     tts_progress = Column(Float, default=0.0)
+    # 各 TTS 状态的段落数（随状态变化在同一事务内增减，见 crud._apply_status_deltas）
+    pending_paragraphs = Column(Integer, default=0)
+    processing_paragraphs = Column(Integer, default=0)
+    completed_paragraphs = Column(Integer, default=0)
+    failed_paragraphs = Column(Integer, default=0)
     tts_voice = Column(String(100), default="zh-CN-XiaoxiaoNeural")
+    # 导入状态: importing / completed / failed（导入中已提交的章节即可查询和合成）
+    import_status = Column(String(20), default="completed")
     created_at = Column(DateTime, default=datetime.now)
     
     # 关系
     chapters = relationship("Chapter", back_populates="book", cascade="all, delete-orphan")
     paragraphs = relationship("Paragraph", back_populates="book", cascade="all, delete-orphan")
+    tts_jobs = relationship("TTSJob", back_populates="book", cascade="all, delete-orphan")
 
 
 class Chapter(Base):
@@ -37,6 +45,21 @@ class Chapter(Base):
     chapter_index = Column(Integer, nullable=False)
     title = Column(String(500), default="")
     total_paragraphs = Column(Integer, default=0)
+    # 各 TTS 状态的段落数
+    pending_paragraphs = Column(Integer, default=0)
+    processing_paragraphs = Column(Integer, default=0)
+    completed_paragraphs = Column(Integer, default=0)
+    failed_paragraphs = Column(Integer, default=0)
+    # 延迟解码（大 PDF）：导入时只记录页码范围 [page_start, page_end)，
+    # 首次访问或合成到该章时才解码，decode_status: pending / decoded / failed
+    decode_status = Column(String(20), default="decoded")
+    page_start = Column(Integer, nullable=True)
+    page_end = Column(Integer, nullable=True)
+    
+    __table_args__ = (
+        # 按书籍列出章节（get_book_chapters）
+        Index("ix_chapters_book_order", "book_id", "chapter_index"),
+    )
     
     # 关系
     book = relationship("Book", back_populates="chapters")
@@ -66,9 +89,59 @@ class Paragraph(Base):
     sentence_timings = Column(Text, nullable=True)
     tts_status = Column(String(20), default="pending")  # pending/processing/completed/failed
     tts_error = Column(Text, nullable=True)
+    # 领取该段落（processing）的合成任务，租约过期回收时只重置该任务领取的段落
+    claimed_by_job_id = Column(Integer, nullable=True)
     
     created_at = Column(DateTime, default=datetime.now)
     
+    __table_args__ = (
+        # 按状态统计/筛选（/progress、get_pending_paragraphs、update_book_tts_progress）
+        Index("ix_paragraphs_book_status", "book_id", "tts_status"),
+        # 章节内按顺序读取（get_chapter_paragraphs、update_chapter_stats）
+        Index("ix_paragraphs_chapter_order", "chapter_id", "paragraph_index"),
+        # 全书按顺序读取（get_book_paragraphs、导出分组）
+        Index("ix_paragraphs_book_chapter_order", "book_id", "chapter_id", "paragraph_index"),
+    )
+    
     # 关系
     book = relationship("Book", back_populates="paragraphs")
     chapter = relationship("Chapter", back_populates="paragraphs")
+
+
+class TTSJob(Base):
+    """TTS 合成任务模型 - 持久化任务队列，由后台 worker 按租约领取执行"""
+    __tablename__ = "tts_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    # 任务范围: book(整本书) / chapter(单章) / batch(指定段落)
+    scope = Column(String(20), default="book")
+    chapter_id = Column(Integer, nullable=True)
+    # JSON 格式的段落 ID 列表（仅 batch 范围使用）
+    paragraph_ids = Column(Text, nullable=True)
+    voice = Column(String(100), default="zh-CN-XiaoxiaoNeural")
+    max_concurrent = Column(Integer, default=5)
+
+    status = Column(String(20), default="queued")  # queued/running/paused/cancelled/completed/failed
+    total = Column(Integer, default=0)
+    completed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+
+    # 租约: 持有者需定期心跳续约，过期后任务会被重新放回队列
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # worker 领取任务: WHERE status='queued' ORDER BY 优先级(CASE scope), id；
+        # 优先级由 scope 计算，索引定位到 queued 行并按 id 顺序读取
+        Index("ix_tts_jobs_status_id", "status", "id"),
+    )
+
+    # 关系
+    book = relationship("Book", back_populates="tts_jobs")
@@ -5,13 +5,14 @@ import os
 import shutil
 from pathlib import Path
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List
 
 from app.database import get_db
 from app import crud, schemas
-from app.services import decoder
+from app.services import decoder, lazy_import
 from app.config import get_settings
 
 router = APIRouter(prefix="/api/books", tags=["书籍管理"])
@@ -39,8 +40,8 @@ async def upload_book(
         content = await file.read()
         f.write(content)
     
-    # 解析电子书
-    book_id, message = decoder.decode_ebook(db, str(file_path))
+    # 解析电子书（在线程池中执行，导入期间不阻塞其他请求读取已提交的章节）
+    book_id, message = await run_in_threadpool(decoder.decode_ebook, db, str(file_path))
     
     if book_id:
         book = crud.get_book(db, book_id)
@@ -92,6 +93,21 @@ def list_ebook_files():
     return {"files": files}
 
 
+@router.get("/decode-cache")
+def get_decode_cache_stats():
+    """获取解码缓存统计（条目数、占用空间、命中率）"""
+    from app.services.decode_cache import get_decode_cache
+    return get_decode_cache().stats()
+
+
+@router.delete("/decode-cache")
+def clear_decode_cache():
+    """清空解码缓存"""
+    from app.services.decode_cache import get_decode_cache
+    get_decode_cache().clear()
+    return {"success": True, "message": "缓存已清空"}
+
+
 @router.get("", response_model=List[schemas.Book])
 def get_books(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """获取书籍列表"""
@@ -151,6 +167,9 @@ def get_chapter_paragraphs(chapter_id: int, db: Session = Depends(get_db)):
     chapter = crud.get_chapter(db, chapter_id)
     if not chapter:
         raise HTTPException(404, "章节不存在")
+    # 延迟解码的章节在首次访问时解码
+    if not lazy_import.ensure_chapter_decoded(db, chapter):
+        raise HTTPException(500, "章节解码失败")
     return crud.get_chapter_paragraphs(db, chapter_id)
 
 
@@ -1,16 +1,18 @@
 """
 有声书导出路由
 """
+import asyncio
 import os
 import shutil
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app import crud, schemas
-from app.services import audiobook_exporter
+from app.services import audiobook_exporter, events
 
 router = APIRouter(prefix="/api", tags=["导出"])
 
@@ -19,6 +21,8 @@ router = APIRouter(prefix="/api", tags=["导出"])
 def export_book(
     book_id: int,
     background_tasks: BackgroundTasks,
+    workers: Optional[int] = None,
+    force: bool = False,
     db: Session = Depends(get_db)
 ):
     """
@@ -26,6 +30,9 @@ def export_book(
     
     将已合成的段落音频按章节分组合并为 WAV，并生成 LRC 歌词。
     短章节自动合并，保持每段 ~40 分钟。
+    
+    - workers: 并发合并分组的进程数（默认读取 EXPORT_WORKERS 配置）
+    - force: 忽略导出清单，全部重新合并（默认只重建有变化的分组）
     """
     book = crud.get_book(db, book_id)
     if not book:
@@ -49,7 +56,9 @@ def export_book(
     # 添加后台导出任务
     background_tasks.add_task(
         audiobook_exporter.export_book_background,
-        book_id=book_id
+        book_id=book_id,
+        workers=workers,
+        force=force
     )
     
     return schemas.ExportResponse(
@@ -61,6 +70,8 @@ def export_book(
 @router.post("/books/{book_id}/export/sync")
 def export_book_sync(
     book_id: int,
+    workers: Optional[int] = None,
+    force: bool = False,
     db: Session = Depends(get_db)
 ):
     """
@@ -72,10 +83,40 @@ def export_book_sync(
     if not book:
         raise HTTPException(404, "书籍不存在")
     
-    result = audiobook_exporter.export_book(db, book_id)
+    result = audiobook_exporter.export_book(db, book_id, workers=workers, force=force)
     return result
 
 
+def _book_exists(book_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return crud.get_book(db, book_id) is not None
+    finally:
+        db.close()
+
+
+@router.get("/books/{book_id}/export/stream")
+async def stream_export_progress(book_id: int, request: Request):
+    """
+    导出进度事件流 (Server-Sent Events)
+    
+    取代轮询 /export/files，事件类型：
+    - export_started: {total_segments, rebuild_segments, reused_count}
+    - export_group: 每个音频段完成 {done, total, folder, success}
+    - export_finished: {success, message, success_count, fail_count, reused_count}
+    """
+    sub = events.event_bus.subscribe(events.export_topic(book_id))
+    if not await asyncio.to_thread(_book_exists, book_id):
+        sub.close()
+        raise HTTPException(404, "书籍不存在")
+    
+    return StreamingResponse(
+        events.stream_events(request, sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/books/{book_id}/export/download")
 def download_export(book_id: int, db: Session = Depends(get_db)):
     """
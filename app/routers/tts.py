@@ -1,16 +1,18 @@
 """
 TTS 语音合成路由
 """
+import asyncio
 import os
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from app.database import get_db
-from app import crud, schemas
-from app.services import tts
+from app.database import SessionLocal, get_db
+from app import crud, models, schemas
+from app.services import events, lazy_import, tts, tts_queue
+from app.services.concurrency import get_book_concurrency
 
 router = APIRouter(prefix="/api", tags=["语音合成"])
 
@@ -21,29 +23,54 @@ def get_voices():
     return [schemas.VoiceInfo(**v) for v in tts.VOICES]
 
 
+@router.get("/tts/cache")
+def get_tts_cache_stats():
+    """获取 TTS 音频缓存统计（条目数、占用空间、命中率）"""
+    from app.services.tts_cache import get_audio_cache
+    return get_audio_cache().stats()
+
+
+@router.delete("/tts/cache")
+def clear_tts_cache():
+    """清空 TTS 音频缓存"""
+    from app.services.tts_cache import get_audio_cache
+    get_audio_cache().clear()
+    return {"success": True, "message": "缓存已清空"}
+
+
+@router.get("/tts/limits")
+def get_tts_rate_limits():
+    """获取各 TTS 引擎的进程级限流状态（进行中请求数、各来源排队数、累计等待时间）"""
+    from app.services.tts_providers.rate_limit import get_all_rate_limiters
+    return [limiter.stats() for limiter in get_all_rate_limiters().values()]
+
+
 @router.post("/books/{book_id}/synthesize", response_model=schemas.SynthesizeResponse)
 def synthesize_book(
     book_id: int,
-    background_tasks: BackgroundTasks,
     voice: str = "zh-CN-XiaoxiaoNeural",
     max_concurrent: int = 20,
     db: Session = Depends(get_db)
 ):
     """
-    合成整本书（后台任务模式）
+    合成整本书（持久化任务队列模式）
     
-    - 请求会立即返回，合成任务在后台执行
-    - 使用 /books/{book_id}/progress 端点查询进度
-    - max_concurrent: 并发数（默认50，可调整以加快速度）
+    - 请求会立即返回任务 ID，合成由后台 worker 执行，服务重启后自动继续
+    - 使用 /books/{book_id}/progress 或 /jobs/{job_id} 端点查询进度
+    - max_concurrent: 并发数（默认20，可调整以加快速度）
     """
     book = crud.get_book(db, book_id)
     if not book:
         raise HTTPException(404, "书籍不存在")
     
-    # 获取待处理段落数量
-    pending_count = len(crud.get_pending_paragraphs(db, book_id))
+    # 待处理段落数量（读取状态计数，不加载段落）
+    pending_count = crud.get_status_counts(book)["pending"]
     
-    if pending_count == 0:
+    # 延迟解码的书籍还有未解码章节时照常创建任务，合成到时再解码；
+    # 这些章节的段落解码后才计入任务 total
+    undecoded = crud.count_undecoded_chapters(db, book_id, statuses=("pending",))
+    pending_note = f"（另有 {undecoded} 个章节待解码，解码后计入）" if undecoded else ""
+    if pending_count == 0 and undecoded == 0:
         return schemas.SynthesizeResponse(
             success=True,
             message="没有待合成的段落",
@@ -51,20 +78,29 @@ def synthesize_book(
             completed=0,
             failed=0
         )
+
+    # 已有未结束的整书任务时直接复用
+    job = crud.get_active_tts_job(db, book_id, scope="book")
+    if job:
+        return schemas.SynthesizeResponse(
+            success=True,
+            message=f"该书已有合成任务 (ID: {job.id}, 状态: {job.status})，共 {pending_count} 个待合成段落{pending_note}。",
+            total=pending_count,
+            job_id=job.id
+        )
     
-    # 添加后台任务
-    background_tasks.add_task(
-        tts.synthesize_book_background,
-        book_id=book_id,
-        voice=voice,
-        max_concurrent=max_concurrent
+    job = crud.create_tts_job(
+        db, book_id, scope="book", voice=voice,
+        max_concurrent=max_concurrent, total=pending_count
     )
+    tts_queue.notify_job_queued()
     return schemas.SynthesizeResponse(
         success=True,
-        message=f"已开始后台合成任务，共 {pending_count} 个段落，并发数 {max_concurrent}。请使用 /progress 端点查询进度。",
+        message=f"已创建合成任务 (ID: {job.id})，共 {pending_count} 个段落{pending_note}，并发数 {max_concurrent}。请使用 /progress 端点查询进度。",
         total=pending_count,
         completed=0,
-        failed=0
+        failed=0,
+        job_id=job.id
     )
 
 
@@ -94,31 +130,61 @@ async def synthesize_paragraph(
     return True
 
 
+@router.get("/books/{book_id}/paragraphs/{paragraph_id}/stream")
+async def stream_paragraph(
+    book_id: int,
+    paragraph_id: int,
+    voice: str = "zh-CN-XiaoxiaoNeural",
+    db: Session = Depends(get_db)
+):
+    """
+    合成单个段落并流式返回音频 (audio/mpeg)
+
+    - 边合成边返回，可直接作为 <audio> 的 src 实现即时试听
+    - 合成完成后与普通合成一样保存音频文件并更新段落状态
+    - 段落正被合成任务处理时等待任务完成并返回任务的合成结果
+    """
+    paragraph = crud.get_paragraph(db, paragraph_id)
+    if not paragraph:
+        raise HTTPException(404, "段落不存在")
+
+    if paragraph.book_id != book_id:
+        raise HTTPException(400, "段落不属于该书籍")
+
+    task = tts.ParagraphTask.from_paragraph(paragraph)
+    return StreamingResponse(
+        tts.stream_paragraph(task, voice),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/books/{book_id}/chapters/{chapter_id}/synthesize", response_model=schemas.SynthesizeResponse)
 def synthesize_chapter(
     book_id: int,
     chapter_id: int,
-    background_tasks: BackgroundTasks,
     voice: str = "zh-CN-XiaoxiaoNeural",
+    max_concurrent: int = 5,
     db: Session = Depends(get_db)
 ):
     """
-    合成整章节（后台任务模式）
+    合成整章节（持久化任务队列模式）
     """
     chapter = crud.get_chapter(db, chapter_id)
     if not chapter or chapter.book_id != book_id:
         raise HTTPException(404, "章节不存在或不属于该书籍")
     
-    # 获取该章节待处理段落
-    from app import models
-    pending_paragraphs = db.query(models.Paragraph).filter(
+    # 延迟解码的章节先解码再统计
+    if not lazy_import.ensure_chapter_decoded(db, chapter):
+        raise HTTPException(500, "章节解码失败")
+    
+    # 获取该章节待处理段落数量
+    pending_count = db.query(models.Paragraph).filter(
         models.Paragraph.chapter_id == chapter_id,
         models.Paragraph.tts_status == "pending"
-    ).all()
-    
-    paragraph_ids = [p.id for p in pending_paragraphs]
+    ).count()
     
-    if not paragraph_ids:
+    if pending_count == 0:
         return schemas.SynthesizeResponse(
             success=True,
             message="该章节没有待合成的段落",
@@ -126,20 +192,22 @@ def synthesize_chapter(
             completed=0,
             failed=0
         )
-    
-    background_tasks.add_task(
-        tts.synthesize_batch_background,
-        book_id=book_id,
-        paragraph_ids=paragraph_ids,
-        voice=voice
-    )
+
+    job = crud.get_active_tts_job(db, book_id, scope="chapter", chapter_id=chapter_id)
+    if not job:
+        job = crud.create_tts_job(
+            db, book_id, scope="chapter", chapter_id=chapter_id,
+            voice=voice, max_concurrent=max_concurrent, total=pending_count
+        )
+        tts_queue.notify_job_queued()
     
     return schemas.SynthesizeResponse(
         success=True,
-        message=f"已开始章节合成任务，共 {len(paragraph_ids)} 个段落。",
-        total=len(paragraph_ids),
+        message=f"已开始章节合成任务 (ID: {job.id})，共 {pending_count} 个段落。",
+        total=pending_count,
         completed=0,
-        failed=0
+        failed=0,
+        job_id=job.id
     )
 
 
@@ -147,63 +215,94 @@ def synthesize_chapter(
 def synthesize_batch(
     book_id: int,
     request: schemas.BatchSynthesizeRequest,
-    background_tasks: BackgroundTasks,
+    max_concurrent: int = 5,
     db: Session = Depends(get_db)
 ):
     """
-    批量合成指定段落（后台任务模式）
+    批量合成指定段落（持久化任务队列模式）
+
+    选中的段落（包括已合成的）会重新标记为 pending 并进入任务队列。
     """
     book = crud.get_book(db, book_id)
     if not book:
         raise HTTPException(404, "书籍不存在")
     
-    # 过滤掉不属于该书的段落（提高安全性）
-    # 可以在 background task 里做，也可以在这里简单校验
+    # 仅保留属于该书的段落，并标记为待合成
+    crud.reset_paragraphs_to_pending(db, book_id, request.paragraph_ids)
     
-    background_tasks.add_task(
-        tts.synthesize_batch_background,
-        book_id=book_id,
-        paragraph_ids=request.paragraph_ids,
-        voice=request.voice
+    job = crud.create_tts_job(
+        db, book_id, scope="batch", paragraph_ids=request.paragraph_ids,
+        voice=request.voice, max_concurrent=max_concurrent,
+        total=len(request.paragraph_ids)
     )
+    tts_queue.notify_job_queued()
     
     return schemas.SynthesizeResponse(
         success=True,
-        message=f"已开始批量合成任务，共 {len(request.paragraph_ids)} 个段落。",
+        message=f"已开始批量合成任务 (ID: {job.id})，共 {len(request.paragraph_ids)} 个段落。",
         total=len(request.paragraph_ids),
         completed=0,
-        failed=0
+        failed=0,
+        job_id=job.id
     )
 
 
-@router.get("/books/{book_id}/progress")
-def get_synthesis_progress(book_id: int, db: Session = Depends(get_db)):
-    """
-    获取合成进度
-    
-    返回各状态的段落数量：
-    - pending: 等待处理
-    - processing: 正在处理
-    - completed: 已完成
-    - failed: 失败
-    """
+# ==================== 任务管理 ====================
+
+@router.get("/books/{book_id}/jobs", response_model=List[schemas.TTSJob])
+def get_book_jobs(book_id: int, db: Session = Depends(get_db)):
+    """获取书籍最近的合成任务"""
     book = crud.get_book(db, book_id)
     if not book:
         raise HTTPException(404, "书籍不存在")
-    
-    # 统计各状态的段落数量
-    from sqlalchemy import func
-    from app import models
-    
-    status_counts = db.query(
-        models.Paragraph.tts_status,
-        func.count(models.Paragraph.id)
-    ).filter(
-        models.Paragraph.book_id == book_id
-    ).group_by(models.Paragraph.tts_status).all()
-    
-    # 转换为字典
-    counts = {status: count for status, count in status_counts}
+    return crud.get_book_tts_jobs(db, book_id)
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.TTSJob)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """获取合成任务详情"""
+    job = crud.get_tts_job(db, job_id)
+    if not job:
+        raise HTTPException(404, "任务不存在")
+    return job
+
+
+def _change_job_status(db: Session, job_id: int, status: str, from_statuses: tuple) -> models.TTSJob:
+    """修改任务状态并通知 worker"""
+    job = crud.get_tts_job(db, job_id)
+    if not job:
+        raise HTTPException(404, "任务不存在")
+    if not crud.set_tts_job_status(db, job_id, status, from_statuses):
+        raise HTTPException(409, f"任务当前状态为 {job.status}，无法执行该操作")
+    tts_queue.notify_job_changed(job_id)
+    db.refresh(job)
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=schemas.TTSJob)
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    """取消任务（正在合成的段落完成后停止，其余段落保持 pending）"""
+    return _change_job_status(db, job_id, "cancelled", ("queued", "running", "paused"))
+
+
+@router.post("/jobs/{job_id}/pause", response_model=schemas.TTSJob)
+def pause_job(job_id: int, db: Session = Depends(get_db)):
+    """暂停任务"""
+    return _change_job_status(db, job_id, "paused", ("queued", "running"))
+
+
+@router.post("/jobs/{job_id}/resume", response_model=schemas.TTSJob)
+def resume_job(job_id: int, db: Session = Depends(get_db)):
+    """恢复已暂停的任务（重新进入队列）"""
+    job = _change_job_status(db, job_id, "queued", ("paused",))
+    tts_queue.notify_job_queued()
+    return job
+
+
+def _build_progress(book: models.Book) -> dict:
+    """根据书籍状态计数构建进度信息（含吞吐量与预计剩余时间）"""
+    # 各状态的段落数量（书籍行上维护的计数，无需扫描段落表）
+    counts = crud.get_status_counts(book)
     
     pending = counts.get("pending", 0)
     processing = counts.get("processing", 0)
@@ -226,18 +325,86 @@ def get_synthesis_progress(book_id: int, db: Session = Depends(get_db)):
     else:
         status = "in_progress"
     
+    # 最近一分钟的合成速度，用于估算剩余时间
+    throughput = events.synthesis_meter.rate_per_minute(book.id)
+    remaining = pending + processing
+    eta_seconds = int(remaining / throughput * 60) if throughput > 0 and remaining else None
+    
     return {
-        "book_id": book_id,
+        "book_id": book.id,
         "status": status,
         "progress": round(progress, 1),
         "total_paragraphs": total,
         "pending": pending,
         "processing": processing,
         "completed": completed,
-        "failed": failed
+        "failed": failed,
+        "throughput_per_min": round(throughput, 1),
+        "eta_seconds": eta_seconds,
+        # 运行中任务的自适应并发窗口（limit/in_flight/平均延迟），无任务时为 None
+        "concurrency": get_book_concurrency(book.id)
     }
 
 
+@router.get("/books/{book_id}/progress")
+def get_synthesis_progress(book_id: int, db: Session = Depends(get_db)):
+    """
+    获取合成进度
+    
+    返回各状态的段落数量：
+    - pending: 等待处理
+    - processing: 正在处理
+    - completed: 已完成
+    - failed: 失败
+    
+    以及最近一分钟的吞吐量 (throughput_per_min)、预计剩余秒数 (eta_seconds)
+    和运行中任务的自适应并发窗口 (concurrency)
+    """
+    book = crud.get_book(db, book_id)
+    if not book:
+        raise HTTPException(404, "书籍不存在")
+    return _build_progress(book)
+
+
+def _progress_snapshot(book_id: int) -> Optional[dict]:
+    """读取进度快照（在线程池中执行）"""
+    db = SessionLocal()
+    try:
+        book = crud.get_book(db, book_id)
+        if not book:
+            return None
+        return {"type": "progress", **_build_progress(book)}
+    finally:
+        db.close()
+
+
+@router.get("/books/{book_id}/progress/stream")
+async def stream_synthesis_progress(book_id: int, request: Request):
+    """
+    合成进度事件流 (Server-Sent Events)
+    
+    取代轮询 /progress，事件类型：
+    - progress: 进度快照（连接时立即发送，之后有变化时最多每秒一次）
+    - paragraph: 段落状态变化 {paragraph_id, status, error}
+    - job: 合成任务状态变化 {job_id, status, ...}
+    """
+    # 先订阅再读取快照，避免漏掉两者之间的事件
+    sub = events.event_bus.subscribe(events.book_topic(book_id))
+    initial = await asyncio.to_thread(_progress_snapshot, book_id)
+    if initial is None:
+        sub.close()
+        raise HTTPException(404, "书籍不存在")
+
+    async def snapshot():
+        return await asyncio.to_thread(_progress_snapshot, book_id)
+
+    return StreamingResponse(
+        events.stream_events(request, sub, snapshot=snapshot, initial=initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/audio/{book_id}/{paragraph_id}")
 def get_audio(book_id: int, paragraph_id: int):
     """获取段落音频"""
@@ -65,6 +65,11 @@ class ChapterSimple(ChapterBase):
     id: int
     book_id: int
     total_paragraphs: int
+    pending_paragraphs: int = 0
+    processing_paragraphs: int = 0
+    completed_paragraphs: int = 0
+    failed_paragraphs: int = 0
+    decode_status: str = "decoded"
     
     class Config:
         from_attributes = True
@@ -87,7 +92,12 @@ class Book(BookBase):
     total_paragraphs: int
     total_duration_ms: int
     tts_progress: float
+    pending_paragraphs: int = 0
+    processing_paragraphs: int = 0
+    completed_paragraphs: int = 0
+    failed_paragraphs: int = 0
     tts_voice: str
+    import_status: str = "completed"
     created_at: datetime
     
     class Config:
@@ -113,6 +123,30 @@ class SynthesizeResponse(BaseModel):
     total: int = 0
     completed: int = 0
     failed: int = 0
+    job_id: Optional[int] = None
+
+
+class TTSJob(BaseModel):
+    """合成任务信息"""
+    id: int
+    book_id: int
+    scope: str
+    chapter_id: Optional[int] = None
+    voice: str
+    max_concurrent: int
+    status: str
+    total: int
+    completed: int
+    failed: int
+    error: Optional[str] = None
+    lease_owner: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 
 class VoiceInfo(BaseModel):
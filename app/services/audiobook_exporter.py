@@ -1,10 +1,17 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
 import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
 from sqlalchemy.orm import Session
 
 from app import models, crud
 from app.config import get_settings
+from app.services.events import event_bus, export_topic
 from app.utils.text import split_to_sentences, sanitize_filename
 from app.utils.audio import merge_audio_to_wav, merge_audio
 from app.utils.files import get_export_dir, get_zip_path, create_zip_archive, cleanup_book_files
@@ -15,6 +22,10 @@ settings = get_settings()
 OUTPUT_DIR = Path(settings.OUTPUT_DIR)
 OUTPUT_DIR.mkdir(exist_ok=True)
 
+# 导出清单（记录各分组输入指纹，用于增量导出）
+MANIFEST_NAME = ".export_manifest.json"
+MANIFEST_VERSION = 2
+
 # 时长阈值（毫秒）
 MIN_DURATION_MS = 25 * 60 * 1000   # 25 分钟
 TARGET_DURATION_MS = 40 * 60 * 1000  # 40 分钟
@@ -27,12 +38,15 @@ def group_chapters_by_duration(
     """
     按时长分组章节，目标 ~40 分钟，最低 25 分钟。
     
+    章节和段落各只查询一次，段落只取分组与指纹所需的轻量字段
+    （见 crud.get_book_paragraph_summaries），生成 LRC 时再按分组加载正文。
+    
     返回:
         [
             {
                 'chapter_indices': [1, 2],      # 章节编号列表
                 'chapters': [chapter1, chapter2], # 章节对象列表
-                'paragraphs': [...],             # 所有段落
+                'paragraphs': [...],             # 所有段落（轻量投影行）
                 'total_duration_ms': 2400000     # 总时长(毫秒)
             },
             ...
@@ -42,6 +56,11 @@ def group_chapters_by_duration(
     if not chapters:
         return []
     
+    # 一次查询取回全书段落，按章节归类（查询已按章节、段落顺序排列）
+    chapter_paragraphs: Dict[int, List] = {}
+    for row in crud.get_book_paragraph_summaries(db, book_id):
+        chapter_paragraphs.setdefault(row.chapter_id, []).append(row)
+    
     groups = []
     current_group = {
         'chapter_indices': [],
@@ -51,8 +70,7 @@ def group_chapters_by_duration(
     }
     
     for chapter in chapters:
-        # 获取此章节的所有段落
-        paragraphs = crud.get_chapter_paragraphs(db, chapter.id)
+        paragraphs = chapter_paragraphs.get(chapter.id)
         if not paragraphs:
             continue
         
@@ -144,7 +162,7 @@ def generate_lrc(
     每个句子一行 LRC，时间戳按句子字数比例分配。
     
     Args:
-        paragraphs: 段落列表（已按顺序排列）
+        paragraphs: 段落列表（已按顺序排列，ORM 对象或 crud.get_paragraphs_for_lrc 的结果行）
         book_title: 书名（LRC 元数据）
         author: 作者（LRC 元数据）
     
@@ -218,18 +236,183 @@ def generate_lrc(
     return "\n".join(lines)
 
 
+def _export_group(task: Dict) -> Dict:
+    """
+    导出单个分组：写入 LRC 并合并音频。
+
+    只接收可序列化的普通数据，不访问数据库，可在子进程中执行。
+    """
+    segment_dir = Path(task['segment_dir'])
+    segment_dir.mkdir(parents=True, exist_ok=True)
+
+    mp3_path = Path(task['mp3_path'])
+    lrc_path = Path(task['lrc_path'])
+
+    with open(lrc_path, 'w', encoding='utf-8') as f:
+        f.write(task['lrc_content'])
+
+    # 合并音频为 MP3
+    audio_success = merge_audio(task['audio_paths'], str(mp3_path), output_format="mp3", bitrate="64k")
+
+    if not audio_success:
+        # 如果音频生成失败，清理已生成的 LRC 和空文件夹
+        if lrc_path.exists():
+            lrc_path.unlink()
+        if segment_dir.exists() and not any(segment_dir.iterdir()):
+            segment_dir.rmdir()
+
+    return {
+        'folder': task['folder'],
+        'chapters': task['chapter_indices'],
+        'duration_ms': task['duration_ms'],
+        'wav_generated': audio_success,
+        'lrc_generated': audio_success,  # 失败时 LRC 已删除
+        'wav_path': str(mp3_path) if audio_success else None,
+        'lrc_path': str(lrc_path) if audio_success else None
+    }
+
+
+def _failed_group_result(task: Dict) -> Dict:
+    return {
+        'folder': task['folder'],
+        'chapters': task['chapter_indices'],
+        'duration_ms': task['duration_ms'],
+        'wav_generated': False,
+        'lrc_generated': False,
+        'wav_path': None,
+        'lrc_path': None
+    }
+
+
+def _run_group_tasks(
+    tasks: List[Dict],
+    workers: int,
+    on_progress: Optional[Callable[[int, int, Dict], None]] = None
+) -> List[Dict]:
+    """
+    执行分组导出任务
+
+    workers > 1 时使用进程池并发合并，结果始终按分组顺序返回。
+    """
+    total = len(tasks)
+    results: List[Optional[Dict]] = [None] * total
+    done = 0
+
+    def _finish(index: int, result: Dict):
+        nonlocal done
+        results[index] = result
+        done += 1
+        status = "完成" if result['wav_generated'] else "失败"
+        print(f"[导出] 段 {done}/{total} {status}: {result['folder']}")
+        if not result['wav_generated']:
+            print(f"[导出] 警告: 音频生成失败，跳过该段: {result['folder']}")
+        if on_progress is not None:
+            on_progress(done, total, result)
+
+    if workers <= 1 or total <= 1:
+        for index, task in enumerate(tasks):
+            _finish(index, _export_group(task))
+        return results
+
+    # spawn 启动子进程，避免 fork 带有后台线程的服务进程
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, total), mp_context=context) as pool:
+        futures = {pool.submit(_export_group, task): index for index, task in enumerate(tasks)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[导出] 分组 {tasks[index]['folder']} 出错: {e}")
+                result = _failed_group_result(tasks[index])
+            _finish(index, result)
+
+    return results
+
+
+def _group_fingerprint(group: Dict, book: models.Book, lrc_rows: List) -> Tuple[str, List]:
+    """
+    计算分组输入指纹
+
+    输入包括每个段落的 ID、音频路径、文件大小/修改时间、时长和字数，
+    生成 LRC 所用的文本与句子时间戳（取哈希），以及 LRC 元数据（书名、作者）；
+    任一变化都会导致该分组重新导出。
+
+    Args:
+        lrc_rows: 该分组的 crud.get_paragraphs_for_lrc 结果
+    """
+    lrc_sources = {
+        row.id: hashlib.sha256(
+            json.dumps([row.content, row.sentence_timings], ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        for row in lrc_rows
+    }
+    inputs = []
+    for p in group['paragraphs']:
+        size, mtime_ns = None, None
+        if p.audio_path:
+            try:
+                stat = os.stat(p.audio_path)
+                size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            except OSError:
+                pass
+        inputs.append([
+            p.id, p.audio_path, size, mtime_ns,
+            p.audio_duration_ms, p.estimated_duration_ms, p.char_count, lrc_sources.get(p.id)
+        ])
+
+    payload = json.dumps(
+        {'title': book.title, 'author': book.author, 'inputs': inputs},
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest(), inputs
+
+
+def _load_manifest(book_dir: Path) -> Dict:
+    """读取导出清单，不存在或版本不符时返回空清单"""
+    manifest_path = book_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('groups', {})
+
+
+def _save_manifest(book_dir: Path, groups: Dict):
+    """原子写入导出清单"""
+    manifest_path = book_dir / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'groups': groups}, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
 def export_book(
     db: Session,
     book_id: int,
-    output_base_dir: str = None
+    output_base_dir: str = None,
+    workers: int = None,
+    on_progress: Optional[Callable[[int, int, Dict], None]] = None,
+    force: bool = False
 ) -> Dict:
     """
-    导出整本书为 MP3 + LRC 文件。
+    导出整本书为 MP3 + LRC 文件（增量）。
+
+    导出目录中的清单记录了每个分组的输入指纹，再次导出时只重新合并
+    输入发生变化的分组，其余分组直接复用已有文件。
     
     Args:
         db: 数据库会话
         book_id: 书籍 ID
         output_base_dir: 输出根目录（默认 output/）
+        workers: 并发合并的进程数（默认读取 EXPORT_WORKERS，1 表示顺序执行）
+        on_progress: 每个分组完成后的回调 (已完成数, 总数, 分组结果)
+        force: 忽略清单，清空目录后全部重新导出
     
     Returns:
         导出结果字典
@@ -238,38 +421,63 @@ def export_book(
     if not book:
         return {'success': False, 'message': '书籍不存在'}
     
+    workers = workers or settings.EXPORT_WORKERS
+
     # 准备输出目录
     base_dir = Path(output_base_dir) if output_base_dir else OUTPUT_DIR
     book_dir = base_dir / sanitize_filename(book.title)
     
-    # 清空旧的导出
-    if book_dir.exists():
+    # 强制全量导出时清空旧的导出
+    if force and book_dir.exists():
         shutil.rmtree(book_dir)
     book_dir.mkdir(parents=True, exist_ok=True)
     
     print(f"[导出] 开始导出书籍: {book.title} (ID: {book_id})")
+    topic = export_topic(book_id)
     
     # 分组章节
     groups = group_chapters_by_duration(db, book_id)
     
     if not groups:
+        event_bus.publish(topic, "export_finished", success=False, message='没有可导出的章节')
         return {'success': False, 'message': '没有可导出的章节'}
     
-    print(f"[导出] 共分为 {len(groups)} 个音频段")
-    
-    results = []
-    success_count = 0
-    fail_count = 0
+    previous = _load_manifest(book_dir)
+    manifest = {}
+    print(f"[导出] 共分为 {len(groups)} 个音频段, 并发进程数 {workers}")
     
+    # 在主进程中读取数据库、生成 LRC，子进程只处理文件
+    results: List[Optional[Dict]] = [None] * len(groups)
+    tasks = []
+    task_indices = []
     for i, group in enumerate(groups):
         folder_name = _get_group_folder_name(group['chapter_indices'])
-        
-        # 创建段落子文件夹
         segment_dir = book_dir / folder_name
-        segment_dir.mkdir(parents=True, exist_ok=True)
-        
         mp3_path = segment_dir / f"{folder_name}.mp3"
         lrc_path = segment_dir / f"{folder_name}.lrc"
+        # LRC 的输入（正文与句子时间戳）按分组加载，同时用于指纹和生成 LRC
+        lrc_rows = crud.get_paragraphs_for_lrc(db, [p.id for p in group['paragraphs']])
+        fingerprint, inputs = _group_fingerprint(group, book, lrc_rows)
+        manifest[folder_name] = {
+            'fingerprint': fingerprint,
+            'paragraph_ids': [p.id for p in group['paragraphs']],
+            'inputs': inputs,
+        }
+
+        # 输入未变化且文件仍在：直接复用
+        entry = previous.get(folder_name)
+        if entry and entry.get('fingerprint') == fingerprint and mp3_path.exists() and lrc_path.exists():
+            results[i] = {
+                'folder': folder_name,
+                'chapters': group['chapter_indices'],
+                'duration_ms': group['total_duration_ms'],
+                'wav_generated': True,
+                'lrc_generated': True,
+                'wav_path': str(mp3_path),
+                'lrc_path': str(lrc_path),
+                'reused': True
+            }
+            continue
         
         duration_min = group['total_duration_ms'] / 60000
         chapter_titles = ", ".join(
@@ -278,51 +486,67 @@ def export_book(
         print(f"[导出] 段 {i+1}/{len(groups)}: {folder_name} "
               f"(预估 {duration_min:.1f} 分钟, 章节: {chapter_titles})")
         
-        # 生成 LRC 歌词
-        lrc_content = generate_lrc(
-            group['paragraphs'],
-            book_title=book.title,
-            author=book.author
-        )
-        with open(lrc_path, 'w', encoding='utf-8') as f:
-            f.write(lrc_content)
-        print(f"[导出] LRC 已生成: {lrc_path}")
-        
-        # 合并音频为 MP3
-        audio_paths = [p.audio_path for p in group['paragraphs']]
-        wav_success = merge_audio(audio_paths, str(mp3_path), output_format="mp3", bitrate="64k")
-        
-        if wav_success:
-            success_count += 1
-        else:
-            fail_count += 1
-        
-        if not wav_success:
-            # 如果音频生成失败，清理已生成的 LRC 和空文件夹
-            if lrc_path.exists():
-                lrc_path.unlink()
-            if segment_dir.exists() and not any(segment_dir.iterdir()):
-                segment_dir.rmdir()
-            
-            print(f"[导出] 警告: 音频生成失败，跳过该段: {folder_name}")
-        
-        results.append({
+        task_indices.append(i)
+        tasks.append({
             'folder': folder_name,
-            'chapters': group['chapter_indices'],
+            'chapter_indices': group['chapter_indices'],
             'duration_ms': group['total_duration_ms'],
-            'wav_generated': wav_success,
-            'lrc_generated': True if wav_success else False,  # 标记为 False 因为已删除
-            'wav_path': str(wav_path) if wav_success else None,
-            'lrc_path': str(lrc_path) if wav_success else None
+            'segment_dir': str(segment_dir),
+            'mp3_path': str(mp3_path),
+            'lrc_path': str(lrc_path),
+            # 生成 LRC 歌词（只为需要重建的分组生成）
+            'lrc_content': generate_lrc(lrc_rows, book_title=book.title, author=book.author),
+            'audio_paths': [p.audio_path for p in group['paragraphs']],
         })
+
+    # 清理已不属于任何分组的旧目录（如章节重新分组后）
+    for item in book_dir.iterdir():
+        if item.is_dir() and item.name not in manifest:
+            shutil.rmtree(item)
+
+    reused_count = len(groups) - len(tasks)
+    if reused_count:
+        print(f"[导出] {reused_count} 个音频段未变化，直接复用")
+    event_bus.publish(
+        topic, "export_started",
+        total_segments=len(groups), rebuild_segments=len(tasks), reused_count=reused_count
+    )
+
+    def _on_group_done(done: int, total: int, result: Dict):
+        event_bus.publish(
+            topic, "export_group",
+            done=done, total=total, folder=result['folder'], success=result['wav_generated']
+        )
+        if on_progress is not None:
+            on_progress(done, total, result)
+    
+    for index, result in zip(task_indices, _run_group_tasks(tasks, workers, _on_group_done)):
+        result['reused'] = False
+        results[index] = result
+
+    # 失败的分组不写入清单，下次导出时重试
+    for result in results:
+        if not result['wav_generated']:
+            manifest.pop(result['folder'], None)
+    _save_manifest(book_dir, manifest)
+
+    success_count = sum(1 for r in results if r['wav_generated'])
+    fail_count = len(results) - success_count
     
     total = len(groups)
     message = f"导出完成: {success_count}/{total} 个音频段成功"
+    if reused_count:
+        message += f" (其中 {reused_count} 个未变化已复用)"
     if fail_count > 0:
         message += f", {fail_count} 个失败（可能缺少已合成的音频）"
     
     print(f"[导出] {message}")
     print(f"[导出] 输出目录: {book_dir}")
+    event_bus.publish(
+        topic, "export_finished",
+        success=success_count > 0, message=message, success_count=success_count,
+        fail_count=fail_count, reused_count=reused_count
+    )
     
     return {
         'success': success_count > 0,
@@ -331,11 +555,17 @@ def export_book(
         'total_segments': total,
         'success_count': success_count,
         'fail_count': fail_count,
+        'reused_count': reused_count,
         'segments': results
     }
 
 
-def export_book_background(book_id: int, output_base_dir: str = None):
+def export_book_background(
+    book_id: int,
+    output_base_dir: str = None,
+    workers: int = None,
+    force: bool = False
+):
     """
     后台任务专用的导出函数。
     创建独立的数据库 Session。
@@ -344,11 +574,14 @@ def export_book_background(book_id: int, output_base_dir: str = None):
     
     db = SessionLocal()
     try:
-        result = export_book(db, book_id, output_base_dir)
+        result = export_book(db, book_id, output_base_dir, workers=workers, force=force)
         if result['success']:
             print(f"[导出] 后台导出完成: 书籍 {book_id}")
         else:
             print(f"[导出] 后台导出失败: {result['message']}")
+    except Exception as e:
+        event_bus.publish(export_topic(book_id), "export_finished", success=False, message=f"导出出错: {e}")
+        raise
     finally:
         db.close()
 
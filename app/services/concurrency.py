@@ -0,0 +1,199 @@
+"""
+自适应并发控制 (AIMD)
+根据 TTS 引擎的实际延迟和失败率动态调整并发数：
+健康时每轮加一（加性增），失败或延迟骤增时减半（乘性减）
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# 延迟按字数归一化时的最小字数（避免极短段落的固定开销放大单字延迟）
+MIN_COST_CHARS = 20
+# 单字延迟超过基线的倍数：不再增加并发
+LATENCY_TOLERANCE = 2.0
+# 单字延迟超过基线的倍数：视为被限流（如引擎内部重试），立即减半
+LATENCY_BACKOFF = 4.0
+# 延迟平滑系数
+EWMA_ALPHA = 0.2
+# 基线缓慢上浮的系数，适应引擎整体变慢
+BASELINE_DRIFT = 0.01
+
+
+class LimiterSlot:
+    """一次并发占用，调用方在请求结束后通过 record() 反馈结果"""
+
+    __slots__ = ("generation", "sample")
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        # (是否成功, 耗时秒数, 字数)；未记录时不参与调节（如命中缓存）
+        self.sample = None
+
+    def record(self, success: bool, latency: float, cost: int = 0):
+        self.sample = (success, latency, cost)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 自适应并发限制器
+
+    - 当前窗口 limit 内的请求全部健康完成后，limit + 1
+    - 请求失败或单字延迟超过基线 LATENCY_BACKOFF 倍时，limit 减半；
+      同一窗口内发出的请求只触发一次减半，避免一次抖动把并发降到底
+    - 不启用自适应时 (adaptive=False) 等价于固定大小的信号量
+
+    使用示例:
+        async with limiter.slot() as slot:
+            start = time.monotonic()
+            ok = await provider.generate_audio(...)
+            slot.record(ok, time.monotonic() - start, len(text))
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        initial: int = None,
+        min_limit: int = None,
+        adaptive: bool = None
+    ):
+        self.adaptive = settings.TTS_ADAPTIVE_CONCURRENCY if adaptive is None else adaptive
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit or settings.TTS_MIN_CONCURRENCY, self.max_limit))
+        if self.adaptive:
+            initial = initial or settings.TTS_INITIAL_CONCURRENCY
+            self.limit = min(max(initial, self.min_limit), self.max_limit)
+        else:
+            self.limit = self.max_limit
+
+        self.in_flight = 0
+        self._generation = 0
+        self._window_successes = 0
+        self._cond: Optional[asyncio.Condition] = None
+
+        # 单字延迟（秒/字）的基线与平滑值，原始延迟的平滑值用于展示
+        self._baseline: Optional[float] = None
+        self._ewma: Optional[float] = None
+        self._latency_ewma: Optional[float] = None
+
+        self.successes = 0
+        self.failures = 0
+        self.increases = 0
+        self.decreases = 0
+
+    def _condition(self) -> asyncio.Condition:
+        # 在首次使用时创建，绑定到调用方的事件循环
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[LimiterSlot]:
+        """占用一个并发名额（名额不足时等待）"""
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            slot = LimiterSlot(self._generation)
+        try:
+            yield slot
+        finally:
+            async with cond:
+                self.in_flight -= 1
+                if slot.sample is not None:
+                    self._on_sample(slot.generation, *slot.sample)
+                cond.notify_all()
+
+    def _on_sample(self, generation: int, success: bool, latency: float, cost: int):
+        if success:
+            self.successes += 1
+            self._latency_ewma = latency if self._latency_ewma is None else (
+                self._latency_ewma + (latency - self._latency_ewma) * EWMA_ALPHA
+            )
+        else:
+            self.failures += 1
+
+        if not self.adaptive:
+            return
+
+        if not success:
+            self._decrease(generation)
+            return
+
+        per_char = latency / max(cost, MIN_COST_CHARS)
+        if self._baseline is None or per_char < self._baseline:
+            self._baseline = per_char
+        else:
+            self._baseline += (per_char - self._baseline) * BASELINE_DRIFT
+        self._ewma = per_char if self._ewma is None else self._ewma + (per_char - self._ewma) * EWMA_ALPHA
+
+        if per_char > self._baseline * LATENCY_BACKOFF:
+            self._decrease(generation)
+        elif self._ewma <= self._baseline * LATENCY_TOLERANCE:
+            self._window_successes += 1
+            if self._window_successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self.increases += 1
+                self._window_successes = 0
+
+    def _decrease(self, generation: int):
+        # 减半之前发出的请求再失败不重复减半
+        if generation != self._generation:
+            return
+        self._generation += 1
+        self._window_successes = 0
+        new_limit = max(self.min_limit, self.limit // 2)
+        if new_limit < self.limit:
+            self.limit = new_limit
+            self.decreases += 1
+
+    def stats(self) -> Dict:
+        """当前并发窗口与延迟统计"""
+        return {
+            'adaptive': self.adaptive,
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'avg_latency_ms': int(self._latency_ewma * 1000) if self._latency_ewma is not None else None,
+            'successes': self.successes,
+            'failures': self.failures,
+            'increases': self.increases,
+            'decreases': self.decreases,
+        }
+
+
+# 正在运行的限制器（job_id -> (book_id, limiter)），供进度接口查询
+_active: Dict[int, tuple] = {}
+_active_lock = threading.Lock()
+
+
+def register_limiter(job_id: int, book_id: int, limiter: AdaptiveLimiter):
+    with _active_lock:
+        _active[job_id] = (book_id, limiter)
+
+
+def unregister_limiter(job_id: int):
+    with _active_lock:
+        _active.pop(job_id, None)
+
+
+def get_book_concurrency(book_id: int) -> Optional[Dict]:
+    """书籍当前正在运行的合成任务的并发窗口（无运行中任务时返回 None）"""
+    with _active_lock:
+        limiters = [limiter for bid, limiter in _active.values() if bid == book_id]
+    if not limiters:
+        return None
+    if len(limiters) == 1:
+        return limiters[0].stats()
+    stats = [limiter.stats() for limiter in limiters]
+    return {
+        'adaptive': any(s['adaptive'] for s in stats),
+        'limit': sum(s['limit'] for s in stats),
+        'in_flight': sum(s['in_flight'] for s in stats),
+        'jobs': stats,
+    }
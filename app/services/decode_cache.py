@@ -0,0 +1,186 @@
+"""
+电子书解码缓存
+按 (文件内容哈希, 解码器版本, 解析选项) 做内容寻址，命中时直接从缓存读取章节与段落，
+跳过文档解析和智能分章的 LLM 调用；重复导入同一本书（改名、删除后重新上传）只剩批量写库
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.config import get_settings
+from app.services.disk_lru import DiskLRUCache
+
+# 缓存内容版本：缓存文件格式或导入端的解析规则变化时递增，使旧条目全部失效；
+# 解码源码的改动另由 source_fingerprint 自动计入 key，不依赖手动递增
+CACHE_SCHEMA_VERSION = 2
+
+# 计算文件哈希时每次读取的字节数
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """计算文件内容的 SHA-256（分块读取，不整体载入内存）"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@lru_cache()
+def source_fingerprint(*modules: ModuleType) -> str:
+    """
+    模块源码指纹（包按目录下全部 .py 文件计算）
+
+    计入缓存 key 后，解码逻辑改动即使没有升版本号，旧的缓存条目也不会再被命中
+    """
+    files = []
+    for module in modules:
+        path = Path(module.__file__)
+        files.extend(sorted(path.parent.rglob("*.py")) if path.name == "__init__.py" else [path])
+
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _dump_line(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class DecodeCache(DiskLRUCache):
+    """
+    磁盘解码缓存（按总大小做 LRU 淘汰）
+
+    每个条目是一个 gzip 压缩的 JSON Lines 文件，按 key 前两位分目录存放:
+    - 第一行: 书籍元数据 {"title", "author"}
+    - 之后每行一个章节: [标题, [段落, ...]]
+
+    写入和读取都逐章进行，不需要将整本书放入内存。
+    """
+
+    SUFFIXES = (".jsonl.gz",)
+
+    @staticmethod
+    def make_key(file_hash: str, decoder: str, options: Dict) -> str:
+        """根据文件内容哈希、解码器标识（格式与版本）和解析选项计算缓存 key"""
+        raw = "\x1f".join([
+            str(CACHE_SCHEMA_VERSION),
+            file_hash,
+            decoder,
+            json.dumps(options, sort_keys=True, ensure_ascii=False)
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> Path:
+        return self._path(key, ".jsonl.gz")
+
+    def _open_entry(self, key: str):
+        """打开条目并读取元数据行，返回 (元数据, 文件)；出错时关闭文件后抛出"""
+        f = gzip.open(self._file(key), "rt", encoding="utf-8")
+        try:
+            return json.loads(f.readline()), f
+        except BaseException:
+            f.close()
+            raise
+
+    def load(self, key: str) -> Optional[Tuple[Dict, Iterator[Tuple[str, list]]]]:
+        """
+        查询缓存
+
+        Returns:
+            命中时返回 (元数据, 章节迭代器)，否则 None；章节迭代器逐行解压读取
+        """
+        opened = self._lookup(key, self._open_entry)
+        if opened is None:
+            return None
+        meta, f = opened
+        return meta, self._iter_chapters(key, f)
+
+    def _iter_chapters(self, key: str, f) -> Iterator[Tuple[str, list]]:
+        """逐行读取章节；文件损坏时删除条目并抛出异常"""
+        try:
+            with f:
+                for line in f:
+                    title, paragraphs = json.loads(line)
+                    yield title, paragraphs
+        except (OSError, ValueError, EOFError):
+            self._discard(key)
+            raise
+
+    def record(self, key: str, meta: Dict, chapters: Iterator[Tuple[str, list]]) -> Iterator[Tuple[str, list]]:
+        """
+        透传章节迭代器，同时逐章写入缓存
+
+        只有完整迭代结束后才生效（先写临时文件再原子替换），
+        中途出错或提前关闭时丢弃；写缓存失败不影响导入。
+        """
+        path = self._file(key)
+        tmp = path.parent / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        f = None
+        finished = False
+        try:
+            path.parent.mkdir(exist_ok=True)
+            f = gzip.open(tmp, "wt", encoding="utf-8")
+            f.write(_dump_line(meta))
+        except OSError as e:
+            print(f"[解码缓存] 写入失败: {e}")
+            f = self._abort(f, tmp)
+
+        try:
+            for chapter in chapters:
+                if f is not None:
+                    try:
+                        f.write(_dump_line(list(chapter)))
+                    except OSError as e:
+                        print(f"[解码缓存] 写入失败: {e}")
+                        f = self._abort(f, tmp)
+                yield chapter
+            finished = True
+        finally:
+            close = getattr(chapters, "close", None)
+            if close is not None:
+                close()
+            if f is not None and finished:
+                self._commit(key, f, tmp, path)
+            elif f is not None:
+                self._abort(f, tmp)
+
+    def _commit(self, key: str, f, tmp: Path, path: Path):
+        """关闭临时文件并替换为正式条目"""
+        try:
+            f.close()
+            os.replace(tmp, path)
+            self._register(key)
+        except OSError as e:
+            print(f"[解码缓存] 写入失败: {e}")
+            self._abort(None, tmp)
+
+    @staticmethod
+    def _abort(f, tmp: Path) -> None:
+        """放弃写入，删除临时文件"""
+        if f is not None:
+            try:
+                f.close()
+            except OSError:
+                pass
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return None
+
+
+@lru_cache()
+def get_decode_cache() -> DecodeCache:
+    """获取进程内共享的解码缓存实例"""
+    settings = get_settings()
+    return DecodeCache(settings.DECODE_CACHE_DIR, settings.DECODE_CACHE_MAX_MB * 1024 * 1024)
@@ -3,25 +3,46 @@
 使用 ebook_decoder 模块解析电子书，统一通过基类接口调用
 """
 import os
+import queue
 import sys
+import threading
+from contextlib import ExitStack
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 from sqlalchemy.orm import Session
 
 # 添加项目路径
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from ebook_decoder import DecoderFactory
+import ebook_decoder
+from ebook_decoder import DecoderFactory, iter_decoded_pages
+from ebook_decoder import __version__ as ebook_decoder_version
+from ebook_decoder.parallel import default_workers
 from app import crud
 from app.config import get_settings
+from app.services import lazy_import
+from app.services.decode_cache import get_decode_cache, hash_file, source_fingerprint
 from app.services.llm_service import LLMClient
 
 settings = get_settings()
 
 
+# 章节数据: (标题, 段落文本列表)
+ChapterData = Tuple[str, List[str]]
+
+# 智能分章每次交给 LLM 的文本长度（LLM 可处理 ~15000 字符的块）
+SMART_CHUNK_CHARS = 15000
+
+
 def decode_ebook(db: Session, file_path: str) -> Tuple[int, str]:
     """
-    解码电子书并存入数据库
+    解码电子书并存入数据库（流式导入）
+
+    解码在后台线程中逐页/逐章进行，经有界队列交给当前线程写库；
+    段落攒满 IMPORT_BATCH_SIZE 条后批量插入并提交，内存占用与书籍大小无关，
+    导入过程中已提交的章节即可查询和合成（书籍 import_status 为 importing）。
+    IMPORT_BATCH_SIZE 为 0 时整本书在一个事务中写入。
+    页数达到 LAZY_PDF_MIN_PAGES 的 PDF 改为延迟解码（见 lazy_import）。
 
     Args:
         db: 数据库会话
@@ -33,127 +54,303 @@ def decode_ebook(db: Session, file_path: str) -> Tuple[int, str]:
     if not os.path.exists(file_path):
         return None, f"文件不存在: {file_path}"
 
+    # 大 PDF 只记录目录与页码范围，章节在访问/合成时解码
+    if lazy_import.should_import_lazily(file_path):
+        return lazy_import.import_lazy_book(db, file_path)
+
+    book_id = None
     try:
-        with DecoderFactory.create(file_path) as decoder:
-            # 使用基类统一接口获取元数据
-            book_record = decoder.create_book_record()
-            title = book_record.title or Path(file_path).stem
-            author = book_record.author or '未知'
-
-            # 创建书籍记录
-            book = crud.create_book(db, title=title, author=author, file_path=file_path)
-
-            # 获取章节数据，章节分片
-            if settings.ENABLE_SMART_PARSING:
-                print("正在使用 LLM 进行智能分章...")
-                chapters_data = _smart_extract_chapters(decoder)
+        with ExitStack() as stack:
+            title, author, chapters = _open_chapters(file_path, stack)
+            stack.callback(chapters.close)
+
+            if settings.IMPORT_BATCH_SIZE <= 0:
+                # 单事务导入：失败时整体回滚，不留下不完整的书籍
+                writer = _ImportWriter()
+                for chapter_title, paragraphs in chapters:
+                    writer.add_chapter(chapter_title, paragraphs)
+                book_id = crud.bulk_import_book(db, title, author, file_path, writer.pending)
             else:
-                chapters_data = _extract_chapters(decoder)
-
-            # 创建章节和段落
-            total_time_ms = 0
-            for chapter_index, chapter_data in enumerate(chapters_data):
-                # 创建章节
-                chapter = crud.create_chapter(
-                    db,
-                    book_id=book.id,
-                    chapter_index=chapter_index + 1,
-                    title=chapter_data.get('title', f"章节 {chapter_index + 1}")
-                )
-
-                # 创建段落
-                paragraphs_batch = []
-                for para_index, content in enumerate(chapter_data['paragraphs']):
-                    if content.strip():
-                        char_count = len(content)
-                        duration_ms = int(char_count / 300 * 60 * 1000)
-
-                        paragraphs_batch.append({
-                            'book_id': book.id,
-                            'chapter_id': chapter.id,
-                            'paragraph_index': para_index + 1,
-                            'content': content.strip(),
-                            'start_time_ms': total_time_ms,
-                            'end_time_ms': total_time_ms + duration_ms
-                        })
-                        total_time_ms += duration_ms
-
-                if paragraphs_batch:
-                    crud.create_paragraphs_batch(db, paragraphs_batch)
-
-                # 更新章节统计
-                crud.update_chapter_stats(db, chapter.id)
-
-            # 更新书籍统计
-            crud.update_book_stats(db, book.id)
-
-            # 刷新获取最新统计
-            db.refresh(book)
-
+                # 创建书籍记录
+                book_id = crud.create_book(db, title=title, author=author, file_path=file_path, import_status="importing").id
+
+                # 后台线程解码，当前线程分批写库
+                queued = _prefetch(chapters, settings.IMPORT_QUEUE_SIZE)
+                try:
+                    writer = _ImportWriter(db, book_id, settings.IMPORT_BATCH_SIZE)
+                    for chapter_title, paragraphs in queued:
+                        writer.add_chapter(chapter_title, paragraphs)
+                    writer.flush()
+                finally:
+                    queued.close()
+
+                # 标记导入完成
+                crud.finish_book_import(db, book_id)
+
+            book = crud.get_book(db, book_id)
             return book.id, f"解析完成: {book.total_chapters} 章, {book.total_paragraphs} 段落"
 
     except Exception as e:
         import traceback
         traceback.print_exc()
+        db.rollback()
+        if book_id is not None:
+            crud.finish_book_import(db, book_id, status="failed")
         return None, f"解析失败: {str(e)}"
 
 
-def _extract_chapters(decoder) -> List[Dict]:
+def _open_chapters(file_path: str, stack: ExitStack) -> Tuple[str, str, Iterator[ChapterData]]:
+    """
+    打开电子书，返回 (书名, 作者, 章节生成器)
+
+    解码缓存命中时直接从缓存逐章读取，不打开文档；未命中时解码器注册到 stack，
+    章节在解码的同时写入缓存（完整导入后才生效）。
+    """
+    cache = get_decode_cache() if settings.DECODE_CACHE_ENABLED else None
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(hash_file(file_path), _decoder_id(file_path), _parse_options())
+        cached = cache.load(cache_key)
+        if cached is not None:
+            meta, chapters = cached
+            print(f"[解码缓存] 命中: {Path(file_path).name}")
+            title = meta['title'] or _title_from_filename(file_path, meta.get('title_from'))
+            return title, meta['author'] or '未知', chapters
+
+    decoder = stack.enter_context(DecoderFactory.create(file_path))
+
+    # 使用基类统一接口获取元数据
+    book_record = decoder.create_book_record()
+
+    # 章节生成器（解码与分章均为惰性）
+    if settings.ENABLE_SMART_PARSING:
+        print("正在使用 LLM 进行智能分章...")
+        chapters = _smart_iter_chapters(decoder)
+    else:
+        chapters = iter_chapters(decoder)
+
+    if cache is not None:
+        meta = {'title': book_record.title or "", 'author': book_record.author or ""}
+        # 解码器以文件名作为书名时不缓存书名，命中时按新文件名重新生成
+        for source in ("name", "stem"):
+            if meta['title'] == _title_from_filename(file_path, source):
+                meta['title'], meta['title_from'] = "", source
+        chapters = cache.record(cache_key, meta, chapters)
+
+    return book_record.title or Path(file_path).stem, book_record.author or '未知', chapters
+
+
+def _title_from_filename(file_path: str, source: str = None) -> str:
+    """由文件名生成书名：name 为完整文件名（PDF/EPUB 解码器的回退方式），否则为去掉扩展名的文件名"""
+    path = Path(file_path)
+    return path.name if source == "name" else path.stem
+
+
+def _decoder_id(file_path: str) -> str:
+    """解码器标识：文件格式 + ebook_decoder 版本 + 解码源码指纹（改动解码逻辑后缓存自动失效）"""
+    fingerprint = source_fingerprint(ebook_decoder, sys.modules[__name__])
+    return f"{Path(file_path).suffix.lower()}@{ebook_decoder_version}+{fingerprint}"
+
+
+def _parse_options() -> dict:
+    """影响解码结果的解析选项（计入解码缓存 key）"""
+    if not settings.ENABLE_SMART_PARSING:
+        return {'smart': False}
+    return {
+        'smart': True,
+        'llm_model': settings.LLM_MODEL_NAME,
+        'chunk_chars': SMART_CHUNK_CHARS,
+    }
+
+
+class _ImportWriter:
+    """
+    流式导入的写库端
+
+    章节和段落先在内存中累积，攒满 batch_size 条段落后
+    通过 crud.bulk_insert_chapters 批量插入并提交；超长章节在章节内部按段落分批，
+    后续批次追加到已插入的章节（crud.append_chapter_paragraphs），内存中最多保留一批段落。
+    两次提交之间不持有写锁，不会阻塞合成任务写回状态。未传入 db 时只累积，由调用方一次写入。
+    """
+
+    def __init__(self, db: Session = None, book_id: int = None, batch_size: int = 0):
+        self.db = db
+        self.book_id = book_id
+        self.batch_size = batch_size
+        self.chapter_index = 0
+        self.total_time_ms = 0
+        # 待写入的章节；带 'chapter_id' 的是已插入章节的续写部分
+        self.pending: List[dict] = []
+        self._pending_paragraphs = 0
+        # 最近一次插入的章节 ID（章节跨批次时续写到该章节）
+        self._last_chapter_id: Optional[int] = None
+
+    def add_chapter(self, title: str, paragraphs: Iterable[str]):
+        """追加一个章节及其段落（空段落跳过，段落序号保持原始位置）"""
+        self.chapter_index += 1
+        current = {'chapter_index': self.chapter_index, 'title': title, 'paragraphs': []}
+        self.pending.append(current)
+        for para_index, content in enumerate(paragraphs):
+            if not content.strip():
+                continue
+            duration_ms = crud.estimate_duration_ms(content)
+            current['paragraphs'].append({
+                'paragraph_index': para_index + 1,
+                'content': content.strip(),
+                'start_time_ms': self.total_time_ms,
+                'end_time_ms': self.total_time_ms + duration_ms
+            })
+            self.total_time_ms += duration_ms
+            self._pending_paragraphs += 1
+            if self.db is not None and self._pending_paragraphs >= self.batch_size:
+                self.flush()
+                current = {'chapter_id': self._last_chapter_id, 'paragraphs': []}
+                self.pending.append(current)
+
+        if 'chapter_id' in current and not current['paragraphs']:
+            self.pending.pop()
+
+    def flush(self):
+        """写入并提交当前批次"""
+        if not self.pending:
+            return
+        chapters = self.pending
+        if 'chapter_id' in chapters[0]:
+            crud.append_chapter_paragraphs(
+                self.db, self.book_id, chapters[0]['chapter_id'], chapters[0]['paragraphs']
+            )
+            chapters = chapters[1:]
+        stats = crud.bulk_insert_chapters(self.db, self.book_id, chapters)
+        if stats['chapter_ids']:
+            self._last_chapter_id = stats['chapter_ids'][-1]
+        self.db.commit()
+        self.pending = []
+        self._pending_paragraphs = 0
+
+
+_DONE = object()
+
+
+def _prefetch(items: Iterator[ChapterData], maxsize: int) -> Iterator[ChapterData]:
+    """
+    在后台线程中迭代 items，经有界队列逐个产出
+
+    队列满时解码线程等待写库，内存中最多保留 maxsize 个章节；
+    解码异常在消费端重新抛出，消费端提前关闭时通知解码线程退出。
+    """
+    buffer = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except Exception as e:
+            put((_DONE, e))
+        finally:
+            # 在解码线程内关闭生成器（释放解码进程池）
+            items.close()
+
+    thread = threading.Thread(target=produce, name="ebook-decode", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _decode_workers(decoder) -> int:
+    """解码进程数：页数不足 DECODE_PARALLEL_MIN_PAGES 时单进程解码（进程启动开销大于收益）"""
+    if decoder.get_page_count() < settings.DECODE_PARALLEL_MIN_PAGES:
+        return 1
+    return settings.DECODE_WORKERS or default_workers()
+
+
+def iter_chapters(decoder) -> Iterator[ChapterData]:
     """
-    从解码器提取章节数据（统一使用基类接口）
+    从解码器逐章产出 (标题, 段落列表)（统一使用基类接口）
 
     所有解码器（PDF/EPUB/TXT/MD）都实现了相同的基类方法:
     - get_page_count()
     - decode_page(page_num, book_id)
     - get_chapter_title(page_num)
+
+    每页/每个章节文件为一章，没有段落的页面跳过。
+    大文档在多进程中解码，每个进程独立打开文档，结果按页码顺序返回
     """
-    chapters = []
-    page_count = decoder.get_page_count()
+    workers = _decode_workers(decoder)
+    if workers > 1:
+        print(f"[解码] {decoder.get_page_count()} 页，使用 {workers} 个进程解码")
 
-    for i in range(page_count):
-        paras = decoder.decode_page(i, book_id=0)
+    for _, title, paras in iter_decoded_pages(decoder, workers=workers):
         if paras:
-            title = decoder.get_chapter_title(i)
-            chapters.append({
-                'title': title,
-                'paragraphs': [p.content for p in paras]
-            })
-
-    return chapters
+            yield title, [p.content for p in paras]
 
 
-def _smart_extract_chapters(decoder) -> List[Dict]:
+def _iter_text_chunks(decoder, chunk_size: int = SMART_CHUNK_CHARS) -> Iterator[str]:
     """
-    智能提取章节: 提取所有文本 -> 切片 -> LLM 清洗和重组
+    逐页拼接原始文本并按固定长度切片
+
+    只保留不足一片的尾部文本，切片结果与整本拼接后再切片一致
     """
-    # 使用基类接口提取所有原始文本
-    all_text = ""
-    page_count = decoder.get_page_count()
+    parts: List[str] = []
+    size = 0
 
-    for i in range(page_count):
-        paras = decoder.decode_page(i, book_id=0)
-        if paras:
-            page_text = "\n".join(p.content for p in paras)
-            all_text += page_text + "\n\n"
+    for _, paragraphs in iter_chapters(decoder):
+        page_text = "\n".join(paragraphs) + "\n\n"
+        parts.append(page_text)
+        size += len(page_text)
+        if size < chunk_size:
+            continue
 
-    # 切片（按固定长度，LLM 可处理 ~15000 字符的块）
-    chunk_size = 15000
-    chunks = [all_text[i:i+chunk_size] for i in range(0, len(all_text), chunk_size)]
+        text = "".join(parts)
+        end = len(text) - len(text) % chunk_size
+        for i in range(0, end, chunk_size):
+            yield text[i:i + chunk_size]
+        parts = [text[end:]]
+        size = len(parts[0])
 
+    if size:
+        yield "".join(parts)
+
+
+def _smart_iter_chapters(decoder) -> Iterator[ChapterData]:
+    """
+    智能提取章节: 逐页提取文本 -> 切片 -> LLM 清洗和重组
+
+    每个文本块处理完即产出章节，无需等待全书解码完成
+    """
     llm_client = LLMClient()
-    final_chapters = []
+    count = 0
 
-    for i, chunk in enumerate(chunks):
-        print(f"正在处理第 {i+1}/{len(chunks)} 个文本块...")
+    for i, chunk in enumerate(_iter_text_chunks(decoder)):
+        print(f"正在处理第 {i+1} 个文本块...")
         processed_chapters = llm_client.clean_and_reshape_text(chunk)
 
         for item in processed_chapters:
-            final_chapters.append({
-                'title': item.get('title', f"智能分章 {len(final_chapters)+1}"),
-                'paragraphs': item.get('content', '').split('\n\n')
-            })
-
-    return final_chapters
+            count += 1
+            yield (
+                item.get('title', f"智能分章 {count}"),
+                item.get('content', '').split('\n\n')
+            )
 
 
 def get_supported_formats() -> List[str]:
@@ -0,0 +1,144 @@
+"""
+磁盘 LRU 缓存基类
+音频缓存 (tts_cache) 与解码缓存 (decode_cache) 共用的索引、最近使用记录、按总大小淘汰与统计；
+子类只定义条目由哪些文件组成、key 的计算方式和条目的读写格式
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class DiskLRUCache:
+    """
+    磁盘缓存（按总大小做 LRU 淘汰）
+
+    每个条目由 SUFFIXES 中的若干文件组成，按 key 前两位分目录存放:
+    {cache_dir}/{key[:2]}/{key}{suffix}。第一个文件为主文件，
+    其修改时间记录最近使用时间，重启后按修改时间重建 LRU 顺序。
+    """
+
+    # 条目文件后缀，第一个为主文件
+    SUFFIXES: Tuple[str, ...] = ()
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        # key -> 条目占用字节数，越靠后越是最近使用
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._load_index()
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{suffix}"
+
+    def _entry_size(self, key: str) -> int:
+        """条目各文件大小之和（文件缺失时抛出 OSError）"""
+        return sum(self._path(key, suffix).stat().st_size for suffix in self.SUFFIXES)
+
+    def _load_index(self):
+        """扫描缓存目录重建索引，按最近访问时间排序"""
+        main_suffix = self.SUFFIXES[0]
+        entries = []
+        for main_file in self.cache_dir.glob(f"*/*{main_suffix}"):
+            key = main_file.name[:-len(main_suffix)]
+            try:
+                size = self._entry_size(key)
+                last_used = main_file.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((last_used, key, size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def _lookup(self, key: str, read: Callable[[str], T]) -> Optional[T]:
+        """
+        在锁内读取条目并记录命中
+
+        read(key) 抛出 OSError / ValueError / EOFError 时视为条目损坏：删除条目并记为未命中。
+        """
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+
+            try:
+                # 更新 mtime 记录最近使用时间，重启后仍能保持 LRU 顺序
+                os.utime(self._path(key, self.SUFFIXES[0]))
+                value = read(key)
+            except (OSError, ValueError, EOFError):
+                self._drop(key)
+                self.misses += 1
+                return None
+
+            self._index.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _discard(self, key: str, was_hit: bool = False):
+        """命中后发现条目不可用时删除条目（was_hit 时将该次命中改记为未命中）"""
+        with self._lock:
+            self._drop(key)
+            if was_hit:
+                self.hits -= 1
+                self.misses += 1
+
+    def _register(self, key: str):
+        """条目文件写好后登记到索引，并按需淘汰"""
+        size = self._entry_size(key)
+        with self._lock:
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)
+            self._index[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """按 LRU 顺序淘汰，直到总大小不超过上限（需持有锁）"""
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key = next(iter(self._index))
+            self._drop(key)
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        """删除单个条目（需持有锁）"""
+        size = self._index.pop(key, 0)
+        self._total_bytes -= size
+        for suffix in self.SUFFIXES:
+            try:
+                self._path(key, suffix).unlink()
+            except OSError:
+                pass
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._index):
+                self._drop(key)
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
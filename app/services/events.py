@@ -0,0 +1,219 @@
+"""
+进程内事件总线
+合成、导出等服务发布事件，SSE 端点订阅后推送给前端，取代定时轮询
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+# 每个订阅者最多缓存的事件数，超出时丢弃最旧的事件（进度快照会重新同步状态）
+MAX_QUEUE_SIZE = 1000
+
+# SSE 心跳间隔（秒），防止代理断开空闲连接
+SSE_KEEPALIVE_SECONDS = 15
+# 有事件时进度快照的最小间隔（秒）
+SSE_SNAPSHOT_INTERVAL = 1.0
+
+
+def book_topic(book_id: int) -> str:
+    """书籍合成相关事件的主题名"""
+    return f"book:{book_id}"
+
+
+def export_topic(book_id: int) -> str:
+    """书籍导出事件的主题名"""
+    return f"export:{book_id}"
+
+
+class Subscription:
+    """
+    单个订阅者（绑定创建时所在的事件循环）
+
+    使用示例:
+        with event_bus.subscribe(book_topic(1)) as sub:
+            events = await sub.get_batch(timeout=15)
+    """
+
+    def __init__(self, bus: "EventBus", topic: str, max_queue: int = MAX_QUEUE_SIZE):
+        self.bus = bus
+        self.topic = topic
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _deliver(self, event: dict):
+        """在订阅者的事件循环中执行"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get_batch(self, timeout: float) -> List[dict]:
+        """等待至少一个事件（最多 timeout 秒），并取出当前已到达的全部事件"""
+        try:
+            first = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+        batch = [first]
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    按主题发布/订阅的事件总线
+
+    - publish() 可在任意线程调用（worker 线程、导出后台任务线程池）
+    - 事件通过 call_soon_threadsafe 投递到各订阅者自己的事件循环
+    - 没有订阅者时发布几乎没有开销
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str) -> Subscription:
+        """订阅主题（需在事件循环中调用）"""
+        sub = Subscription(self, topic)
+        with self._lock:
+            self._subscribers[topic].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.topic]
+
+    def subscriber_count(self, topic: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(topic, ()))
+
+    def publish(self, topic: str, event_type: str, **data):
+        """发布事件"""
+        with self._lock:
+            subs = list(self._subscribers.get(topic, ()))
+        if not subs:
+            return
+        event = {'type': event_type, 'ts': time.time(), **data}
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, event)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭
+                self.unsubscribe(sub)
+
+
+class ThroughputMeter:
+    """
+    滑动窗口吞吐统计（段落/分钟）
+
+    窗口内不足 window_seconds 时按实际经过时间计算，刚开始合成时也能给出估计。
+    """
+
+    def __init__(self, window_seconds: float = 60):
+        self.window_seconds = window_seconds
+        self._events: Dict[int, Deque[float]] = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def record(self, key: int, count: int = 1):
+        now = time.monotonic()
+        with self._lock:
+            events = self._events[key]
+            events.extend([now] * count)
+            self._trim(events, now)
+
+    def _trim(self, events: Deque[float], now: float):
+        while events and now - events[0] > self.window_seconds:
+            events.popleft()
+
+    def rate_per_minute(self, key: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            events = self._events.get(key)
+            if not events:
+                return 0.0
+            self._trim(events, now)
+            if not events:
+                return 0.0
+            elapsed = max(now - events[0], 5.0)
+            return len(events) / min(elapsed, self.window_seconds) * 60
+
+
+# 进程内共享实例
+event_bus = EventBus()
+synthesis_meter = ThroughputMeter()
+
+
+def publish_paragraph_status(book_id: int, paragraph_id: int, status: str, error: Optional[str] = None):
+    """发布段落状态变化（完成的段落计入吞吐统计）"""
+    if status == "completed":
+        synthesis_meter.record(book_id)
+    event_bus.publish(
+        book_topic(book_id), "paragraph",
+        paragraph_id=paragraph_id, status=status, error=error
+    )
+
+
+def format_sse(event: dict) -> str:
+    """格式化为 Server-Sent Events 报文"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def stream_events(
+    request,
+    sub: Subscription,
+    snapshot: Optional[Callable[[], Awaitable[Optional[dict]]]] = None,
+    initial: Optional[dict] = None,
+    snapshot_interval: float = SSE_SNAPSHOT_INTERVAL,
+    keepalive: float = SSE_KEEPALIVE_SECONDS
+) -> AsyncIterator[str]:
+    """
+    SSE 事件流
+
+    - 转发订阅到的事件
+    - 提供 snapshot 时，有事件到达后按 snapshot_interval 节流推送一次快照
+      （无事件时不查询数据库，只发送心跳）
+    - snapshot 返回 None（如书籍已删除）或客户端断开时结束
+    """
+    try:
+        if initial is not None:
+            yield format_sse(initial)
+        last_snapshot = time.monotonic()
+        dirty = False
+        while not await request.is_disconnected():
+            if dirty:
+                timeout = max(0.0, last_snapshot + snapshot_interval - time.monotonic())
+            else:
+                timeout = keepalive
+            batch = await sub.get_batch(timeout)
+            for event in batch:
+                yield format_sse(event)
+
+            dirty = snapshot is not None and (dirty or bool(batch))
+            if dirty and time.monotonic() - last_snapshot >= snapshot_interval:
+                data = await snapshot()
+                if data is None:
+                    break
+                yield format_sse(data)
+                last_snapshot = time.monotonic()
+                dirty = False
+            elif not batch:
+                yield ": keepalive\n\n"
+    finally:
+        sub.close()
@@ -0,0 +1,323 @@
+"""
+大 PDF 延迟解码
+导入时只读取页数、书签目录和元数据，按目录（无目录时按固定页数）划分章节并记录页码范围；
+章节在首次访问段落（GET /api/books/chapters/{id}/paragraphs）或合成到该章时才解码，
+后台预取线程按章节顺序解码其余章节
+"""
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ebook_decoder import DecoderFactory
+from ebook_decoder.base_decoder import BaseDecoder
+from app import crud, models
+from app.config import get_settings
+from app.database import SessionLocal
+
+settings = get_settings()
+
+# 章节计划: (标题, 起始页, 结束页)，页码从 0 开始，不含结束页
+ChapterPlan = Tuple[str, int, int]
+
+# 每个章节一把锁，避免按需解码与后台预取同时解码同一章节；
+# 解码结束即删除，此后仍在等待旧锁的线程由 fill_chapter_paragraphs 的条件更新保证不重复写入
+_chapter_locks: Dict[int, threading.Lock] = {}
+_chapter_locks_guard = threading.Lock()
+
+
+def should_import_lazily(file_path: str) -> bool:
+    """页数达到 LAZY_PDF_MIN_PAGES 的 PDF 使用延迟解码（智能分章需要全文，不适用）"""
+    if settings.LAZY_PDF_MIN_PAGES <= 0 or settings.ENABLE_SMART_PARSING:
+        return False
+    if Path(file_path).suffix.lower() != ".pdf":
+        return False
+    with DecoderFactory.create(file_path) as decoder:
+        return decoder.get_page_count() >= settings.LAZY_PDF_MIN_PAGES
+
+
+def plan_chapters(
+    page_count: int,
+    outline: List[Tuple[int, str, int]],
+    pages_per_chapter: int
+) -> List[ChapterPlan]:
+    """
+    根据书签目录划分章节
+
+    使用一级书签作为章节起点（同一页多个书签取第一个），第一个书签之前的页面单独成章；
+    没有书签时每 pages_per_chapter 页为一章。
+    """
+    starts = []
+    for level, title, page in outline:
+        if level == 1 and (not starts or page > starts[-1][1]):
+            starts.append((title, page))
+
+    if not starts:
+        step = max(1, pages_per_chapter)
+        return [
+            (f"第 {start + 1}-{min(start + step, page_count)} 页", start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+
+    if starts[0][1] > 0:
+        starts.insert(0, (f"第 1-{starts[0][1]} 页", 0))
+    ends = [page for _, page in starts[1:]] + [page_count]
+    return [(title or f"章节 {i + 1}", start, end) for i, ((title, start), end) in enumerate(zip(starts, ends))]
+
+
+def import_lazy_book(db: Session, file_path: str) -> Tuple[Optional[int], str]:
+    """
+    延迟导入：只写入书籍与章节（页码范围），不解码页面内容
+
+    Returns:
+        (book_id, message) 元组
+    """
+    try:
+        with DecoderFactory.create(file_path) as decoder:
+            book_record = decoder.create_book_record()
+            page_count = decoder.get_page_count()
+            plans = plan_chapters(page_count, decoder.get_outline(), settings.LAZY_PDF_PAGES_PER_CHAPTER)
+
+        book_id = crud.create_book(
+            db,
+            title=book_record.title or Path(file_path).stem,
+            author=book_record.author or '未知',
+            file_path=file_path,
+            import_status="importing"
+        ).id
+        crud.bulk_insert_chapters(db, book_id, [
+            {
+                'chapter_index': i + 1,
+                'title': title,
+                'paragraphs': [],
+                'decode_status': "pending",
+                'page_start': start,
+                'page_end': end,
+            }
+            for i, (title, start, end) in enumerate(plans)
+        ])
+        db.commit()
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        db.rollback()
+        return None, f"解析失败: {str(e)}"
+
+    print(f"[延迟解码] {Path(file_path).name}: {page_count} 页，{len(plans)} 章，页面在访问时解码")
+    if settings.LAZY_PREFETCH_ENABLED:
+        get_prefetcher().submit(book_id)
+    return book_id, f"导入完成: {len(plans)} 章（{page_count} 页，按需解码）"
+
+
+def _chapter_lock(chapter_id: int) -> threading.Lock:
+    with _chapter_locks_guard:
+        return _chapter_locks.setdefault(chapter_id, threading.Lock())
+
+
+def _decode_pages(decoder: BaseDecoder, start: int, end: int) -> List[dict]:
+    """解码页码范围内的段落，段落序号在章节内连续，时间轴从 0 起算（写库后由 rebase_chapter_timelines 平移）"""
+    paragraphs = []
+    time_ms = 0
+    for page_num in range(start, end):
+        for para in decoder.decode_page(page_num):
+            content = para.content.strip()
+            if not content:
+                continue
+            duration_ms = crud.estimate_duration_ms(content)
+            paragraphs.append({
+                'paragraph_index': len(paragraphs) + 1,
+                'content': content,
+                'start_time_ms': time_ms,
+                'end_time_ms': time_ms + duration_ms
+            })
+            time_ms += duration_ms
+    return paragraphs
+
+
+def decode_chapter(db: Session, chapter: models.Chapter, decoder: BaseDecoder = None) -> bool:
+    """
+    解码单个延迟章节并写库（已解码时直接返回）
+
+    段落时间轴平移到整本书的时间轴上；没有待解码章节后结束书籍导入
+    （有解码失败的章节时 import_status 为 failed，失败章节仍可在访问时重试）。
+
+    Args:
+        decoder: 已打开的解码器（后台预取时整本书复用一个），为空时临时打开
+
+    Returns:
+        本次是否解码了该章节
+    """
+    with _chapter_lock(chapter.id):
+        try:
+            db.refresh(chapter)
+            if chapter.decode_status == "decoded":
+                return False
+
+            try:
+                if decoder is None:
+                    with DecoderFactory.create(chapter.book.file_path) as opened:
+                        paragraphs = _decode_pages(opened, chapter.page_start, chapter.page_end)
+                else:
+                    paragraphs = _decode_pages(decoder, chapter.page_start, chapter.page_end)
+
+                written = crud.fill_chapter_paragraphs(db, chapter, paragraphs)
+                if written >= 0:
+                    crud.rebase_chapter_timelines(db, chapter.book_id)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"[延迟解码] 章节 {chapter.id} 解码失败: {e}")
+                crud.set_chapter_decode_status(db, chapter.id, "failed")
+                written = None
+        finally:
+            with _chapter_locks_guard:
+                _chapter_locks.pop(chapter.id, None)
+
+    if written != -1:
+        _finish_if_all_attempted(db, chapter.book_id)
+    return written is not None and written >= 0
+
+
+def _finish_if_all_attempted(db: Session, book_id: int):
+    """没有待解码章节时结束书籍导入（有解码失败的章节时记为 failed）"""
+    if crud.count_undecoded_chapters(db, book_id, statuses=("pending",)) > 0:
+        return
+    failed = crud.count_undecoded_chapters(db, book_id, statuses=("failed",))
+    crud.finish_book_import(db, book_id, status="failed" if failed else "completed")
+    if failed:
+        print(f"[延迟解码] 书籍 {book_id} 解码结束，{failed} 个章节解码失败")
+    else:
+        print(f"[延迟解码] 书籍 {book_id} 已全部解码")
+
+
+def ensure_chapter_decoded(db: Session, chapter: models.Chapter) -> bool:
+    """
+    首次访问时解码章节（解码失败的章节会重试）
+
+    Returns:
+        章节是否已解码
+    """
+    if chapter.decode_status != "decoded":
+        decode_chapter(db, chapter)
+        db.refresh(chapter)
+    return chapter.decode_status == "decoded"
+
+
+def decode_next_chapter(book_id: int, chapter_id: int = None) -> bool:
+    """
+    合成任务的已解码段落即将用完时，按章节顺序解码下一个待解码章节
+
+    在工作线程中调用，使用独立的数据库会话。
+    解码失败的章节标记为 failed 后同样返回 True，合成任务继续处理后面的章节。
+
+    Returns:
+        是否处理了一个待解码章节
+    """
+    db = SessionLocal()
+    try:
+        chapter = crud.get_next_undecoded_chapter(db, book_id, chapter_id)
+        if chapter is None:
+            return False
+        decode_chapter(db, chapter)
+        return True
+    finally:
+        db.close()
+
+
+class LazyPrefetcher:
+    """
+    后台预取线程
+
+    按提交顺序逐本书、按章节顺序解码待解码章节，每本书只打开一次文档；
+    与按需解码通过章节锁互斥，已解码的章节直接跳过。
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[int]" = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, book_id: int):
+        """提交一本书的预取（已在队列中时忽略）"""
+        with self._lock:
+            if book_id in self._queued:
+                return
+            self._queued.add(book_id)
+            self._queue.put(book_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="lazy-prefetch", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """停止预取（当前章节解码完成后退出，剩余章节下次启动时继续）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                book_id = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._prefetch_book(book_id)
+            except Exception as e:
+                print(f"[延迟解码] 书籍 {book_id} 预取失败: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(book_id)
+
+    def _prefetch_book(self, book_id: int):
+        db = SessionLocal()
+        try:
+            book = crud.get_book(db, book_id)
+            if book is None or not os.path.exists(book.file_path):
+                return
+            with DecoderFactory.create(book.file_path) as decoder:
+                while not self._stop.is_set():
+                    chapter = crud.get_next_undecoded_chapter(db, book_id)
+                    if chapter is None:
+                        break
+                    # 解码失败的章节标记为 failed，留给按需解码重试
+                    decode_chapter(db, chapter, decoder)
+        finally:
+            db.close()
+
+
+_prefetcher: Optional[LazyPrefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> LazyPrefetcher:
+    """获取进程内唯一的预取器"""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = LazyPrefetcher()
+        return _prefetcher
+
+
+def resume_prefetch():
+    """启动时为仍有待解码章节的书籍恢复后台预取"""
+    if not settings.LAZY_PREFETCH_ENABLED:
+        return
+    db = SessionLocal()
+    try:
+        book_ids = crud.get_books_with_undecoded_chapters(db)
+    finally:
+        db.close()
+    for book_id in book_ids:
+        get_prefetcher().submit(book_id)
+
+
+def stop_prefetch():
+    """关闭时停止后台预取"""
+    if _prefetcher is not None:
+        _prefetcher.stop()
@@ -0,0 +1,151 @@
+"""
+段落状态写回缓冲 (write-behind)
+合成协程只把结果放入内存缓冲，由单独的 flush 协程按批写回数据库，
+避免并发协程共享 Session、逐条 commit 阻塞事件循环
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.config import get_settings
+from app.database import SessionLocal
+
+settings = get_settings()
+
+# 写库失败（如 database is locked）时的重试次数
+MAX_WRITE_RETRIES = 3
+
+
+class StatusSink:
+    """
+    段落状态批量写回器
+
+    - submit() 非阻塞，同一段落的多次更新在缓冲中合并为一行
+    - 每累积 batch_size 条或每 flush_interval_ms 毫秒写回一次
+    - 写库在线程池中执行，每批使用独立 Session 和单个事务 (executemany)
+    - 写库重试仍失败（如 database is locked）时整批放回缓冲，下次 flush 再写；
+      close() 时仍写不进去则抛出异常，由调用方将任务标记为失败，不静默丢弃
+
+    使用示例:
+        async with StatusSink() as sink:
+            sink.submit(paragraph_id, tts_status="processing")
+    """
+
+    def __init__(
+        self,
+        batch_size: int = None,
+        flush_interval_ms: int = None,
+        session_factory: Callable[[], Session] = None
+    ):
+        self.batch_size = batch_size or settings.TTS_STATUS_FLUSH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.TTS_STATUS_FLUSH_MS) / 1000
+        self._session_factory = session_factory or SessionLocal
+
+        # paragraph_id -> 待写回字段（包含 id）
+        self._pending: Dict[int, dict] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # 统计信息
+        self.flush_count = 0
+        self.rows_written = 0
+        self.flush_seconds = 0.0
+        self.failed_flushes = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def start(self):
+        """启动后台 flush 协程"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, paragraph_id: int, **values):
+        """提交段落字段更新（合并到缓冲中，不等待写库）"""
+        row = self._pending.setdefault(paragraph_id, {'id': paragraph_id})
+        row.update(values)
+        if len(self._pending) >= self.batch_size and self._wakeup:
+            self._wakeup.set()
+
+    async def close(self):
+        """写回剩余数据并停止 flush 协程"""
+        self._closed = True
+        if self._task is None:
+            return
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except OperationalError as e:
+                print(f"[状态写回] 写入 {len(self._pending)} 条失败 (已重试 {MAX_WRITE_RETRIES} 次): {e}")
+                # 运行期间留在缓冲中等待下次 flush；关闭时仍失败则抛给调用方
+                if self._closed:
+                    raise
+            if self._closed and not self._pending:
+                break
+
+    async def flush(self):
+        """立即写回缓冲中的全部更新（失败时整批放回缓冲并抛出 OperationalError）"""
+        if not self._pending:
+            return
+        rows = list(self._pending.values())
+        self._pending = {}
+
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except OperationalError:
+            self._requeue(rows)
+            self.failed_flushes += 1
+            raise
+        self.flush_seconds += time.perf_counter() - start
+        self.flush_count += 1
+        self.rows_written += len(rows)
+
+    def _requeue(self, rows: List[dict]):
+        """写库失败的行放回缓冲，写库期间新提交的字段优先"""
+        for row in rows:
+            newer = self._pending.get(row['id'])
+            self._pending[row['id']] = {**row, **newer} if newer else row
+
+    def _write(self, rows: List[dict]):
+        """在工作线程中执行批量写库，重试 MAX_WRITE_RETRIES 次后抛出最后一次的异常"""
+        for attempt in range(1, MAX_WRITE_RETRIES + 1):
+            db = self._session_factory()
+            try:
+                crud.bulk_update_paragraph_results(db, rows)
+                return
+            except OperationalError:
+                db.rollback()
+                if attempt == MAX_WRITE_RETRIES:
+                    raise
+                time.sleep(0.1 * (2 ** attempt))
+            finally:
+                db.close()
+
+    def stats(self) -> dict:
+        """写库统计（批次数、行数、耗时）"""
+        return {
+            'flush_count': self.flush_count,
+            'rows_written': self.rows_written,
+            'flush_seconds': round(self.flush_seconds, 4),
+            'failed_flushes': self.failed_flushes,
+        }
@@ -3,16 +3,27 @@ TTS 语音合成服务
 使用 Provider 模式支持多种 TTS 引擎（edge-tts / API / 本地模型）
 """
 import asyncio
+import bisect
+import math
 import os
 import re
+import time
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Callable, List, NamedTuple, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from app import models, crud
 from app.config import get_settings
-from .tts_providers.base import TTSProvider
+from app.database import SessionLocal
+from .tts_providers.base import TTSProvider, TTSResult, timings_end_ms
 from .tts_providers.edge import EdgeTTSProvider
+from .tts_providers.local import LocalTTSProvider
+from .tts_providers.mock import MockTTSProvider
+from .tts_providers.rate_limit import PRIORITY_INTERACTIVE, get_wait_seconds, rate_flow
+from .tts_cache import get_audio_cache, unlink_shared
+from .status_sink import StatusSink
+from .concurrency import AdaptiveLimiter, LimiterSlot
+from . import events
 
 settings = get_settings()
 
@@ -28,6 +39,8 @@ class TTSFactory:
     """
     _providers = {
         "edge": EdgeTTSProvider,
+        "local": LocalTTSProvider,
+        "mock": MockTTSProvider,
     }
 
     @classmethod
@@ -64,8 +77,399 @@ def get_audio_path(book_id: int, paragraph_id: int) -> str:
     return str(book_dir / f"p_{paragraph_id}.mp3")
 
 
-from app.utils.text import clean_text_for_tts
-from app.utils.audio import get_audio_duration
+from app.utils.text import clean_text_for_tts, split_into_chunks
+from app.utils.audio import Mp3DurationCounter, concat_mp3, get_audio_duration, split_mp3
+
+# WordBoundary 时间戳单位：100 纳秒
+TICKS_PER_MS = 10_000
+
+
+def _dump_timings(timings: Optional[List[dict]]) -> Optional[str]:
+    """序列化时间戳为 JSON 字符串"""
+    if not timings:
+        return None
+    import json
+    return json.dumps(timings, ensure_ascii=False)
+
+
+async def _generate_audio(
+    tts: TTSProvider,
+    text: str,
+    voice: str,
+    output_path: str
+) -> TTSResult:
+    """
+    调用引擎生成音频；超过 TTS_CHUNK_CHARS 的文本按句子拆分为多个片段并行合成，
+    按顺序拼接为一个 MP3，片段内的时间戳按前面片段的总时长平移
+    """
+    chunks = split_into_chunks(text, settings.TTS_CHUNK_CHARS)
+    if len(chunks) <= 1:
+        return TTSResult.from_value(await tts.generate_audio(text, voice, output_path))
+
+    part_paths = [f"{output_path}.part{i}.mp3" for i in range(len(chunks))]
+    semaphore = asyncio.Semaphore(max(1, settings.TTS_CHUNK_CONCURRENCY))
+
+    async def generate_chunk(chunk: str, part_path: str):
+        async with semaphore:
+            return TTSResult.from_value(await tts.generate_audio(chunk, voice, part_path))
+
+    try:
+        results = await asyncio.gather(*[
+            generate_chunk(chunk, part_path) for chunk, part_path in zip(chunks, part_paths)
+        ])
+        if not all(result.success for result in results):
+            return TTSResult(False)
+
+        timings = []
+        offset = 0
+        # 所有片段都有精确时长时，拼接后的总时长同样精确
+        exact = True
+        for part_path, result in zip(part_paths, results):
+            for timing in result.timings or []:
+                timings.append({**timing, 'offset': timing['offset'] + offset})
+            duration_ms = result.duration_ms
+            if duration_ms is None:
+                duration_ms = get_audio_duration(part_path)
+            if duration_ms is None:
+                # 无法读取时长时以最后一个词的结束时间近似
+                exact = False
+                duration_ms = timings_end_ms(result.timings) or 0
+            offset += duration_ms * TICKS_PER_MS
+
+        if not concat_mp3(part_paths, output_path):
+            return TTSResult(False)
+        return TTSResult(True, timings or None, offset // TICKS_PER_MS if exact else None)
+    finally:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+
+def _latency_cost(text: str) -> int:
+    """
+    反馈给并发限制器的字数：分片并行合成时耗时约等于串行合成 (片段数 / 并行度) 轮，
+    按比例折算，避免分片段落拉低单字延迟基线
+    """
+    cost = len(text)
+    if cost <= settings.TTS_CHUNK_CHARS:
+        return cost
+    parts = math.ceil(cost / settings.TTS_CHUNK_CHARS)
+    waves = math.ceil(parts / max(1, settings.TTS_CHUNK_CONCURRENCY))
+    return cost * waves // parts
+
+
+class ParagraphTask(NamedTuple):
+    """合成所需的段落快照（不依赖 ORM Session，可在并发协程间安全传递）"""
+    id: int
+    book_id: int
+    content: str
+    estimated_duration_ms: int
+    chapter_id: Optional[int] = None
+
+    @classmethod
+    def from_paragraph(cls, paragraph: models.Paragraph) -> "ParagraphTask":
+        return cls(
+            id=paragraph.id,
+            book_id=paragraph.book_id,
+            content=paragraph.content,
+            estimated_duration_ms=paragraph.estimated_duration_ms or 0,
+            chapter_id=paragraph.chapter_id
+        )
+
+
+class _PreparedTask(NamedTuple):
+    """清洗文本、查询缓存后的段落；result 不为 None 时无需请求引擎"""
+    result: Optional[dict]
+    text: str = ""
+    audio_path: str = ""
+    cache: Optional[object] = None
+    cache_key: Optional[str] = None
+
+
+def _prepare_task(task: ParagraphTask, voice: str, tts: TTSProvider) -> _PreparedTask:
+    # 预处理文本：过滤不需要读出的符号
+    clean_content = clean_text_for_tts(task.content)
+
+    if not clean_content:
+        # 如果清理后没有内容（全是无意义符号），直接标记完成并设置时长为 0
+        return _PreparedTask(_completed_result(task.id, "", 0, None))
+
+    audio_path = get_audio_path(task.book_id, task.id)
+
+    # 查询音频缓存：相同文本+语音+引擎直接复用，跳过网络请求
+    cache = get_audio_cache() if settings.TTS_CACHE_ENABLED else None
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(clean_content, voice, tts.get_name())
+        entry = cache.fetch(cache_key, audio_path)
+        if entry is not None:
+            duration_ms = entry['duration_ms']
+            if duration_ms is None:
+                duration_ms = task.estimated_duration_ms
+            return _PreparedTask(_completed_result(task.id, audio_path, duration_ms, entry['timings']))
+
+    return _PreparedTask(None, clean_content, audio_path, cache, cache_key)
+
+
+def _finish_task(
+    task: ParagraphTask,
+    prepared: _PreparedTask,
+    timings: Optional[List[dict]],
+    duration_ms: Optional[int] = None
+) -> dict:
+    """
+    合成成功后写入缓存，返回写回结果
+
+    duration_ms 为引擎合成过程中统计的精确时长；引擎未提供时才读取音频文件，仍失败则用字数估算
+    """
+    if duration_ms is None:
+        duration_ms = get_audio_duration(prepared.audio_path)
+    if duration_ms is None:
+        duration_ms = task.estimated_duration_ms
+
+    # 写入缓存，供后续相同文本复用
+    if prepared.cache is not None:
+        prepared.cache.put(prepared.cache_key, prepared.audio_path, timings, duration_ms)
+
+    return _completed_result(task.id, prepared.audio_path, duration_ms, timings)
+
+
+async def _timed_generate(
+    tts: TTSProvider,
+    text: str,
+    voice: str,
+    output_path: str,
+    slot: Optional[LimiterSlot]
+) -> TTSResult:
+    """生成音频，并把耗时与成败反馈给并发限制器（耗时不含进程级限流的排队时间）"""
+    cost = _latency_cost(text)
+    started = time.monotonic()
+    waited = get_wait_seconds()
+
+    def elapsed() -> float:
+        return time.monotonic() - started - (get_wait_seconds() - waited)
+
+    try:
+        result = await _generate_audio(tts, text, voice, output_path)
+    except Exception:
+        if slot is not None:
+            slot.record(False, elapsed(), cost)
+        raise
+    if slot is not None:
+        slot.record(result.success, elapsed(), cost)
+    return result
+
+
+async def _synthesize_task(
+    task: ParagraphTask,
+    voice: str,
+    tts: TTSProvider,
+    slot: Optional[LimiterSlot] = None
+) -> dict:
+    """
+    合成段落音频（不访问数据库）
+
+    Args:
+        slot: 并发限制器名额，用于反馈引擎调用的耗时与成败（命中缓存时不反馈）
+
+    Returns:
+        需要写回 paragraphs 表的字段，包含 id 和 tts_status
+    """
+    try:
+        # 查询缓存会复制/链接音频文件，放到线程中执行，不阻塞事件循环
+        prepared = await asyncio.to_thread(_prepare_task, task, voice, tts)
+    except Exception as e:
+        return _failed_result(task.id, str(e))
+    if prepared.result is not None:
+        return prepared.result
+    return await _synthesize_prepared(task, prepared, voice, tts, slot)
+
+
+async def _synthesize_prepared(
+    task: ParagraphTask,
+    prepared: _PreparedTask,
+    voice: str,
+    tts: TTSProvider,
+    slot: Optional[LimiterSlot] = None
+) -> dict:
+    """请求引擎合成已清洗、已查过缓存（未命中）的段落"""
+    try:
+        # 此前命中缓存时段落音频是缓存条目的硬链接，引擎覆盖写入前先断开
+        unlink_shared(prepared.audio_path)
+        result = await _timed_generate(tts, prepared.text, voice, prepared.audio_path, slot)
+        if not result.success:
+            return _failed_result(task.id, "TTS 合成失败")
+
+        return await asyncio.to_thread(_finish_task, task, prepared, result.timings, result.duration_ms)
+
+    except Exception as e:
+        return _failed_result(task.id, str(e))
+
+
+# ==================== 短段落合并请求 (micro-batching) ====================
+
+# 视为句末的标点；合并请求时缺少句末标点的段落（如标题）补一个句号，保证段落之间有停顿和句子边界
+_SENTENCE_END = "。！？!?.…；;"
+
+
+def _pack_micro_batches(tasks: List[ParagraphTask]) -> List[List[ParagraphTask]]:
+    """
+    将同一章节内相邻的短段落打包为一组（每组一次引擎请求），其余段落单独成组
+
+    短段落: 清洗后不超过 TTS_MICRO_BATCH_MAX_CHARS 字；
+    每组合计不超过 TTS_MICRO_BATCH_CHARS 字、TTS_MICRO_BATCH_MAX_PARAGRAPHS 段
+    """
+    groups = []
+    current: List[ParagraphTask] = []
+    chars = 0
+    for task in tasks:
+        length = len(clean_text_for_tts(task.content))
+        short = 0 < length <= settings.TTS_MICRO_BATCH_MAX_CHARS
+        if current and (
+            not short
+            or task.chapter_id != current[-1].chapter_id
+            or chars + length > settings.TTS_MICRO_BATCH_CHARS
+            or len(current) >= settings.TTS_MICRO_BATCH_MAX_PARAGRAPHS
+        ):
+            groups.append(current)
+            current, chars = [], 0
+        if short:
+            current.append(task)
+            chars += length
+        else:
+            groups.append([task])
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _assign_boundaries(timings: Optional[List[dict]], text: str, starts: List[int]) -> Optional[List[List[dict]]]:
+    """
+    按文本位置把合并请求返回的时间戳（句子/词边界）分配到各段落
+
+    Returns:
+        每个段落的时间戳列表；有段落分不到任何时间戳（无法确定切分点）时返回 None
+    """
+    spans: List[List[dict]] = [[] for _ in starts]
+    cursor = 0
+    for timing in timings or []:
+        word = timing['text'].strip()
+        pos = text.find(word, cursor) if word else -1
+        if pos >= 0:
+            cursor = pos + len(word)
+        else:
+            pos = cursor
+        spans[bisect.bisect_right(starts, pos) - 1].append(timing)
+    return spans if all(spans) else None
+
+
+async def _synthesize_packed(
+    items: List[Tuple[ParagraphTask, _PreparedTask]],
+    voice: str,
+    tts: TTSProvider,
+    slot: Optional[LimiterSlot]
+) -> List[dict]:
+    """
+    合并多个短段落为一次请求，再按时间戳在段落之间的停顿处切分音频
+
+    时间戳无法对齐到段落时退回为逐段合成
+    """
+    texts = [
+        prepared.text if prepared.text[-1] in _SENTENCE_END else prepared.text + "。"
+        for _, prepared in items
+    ]
+    starts = []
+    position = 0
+    for text in texts:
+        starts.append(position)
+        position += len(text) + 1
+    combined = "\n".join(texts)
+    packed_path = f"{items[0][1].audio_path}.batch.mp3"
+
+    try:
+        result = await _timed_generate(tts, combined, voice, packed_path, slot)
+        if not result.success:
+            return [_failed_result(task.id, "TTS 合成失败") for task, _ in items]
+
+        spans = _assign_boundaries(result.timings, combined, starts)
+        durations = None
+        if spans is not None:
+            # 切分点取前一段最后一个边界结束与后一段第一个边界开始的中点
+            cuts = [
+                (max(t['offset'] + t['duration'] for t in spans[i - 1]) + min(t['offset'] for t in spans[i]))
+                / 2 / TICKS_PER_MS
+                for i in range(1, len(spans))
+            ]
+            for _, prepared in items:
+                unlink_shared(prepared.audio_path)
+            durations = split_mp3(packed_path, cuts, [prepared.audio_path for _, prepared in items])
+        if durations is None:
+            print(f"[TTS] {len(items)} 个短段落的合并音频无法按段落切分，改为逐段合成")
+            # 逐段请求仍占用本组的并发名额（依次发出），已查过缓存的段落不再重复查询
+            return [await _synthesize_prepared(task, prepared, voice, tts, slot) for task, prepared in items]
+
+        results = []
+        piece_start = 0
+        for (task, prepared), span, duration_ms in zip(items, spans, durations):
+            base = piece_start * TICKS_PER_MS
+            para_timings = [{**t, 'offset': max(0, t['offset'] - base)} for t in span]
+            results.append(await asyncio.to_thread(_finish_task, task, prepared, para_timings, duration_ms))
+            piece_start += duration_ms
+        return results
+    finally:
+        if os.path.exists(packed_path):
+            os.remove(packed_path)
+
+
+async def _synthesize_group(
+    tasks: List[ParagraphTask],
+    voice: str,
+    tts: TTSProvider,
+    slot: Optional[LimiterSlot] = None
+) -> List[dict]:
+    """合成一组段落（单个段落或打包的短段落），结果与 tasks 顺序一致"""
+    if len(tasks) == 1:
+        return [await _synthesize_task(tasks[0], voice, tts, slot)]
+
+    results = {}
+    items = []
+    for task in tasks:
+        try:
+            prepared = await asyncio.to_thread(_prepare_task, task, voice, tts)
+        except Exception as e:
+            results[task.id] = _failed_result(task.id, str(e))
+            continue
+        if prepared.result is not None:
+            results[task.id] = prepared.result
+        else:
+            items.append((task, prepared))
+
+    if len(items) == 1:
+        results[items[0][0].id] = await _synthesize_prepared(*items[0], voice, tts, slot)
+    elif items:
+        try:
+            packed = await _synthesize_packed(items, voice, tts, slot)
+        except Exception as e:
+            packed = [_failed_result(task.id, str(e)) for task, _ in items]
+        for (task, _), result in zip(items, packed):
+            results[task.id] = result
+    return [results[task.id] for task in tasks]
+
+
+def _completed_result(paragraph_id: int, audio_path: str, duration_ms: int, timings) -> dict:
+    return {
+        'id': paragraph_id,
+        'tts_status': "completed",
+        'tts_error': None,
+        'audio_path': audio_path,
+        'audio_duration_ms': duration_ms,
+        'sentence_timings': _dump_timings(timings),
+    }
+
+
+def _failed_result(paragraph_id: int, error: str) -> dict:
+    return {'id': paragraph_id, 'tts_status': "failed", 'tts_error': error}
+
 
 async def synthesize_paragraph(
     db: Session,
@@ -73,144 +477,276 @@ async def synthesize_paragraph(
     voice: str = "zh-CN-XiaoxiaoNeural",
     provider: Optional[TTSProvider] = None
 ) -> bool:
-    """合成单个段落"""
+    """合成单个段落（结果立即写库，用于单段合成/试听）"""
     tts = provider or _default_provider
+    task = ParagraphTask.from_paragraph(paragraph)
 
     try:
         # 更新状态为处理中
-        crud.update_paragraph_status(db, paragraph.id, "processing")
+        crud.update_paragraph_status(db, task.id, "processing")
+        events.publish_paragraph_status(task.book_id, task.id, "processing")
 
-        # 预处理文本：过滤不需要读出的符号
-        clean_content = clean_text_for_tts(paragraph.content)
+        # 单段试听走交互优先级，不必排在批量任务后面
+        with rate_flow(f"paragraph:{task.id}", PRIORITY_INTERACTIVE):
+            result = await _synthesize_task(task, voice, tts)
 
-        if not clean_content:
-            # 如果清理后没有内容（全是无意义符号），直接标记完成并设置时长为 0
-            crud.update_paragraph_audio(db, paragraph.id, "", 0)
+        # 更新数据库
+        if result['tts_status'] == "completed":
+            crud.update_paragraph_audio(
+                db, task.id, result['audio_path'], result['audio_duration_ms'],
+                result['sentence_timings']
+            )
+            events.publish_paragraph_status(task.book_id, task.id, "completed")
             return True
 
-        # 生成音频
-        audio_path = get_audio_path(paragraph.book_id, paragraph.id)
-        result = await tts.generate_audio(clean_content, voice, audio_path)
-        
-        # 处理返回值：可能是 bool 或 (bool, timings)
-        if isinstance(result, tuple):
-            success, timings = result
-        else:
-            success = result
-            timings = None
-        
-        if not success:
-            crud.update_paragraph_status(db, paragraph.id, "failed", "TTS 合成失败")
-            return False
-
-        # 获取音频时长
-        duration_ms = get_audio_duration(audio_path)
-        if duration_ms is None:
-            duration_ms = paragraph.estimated_duration_ms
-
-        # 序列化时间戳
-        sentence_timings_json = None
-        if timings:
-            import json
-            sentence_timings_json = json.dumps(timings, ensure_ascii=False)
-
-        # 更新数据库
-        crud.update_paragraph_audio(db, paragraph.id, audio_path, duration_ms, sentence_timings_json)
-        return True
+        crud.update_paragraph_status(db, task.id, "failed", result['tts_error'])
+        events.publish_paragraph_status(task.book_id, task.id, "failed", result['tts_error'])
+        return False
 
     except Exception as e:
-        crud.update_paragraph_status(db, paragraph.id, "failed", str(e))
+        crud.update_paragraph_status(db, task.id, "failed", str(e))
+        events.publish_paragraph_status(task.book_id, task.id, "failed", str(e))
         return False
 
 
-async def _synthesize_batch_async(
-    db: Session,
-    paragraphs: List,
+# ==================== 流式试听 ====================
+
+async def _stream_generate(
+    tts: TTSProvider,
+    text: str,
     voice: str,
-    max_concurrent: int
-) -> dict:
+    timings: List[dict],
+    counter: Optional[Mp3DurationCounter] = None
+) -> AsyncIterator[bytes]:
     """
-    异步批量合成段落（核心并发逻辑）
+    流式生成音频字节；超长文本按 TTS_CHUNK_CHARS 分片后依次流式合成，
+    收集到的时间戳按前面片段的时长平移后追加到 timings
 
     Args:
-        db: 数据库会话
-        paragraphs: 待合成段落列表
-        voice: 语音名称
-        max_concurrent: 最大并发数
+        counter: 传入时累计全部片段的帧时长，结束后即为音频总时长
     """
-    semaphore = asyncio.Semaphore(max_concurrent)
+    offset = 0
+    for chunk in split_into_chunks(text, settings.TTS_CHUNK_CHARS):
+        chunk_counter = Mp3DurationCounter()
+        async for item in tts.stream_audio(chunk, voice):
+            if item['type'] == 'audio':
+                chunk_counter.feed(item['data'])
+                if counter is not None:
+                    counter.feed(item['data'])
+                yield item['data']
+            else:
+                timings.append({
+                    'text': item['text'],
+                    'offset': item['offset'] + offset,
+                    'duration': item['duration'],
+                })
+        offset += chunk_counter.duration_ms * TICKS_PER_MS
+
+
+def _write_result(paragraph_id: int, result: dict):
+    """在工作线程中用独立 Session 写回单个段落的状态/结果（流式响应期间请求的 Session 可能已关闭）"""
+    db = SessionLocal()
+    try:
+        if result['tts_status'] == "completed":
+            crud.update_paragraph_audio(
+                db, paragraph_id, result['audio_path'], result['audio_duration_ms'],
+                result['sentence_timings']
+            )
+        else:
+            crud.update_paragraph_status(db, paragraph_id, result['tts_status'], result.get('tts_error'))
+    finally:
+        db.close()
 
-    async def process_with_limit(para):
-        async with semaphore:
-            return await synthesize_paragraph(db, para, voice)
 
-    results = await asyncio.gather(*[process_with_limit(p) for p in paragraphs])
+async def _save_stream_result(task: ParagraphTask, result: dict):
+    await asyncio.to_thread(_write_result, task.id, result)
+    events.publish_paragraph_status(task.book_id, task.id, result['tts_status'], result.get('tts_error'))
 
-    completed = sum(1 for r in results if r)
-    return {
-        'total': len(paragraphs),
-        'completed': completed,
-        'failed': len(paragraphs) - completed
-    }
 
+# 段落正被任务合成时，试听等待任务结果的最长时间与轮询间隔（秒）
+_STREAM_WAIT_SECONDS = 120
+_STREAM_POLL_SECONDS = 0.5
 
-def synthesize_book_background(
-    book_id: int,
-    voice: str = "zh-CN-XiaoxiaoNeural",
-    max_concurrent: int = 5
-):
+
+def _claim_stream_paragraph(paragraph_id: int, accept_completed: bool) -> Tuple[str, Optional[str]]:
     """
-    后台任务专用的书籍合成函数
+    在工作线程中领取段落用于试听（与任务领取相同的条件更新，避免与正在运行的任务重复合成）
+
+    Args:
+        accept_completed: 为 True 时（已等待过任务）段落已完成则直接使用任务的合成结果
+
+    Returns:
+        ("claimed", 领取前状态) / ("completed", 音频路径) / ("busy", None) / ("missing", None)
     """
-    from app.database import SessionLocal
     db = SessionLocal()
     try:
-        paragraphs = crud.get_pending_paragraphs(db, book_id)
-        if not paragraphs:
-            return
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(
-                _synthesize_batch_async(db, paragraphs, voice, max_concurrent)
-            )
-            crud.update_book_tts_progress(db, book_id)
-        finally:
-            loop.close()
+        if accept_completed:
+            row = db.query(models.Paragraph.tts_status, models.Paragraph.audio_path).filter(
+                models.Paragraph.id == paragraph_id
+            ).first()
+            if row and row.tts_status == "completed" and row.audio_path:
+                return "completed", row.audio_path
+
+        previous_status = crud.claim_paragraph(db, paragraph_id)
+        if previous_status is not None:
+            return "claimed", previous_status
+
+        exists = db.query(models.Paragraph.id).filter(models.Paragraph.id == paragraph_id).first()
+        return ("busy" if exists else "missing"), None
     finally:
         db.close()
 
 
-def synthesize_batch_background(
-    book_id: int,
-    paragraph_ids: List[int],
+async def _iter_audio_file(audio_path: str) -> AsyncIterator[bytes]:
+    """分块读取已有音频文件（在线程中读取，不阻塞事件循环）"""
+    with open(audio_path, "rb") as f:
+        while True:
+            data = await asyncio.to_thread(f.read, 64 * 1024)
+            if not data:
+                break
+            yield data
+
+
+async def stream_paragraph(
+    task: ParagraphTask,
     voice: str = "zh-CN-XiaoxiaoNeural",
-    max_concurrent: int = 5
-):
+    provider: Optional[TTSProvider] = None
+) -> AsyncIterator[bytes]:
     """
-    后台任务：批量合成指定段落
+    合成单个段落并把音频边合成边产出（用于编辑器即时试听）
+
+    - 先把段落条件更新为 processing（与任务领取互斥）；段落正被任务合成时
+      等待任务完成并直接产出任务的合成结果，不重复合成
+    - 音频同时写入临时文件，完整结束后替换段落音频并写库、写缓存
+    - 命中缓存时直接产出缓存音频
+    - 客户端中途断开时丢弃临时文件，段落恢复为领取前的状态
     """
-    from app.database import SessionLocal
-    from app import models
-    db = SessionLocal()
-    try:
-        paragraphs = db.query(models.Paragraph).filter(
-            models.Paragraph.book_id == book_id,
-            models.Paragraph.id.in_(paragraph_ids)
-        ).all()
+    tts = provider or _default_provider
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _STREAM_WAIT_SECONDS
+    waited = False
+    while True:
+        outcome, value = await asyncio.to_thread(_claim_stream_paragraph, task.id, waited)
+        if outcome == "claimed":
+            previous_status = value
+            break
+        if outcome == "completed" and os.path.exists(value):
+            async for data in _iter_audio_file(value):
+                yield data
+            return
+        if outcome == "missing":
+            return
+        if loop.time() >= deadline:
+            print(f"[TTS] 段落 {task.id} 正被任务合成，等待 {_STREAM_WAIT_SECONDS}s 超时，放弃试听")
+            return
+        waited = True
+        await asyncio.sleep(_STREAM_POLL_SECONDS)
 
-        if not paragraphs:
+    events.publish_paragraph_status(task.book_id, task.id, "processing")
+
+    # 客户端中途断开（生成器被取消/关闭）时恢复原状态，已有音频保持不变
+    result = {'tts_status': previous_status}
+    tmp_path = None
+    try:
+        prepared = await asyncio.to_thread(_prepare_task, task, voice, tts)
+
+        if prepared.result is not None:
+            result = prepared.result
+            audio_path = result.get('audio_path')
+            if audio_path:
+                async for data in _iter_audio_file(audio_path):
+                    yield data
             return
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(
-                _synthesize_batch_async(db, paragraphs, voice, max_concurrent)
-            )
-            crud.update_book_tts_progress(db, book_id)
-        finally:
-            loop.close()
+        tmp_path = f"{prepared.audio_path}.stream"
+        timings: List[dict] = []
+        counter = Mp3DurationCounter()
+        # 单段试听走交互优先级，不必排在批量任务后面
+        with rate_flow(f"paragraph:{task.id}", PRIORITY_INTERACTIVE):
+            with open(tmp_path, "wb") as f:
+                async for data in _stream_generate(tts, prepared.text, voice, timings, counter):
+                    f.write(data)
+                    yield data
+        os.replace(tmp_path, prepared.audio_path)
+        duration_ms = counter.duration_ms if counter.frames else None
+        result = await asyncio.to_thread(_finish_task, task, prepared, timings or None, duration_ms)
+    except Exception as e:
+        result = _failed_result(task.id, str(e))
     finally:
-        db.close()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        # shield: 即使响应任务已被取消，写库仍会完成
+        await asyncio.shield(_save_stream_result(task, result))
+
+
+async def _synthesize_batch_async(
+    paragraphs: List,
+    voice: str,
+    max_concurrent: int,
+    should_stop: Optional[Callable[[], bool]] = None,
+    on_result: Optional[Callable[[ParagraphTask, bool], None]] = None,
+    provider: Optional[TTSProvider] = None,
+    limiter: Optional[AdaptiveLimiter] = None
+) -> dict:
+    """
+    异步批量合成段落（核心并发逻辑）
+
+    状态变更通过 StatusSink 批量写回，协程之间不共享数据库 Session。
+
+    Args:
+        paragraphs: 待合成段落列表（ORM 对象或 ParagraphTask）
+        voice: 语音名称
+        max_concurrent: 最大并发数（自适应并发的上限）
+        should_stop: 停止检查函数，返回 True 时尚未开始的段落将被跳过（保持 pending）
+        on_result: 每个段落完成后的回调 (task, success)
+        provider: TTS 引擎，默认使用全局 Provider
+        limiter: 并发限制器；任务分批调用时传入同一个，使并发窗口跨批次保持
+    """
+    tts = provider or _default_provider
+    tasks = [
+        p if isinstance(p, ParagraphTask) else ParagraphTask.from_paragraph(p)
+        for p in paragraphs
+    ]
+    if limiter is None:
+        limiter = AdaptiveLimiter(max_concurrent)
+
+    # 开启 micro-batching 时相邻短段落打包为一组，每组占用一个并发名额、发出一次请求
+    if settings.TTS_MICRO_BATCH_ENABLED:
+        groups = _pack_micro_batches(tasks)
+    else:
+        groups = [[task] for task in tasks]
+
+    async with StatusSink() as sink:
+
+        async def process_with_limit(group: List[ParagraphTask]):
+            async with limiter.slot() as slot:
+                if should_stop is not None and should_stop():
+                    return [None] * len(group)
+                for task in group:
+                    sink.submit(task.id, tts_status="processing", tts_error=None)
+                    events.publish_paragraph_status(task.book_id, task.id, "processing")
+                group_results = await _synthesize_group(group, voice, tts, slot)
+                outcomes = []
+                for task, result in zip(group, group_results):
+                    sink.submit(result.pop('id'), **result)
+                    events.publish_paragraph_status(
+                        task.book_id, task.id, result['tts_status'], result.get('tts_error')
+                    )
+                    success = result['tts_status'] == "completed"
+                    if on_result is not None:
+                        on_result(task, success)
+                    outcomes.append(success)
+                return outcomes
+
+        group_outcomes = await asyncio.gather(*[process_with_limit(g) for g in groups])
+        results = [outcome for outcomes in group_outcomes for outcome in outcomes]
+
+    completed = sum(1 for r in results if r is True)
+    failed = sum(1 for r in results if r is False)
+    return {
+        'total': len(tasks),
+        'completed': completed,
+        'failed': failed,
+        'skipped': len(tasks) - completed - failed,
+        'db': sink.stats()
+    }
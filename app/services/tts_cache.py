@@ -0,0 +1,144 @@
+"""
+TTS 音频缓存
+按 (清洗后文本, 语音, 引擎) 的哈希做内容寻址，命中时直接复用音频与时间戳，跳过网络请求
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+from app.services.disk_lru import DiskLRUCache
+
+
+class AudioCache(DiskLRUCache):
+    """
+    磁盘音频缓存（按总大小做 LRU 淘汰）
+
+    每个条目由两个文件组成，按 key 前两位分目录存放:
+    - {key}.json: 时间戳 (WordBoundary) 与时长（主文件，mtime 记录最近使用时间）
+    - {key}.mp3: 音频数据
+    """
+
+    SUFFIXES = (".json", ".mp3")
+
+    @staticmethod
+    def make_key(text: str, voice: str, provider: str) -> str:
+        """根据清洗后文本、语音和引擎名称计算缓存 key"""
+        raw = "\x1f".join([provider, voice, text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _audio_file(self, key: str) -> Path:
+        return self._path(key, ".mp3")
+
+    def _meta_file(self, key: str) -> Path:
+        return self._path(key, ".json")
+
+    def _read_meta(self, key: str) -> Dict:
+        with open(self._meta_file(key), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        查询缓存
+
+        Returns:
+            命中时返回 {'audio_path', 'timings', 'duration_ms'}，否则 None
+        """
+        meta = self._lookup(key, self._read_meta)
+        if meta is None:
+            return None
+        return {
+            "audio_path": str(self._audio_file(key)),
+            "timings": meta.get("timings"),
+            "duration_ms": meta.get("duration_ms"),
+        }
+
+    def fetch(self, key: str, dest_path: str) -> Optional[Dict]:
+        """
+        查询缓存并将音频放到目标路径，命中返回条目信息
+
+        优先硬链接（不额外占用磁盘），跨文件系统等不支持硬链接时退回复制。
+        目标文件与缓存共享数据，之后重新合成该段落前需先断开链接（见 unlink_shared）。
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None
+        try:
+            _link_or_copy(entry["audio_path"], dest_path)
+        except OSError:
+            self._discard(key, was_hit=True)
+            return None
+        return entry
+
+    def put(
+        self,
+        key: str,
+        audio_path: str,
+        timings: Optional[List[dict]] = None,
+        duration_ms: Optional[int] = None
+    ):
+        """将已生成的音频写入缓存（复制，不影响原文件）"""
+        audio_file = self._audio_file(key)
+        meta_file = self._meta_file(key)
+        audio_file.parent.mkdir(exist_ok=True)
+
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        tmp_name = f"{key}.{os.getpid()}.{threading.get_ident()}"
+        tmp_audio = audio_file.parent / f"{tmp_name}.mp3.tmp"
+        tmp_meta = audio_file.parent / f"{tmp_name}.json.tmp"
+        try:
+            shutil.copyfile(audio_path, tmp_audio)
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({"timings": timings, "duration_ms": duration_ms}, f, ensure_ascii=False)
+            os.replace(tmp_audio, audio_file)
+            os.replace(tmp_meta, meta_file)
+        except OSError as e:
+            print(f"[TTS缓存] 写入失败: {e}")
+            for tmp in (tmp_audio, tmp_meta):
+                if tmp.exists():
+                    tmp.unlink()
+            return
+
+        self._register(key)
+
+
+def _link_or_copy(src: str, dest: str):
+    """把 src 硬链接到 dest（不支持时复制），经临时文件原子替换已有的 dest"""
+    if os.path.exists(dest) and os.path.samefile(src, dest):
+        return
+    tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def unlink_shared(path: str):
+    """
+    文件与缓存条目共享数据（硬链接数大于 1）时删除该路径
+
+    引擎按路径覆盖写入音频，直接写会连带改写缓存中的条目，需先断开链接再写。
+    """
+    try:
+        if os.stat(path).st_nlink > 1:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@lru_cache()
+def get_audio_cache() -> AudioCache:
+    """获取进程内共享的音频缓存实例"""
+    settings = get_settings()
+    return AudioCache(settings.TTS_CACHE_DIR, settings.TTS_CACHE_MAX_MB * 1024 * 1024)
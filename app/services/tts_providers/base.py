@@ -2,15 +2,61 @@
 TTS 提供商基类
 定义所有 TTS 引擎的统一接口，便于替换和扩展
 """
+import os
+import tempfile
 from abc import ABC, abstractmethod
-from typing import List, Dict, Tuple, Optional
+from dataclasses import dataclass
+from typing import AsyncContextManager, AsyncIterator, Iterator, List, Dict, Optional
+
+from .rate_limit import RateLimiter, get_rate_limiter
+
+# 默认流式实现每次产出的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+# 时间戳单位：100 纳秒
+TICKS_PER_MS = 10_000
+
+
+@dataclass
+class TTSResult:
+    """
+    引擎合成结果
+
+    兼容旧接口：可按 success, timings = result 解包，也可直接作为布尔值判断成败
+    """
+    success: bool
+    # 时间戳列表 [{'text', 'offset', 'duration'}]（单位 100 纳秒），引擎不支持时为 None
+    timings: Optional[List[dict]] = None
+    # 音频精确时长（毫秒），由引擎在合成过程中统计；为 None 时调用方需自行读取音频文件
+    duration_ms: Optional[int] = None
+
+    def __iter__(self) -> Iterator:
+        return iter((self.success, self.timings))
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    @classmethod
+    def from_value(cls, result) -> "TTSResult":
+        """规范化 Provider 返回值（TTSResult、旧接口的 (bool, timings) 或 bool）"""
+        if isinstance(result, cls):
+            return result
+        if isinstance(result, tuple):
+            return cls(bool(result[0]), result[1])
+        return cls(bool(result))
+
+
+def timings_end_ms(timings: Optional[List[dict]]) -> Optional[int]:
+    """最后一个时间戳的结束时间（毫秒），无法统计帧时长时用于近似音频时长"""
+    if not timings:
+        return None
+    return max(t['offset'] + t['duration'] for t in timings) // TICKS_PER_MS
 
 
 class TTSProvider(ABC):
     """TTS 提供商基类"""
 
     @abstractmethod
-    async def generate_audio(self, text: str, voice: str, output_path: str) -> Tuple[bool, Optional[List[dict]]]:
+    async def generate_audio(self, text: str, voice: str, output_path: str) -> TTSResult:
         """
         生成音频文件
 
@@ -20,10 +66,37 @@ class TTSProvider(ABC):
             output_path: 输出文件路径
 
         Returns:
-            Tuple[bool, Optional[List[dict]]]: (成功返回 True, 错误信息列表或 None)
+            TTSResult: 成败、时间戳与音频时长；旧实现返回的 (bool, timings) 元组仍然兼容
         """
         pass
 
+    async def stream_audio(self, text: str, voice: str) -> AsyncIterator[dict]:
+        """
+        流式生成音频，边合成边产出数据块
+
+        默认实现先调用 generate_audio 生成完整文件再分块产出；支持流式返回的引擎应覆盖此方法。
+
+        Yields:
+            {'type': 'audio', 'data': bytes} 或
+            {'type': 'boundary', 'text': str, 'offset': int, 'duration': int}
+        """
+        fd, tmp_path = tempfile.mkstemp(suffix=".mp3")
+        os.close(fd)
+        try:
+            result = TTSResult.from_value(await self.generate_audio(text, voice, tmp_path))
+            if not result.success:
+                raise RuntimeError("TTS 合成失败")
+            for timing in result.timings or []:
+                yield {'type': 'boundary', **timing}
+            with open(tmp_path, "rb") as f:
+                while True:
+                    data = f.read(STREAM_CHUNK_SIZE)
+                    if not data:
+                        break
+                    yield {'type': 'audio', 'data': data}
+        finally:
+            os.remove(tmp_path)
+
     @abstractmethod
     def get_voices(self) -> List[Dict]:
         """
@@ -42,3 +115,21 @@ class TTSProvider(ABC):
     def get_supported_formats(self) -> List[str]:
         """返回引擎支持的输出音频格式，默认 mp3"""
         return ["mp3"]
+
+    def get_rate_budget(self) -> Dict:
+        """
+        返回引擎的进程级限流预算，默认不限制
+
+        Returns:
+            Dict: RateLimiter 构造参数，如 {'requests_per_second': 8, 'max_in_flight': 24}
+        """
+        return {}
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """同一进程内该引擎所有实例共享的限流器"""
+        return get_rate_limiter(self.get_name(), self.get_rate_budget())
+
+    def rate_limited(self, text: str) -> AsyncContextManager[None]:
+        """占用一次引擎请求额度（按字数计费），实现类在每次实际请求引擎时使用"""
+        return self.rate_limiter.acquire(cost=len(text))
@@ -4,8 +4,12 @@ Microsoft Edge TTS 引擎
 """
 import asyncio
 import edge_tts
-from typing import List, Dict, Tuple, Optional
-from .base import TTSProvider
+from typing import AsyncIterator, List, Dict
+from app.config import get_settings
+from app.utils.audio import Mp3DurationCounter
+from .base import TTSProvider, TTSResult, timings_end_ms
+
+settings = get_settings()
 
 
 # 重试配置
@@ -24,32 +28,34 @@ class EdgeTTSProvider(TTSProvider):
             {"id": "yunjian", "name": "云健", "voice": "zh-CN-YunjianNeural", "gender": "男"},
         ]
 
-    async def generate_audio(self, text: str, voice: str, output_path: str) -> Tuple[bool, Optional[List[dict]]]:
-        # 如果传入的是短 id（如 xiaoxiao），转换为完整 voice key
-        voice_key = voice
-        for v in self.voices:
-            if v["id"] == voice:
-                voice_key = v["voice"]
-                break
+    async def generate_audio(self, text: str, voice: str, output_path: str) -> TTSResult:
+        voice_key = self._resolve_voice(voice)
 
         last_error = None
         for attempt in range(1, MAX_RETRIES + 1):
             try:
                 communicate = edge_tts.Communicate(text, voice_key)
                 timings = []
+                # 边写文件边统计帧时长，合成结束即得到精确时长，无需再打开文件读取
+                counter = Mp3DurationCounter()
                 
-                with open(output_path, "wb") as f:
-                    async for chunk in communicate.stream():
-                        if chunk["type"] == "audio":
-                            f.write(chunk["data"])
-                        elif chunk["type"] == "WordBoundary":
-                            timings.append({
-                                "text": chunk["text"],
-                                "offset": chunk["offset"],
-                                "duration": chunk["duration"]
-                            })
+                # 每次尝试（包括重试）都占用进程级请求额度
+                async with self.rate_limited(text):
+                    with open(output_path, "wb") as f:
+                        async for chunk in communicate.stream():
+                            if chunk["type"] == "audio":
+                                f.write(chunk["data"])
+                                counter.feed(chunk["data"])
+                            elif chunk["type"] in ("WordBoundary", "SentenceBoundary"):
+                                # edge-tts 7.x 默认只返回句子边界，旧版本返回词边界
+                                timings.append({
+                                    "text": chunk["text"],
+                                    "offset": chunk["offset"],
+                                    "duration": chunk["duration"]
+                                })
                 
-                return True, timings
+                duration_ms = counter.duration_ms if counter.frames else timings_end_ms(timings)
+                return TTSResult(True, timings, duration_ms)
                 
             except Exception as e:
                 last_error = e
@@ -60,7 +66,43 @@ class EdgeTTSProvider(TTSProvider):
                 else:
                     print(f"[EdgeTTS] 合成失败 (已重试 {MAX_RETRIES} 次): {e}")
 
-        return False, None
+        return TTSResult(False)
+
+    async def stream_audio(self, text: str, voice: str) -> AsyncIterator[dict]:
+        """直接转发 edge-tts 的音频块；已产出音频后不再重试（调用方已收到部分数据）"""
+        voice_key = self._resolve_voice(voice)
+
+        for attempt in range(1, MAX_RETRIES + 1):
+            started = False
+            try:
+                communicate = edge_tts.Communicate(text, voice_key)
+                async with self.rate_limited(text):
+                    async for chunk in communicate.stream():
+                        if chunk["type"] == "audio":
+                            started = True
+                            yield {'type': 'audio', 'data': chunk["data"]}
+                        elif chunk["type"] in ("WordBoundary", "SentenceBoundary"):
+                            yield {
+                                'type': 'boundary',
+                                'text': chunk["text"],
+                                'offset': chunk["offset"],
+                                'duration': chunk["duration"],
+                            }
+                return
+            except Exception as e:
+                if started or attempt == MAX_RETRIES:
+                    print(f"[EdgeTTS] 流式合成失败: {e}")
+                    raise
+                delay = BASE_DELAY * (2 ** (attempt - 1))
+                print(f"[EdgeTTS] 第 {attempt} 次失败，{delay}s 后重试: {e}")
+                await asyncio.sleep(delay)
+
+    def _resolve_voice(self, voice: str) -> str:
+        """如果传入的是短 id（如 xiaoxiao），转换为完整 voice key"""
+        for v in self.voices:
+            if v["id"] == voice:
+                return v["voice"]
+        return voice
 
     def get_voices(self) -> List[Dict]:
         return self.voices
@@ -71,3 +113,11 @@ class EdgeTTSProvider(TTSProvider):
     def get_supported_formats(self) -> List[str]:
         return ["mp3"]
 
+    def get_rate_budget(self) -> Dict:
+        return {
+            'requests_per_second': settings.TTS_EDGE_REQUESTS_PER_SECOND,
+            'chars_per_second': settings.TTS_EDGE_CHARS_PER_SECOND,
+            'max_in_flight': settings.TTS_EDGE_MAX_IN_FLIGHT,
+            'reserved_slots': settings.TTS_EDGE_INTERACTIVE_SLOTS,
+        }
+
@@ -0,0 +1,269 @@
+"""
+本地离线 TTS 引擎
+基于 Piper (piper-tts) 在本机 CPU 上合成，不依赖任何外部服务。
+合成在进程池中进行，每个工作进程只加载一次模型，整本书可以用满本机所有核心。
+
+模型目录 (TTS_LOCAL_MODEL_DIR) 中的每个 *.onnx 文件（及同名 .onnx.json 配置）即一个语音，
+语音 ID 为文件名去掉 .onnx 后缀，如 zh_CN-huayan-medium。
+"""
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import threading
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.utils.audio import Mp3DurationCounter, _ffmpeg_available
+from app.utils.text import split_to_sentences
+from .base import TTSProvider, TTSResult
+
+settings = get_settings()
+
+try:
+    import piper  # noqa: F401
+    PIPER_AVAILABLE = True
+except ImportError:
+    PIPER_AVAILABLE = False
+
+# 句子之间插入的静音（毫秒），同时便于合并请求按句子边界切分
+SENTENCE_SILENCE_MS = 200
+# 输出 MP3 参数，与 edge-tts 一致，导出时可直接拷贝码流拼接
+OUTPUT_SAMPLE_RATE = 24000
+OUTPUT_BITRATE = "48k"
+# 时间戳单位：100 纳秒
+TICKS_PER_SECOND = 10_000_000
+
+
+# ==================== 工作进程 ====================
+
+# 工作进程内已加载的模型（模型路径 -> PiperVoice）
+_worker_voices: Dict[str, object] = {}
+
+
+def _load_voice(model_path: str):
+    """加载模型（每个工作进程每个模型只加载一次）"""
+    voice = _worker_voices.get(model_path)
+    if voice is None:
+        from piper import PiperVoice
+        voice = PiperVoice.load(model_path)
+        _worker_voices[model_path] = voice
+    return voice
+
+
+def _init_worker(model_path: Optional[str]):
+    """工作进程初始化：预加载默认模型，避免首个请求承担加载耗时"""
+    if model_path:
+        _load_voice(model_path)
+
+
+def _synthesize_pcm(voice, text: str) -> bytes:
+    """合成一句话，返回 16 位单声道 PCM"""
+    if hasattr(voice, "synthesize_wav"):
+        # piper-tts >= 1.3：synthesize 逐句产出 AudioChunk
+        return b"".join(chunk.audio_int16_bytes for chunk in voice.synthesize(text))
+    # piper-tts 1.2
+    return b"".join(voice.synthesize_stream_raw(text))
+
+
+def _encode_mp3(wav_path: str, output_path: str):
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", wav_path, "-vn", "-map_metadata", "-1",
+        "-ar", str(OUTPUT_SAMPLE_RATE), "-ac", "1",
+        # 固定码率无需 Xing 标签帧，分片拼接时中间不会夹杂空帧
+        "-c:a", "libmp3lame", "-b:a", OUTPUT_BITRATE, "-write_xing", "0",
+        "-f", "mp3", output_path,
+    ]
+    proc = subprocess.run(cmd, capture_output=True)
+    if proc.returncode != 0:
+        err = proc.stderr.decode("utf-8", errors="ignore").strip()
+        raise RuntimeError(f"ffmpeg 编码失败: {err[-500:]}")
+
+
+def _synthesize_in_worker(model_path: str, text: str, output_path: str) -> Tuple[List[dict], int]:
+    """
+    在工作进程中合成整段文本并编码为 MP3
+
+    逐句合成以得到句子级时间戳（与 edge-tts 的 SentenceBoundary 格式一致），
+    句子之间插入 SENTENCE_SILENCE_MS 毫秒静音。
+
+    Returns:
+        (timings, 编码后 MP3 的精确时长毫秒)
+    """
+    voice = _load_voice(model_path)
+    sample_rate = voice.config.sample_rate
+    silence = bytes(2 * sample_rate * SENTENCE_SILENCE_MS // 1000)
+
+    timings = []
+    pcm = []
+    samples = 0
+    for line in text.split("\n"):
+        for sentence in split_to_sentences(line):
+            audio = _synthesize_pcm(voice, sentence)
+            if not audio:
+                continue
+            if pcm:
+                pcm.append(silence)
+                samples += len(silence) // 2
+            length = len(audio) // 2
+            timings.append({
+                "text": sentence,
+                "offset": samples * TICKS_PER_SECOND // sample_rate,
+                "duration": length * TICKS_PER_SECOND // sample_rate,
+            })
+            pcm.append(audio)
+            samples += length
+    if not pcm:
+        raise RuntimeError("文本中没有可朗读的内容")
+
+    fd, wav_path = tempfile.mkstemp(suffix=".wav", prefix="piper_")
+    os.close(fd)
+    try:
+        with wave.open(wav_path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(b"".join(pcm))
+        _encode_mp3(wav_path, output_path)
+    finally:
+        os.remove(wav_path)
+
+    # 在工作进程中统计编码结果的帧时长（含编码器填充），主进程无需再读取文件
+    counter = Mp3DurationCounter()
+    with open(output_path, "rb") as f:
+        counter.feed(f.read())
+    return timings, counter.duration_ms
+
+
+# ==================== 进程池 ====================
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(default_model: Optional[str]) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn 启动子进程，避免 fork 带有后台线程的服务进程
+            context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(
+                max_workers=get_local_workers(),
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(default_model,)
+            )
+            print(f"[LocalTTS] 启动 {get_local_workers()} 个合成进程")
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """工作进程异常退出后丢弃进程池，下次请求时重建"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_local_pool():
+    """关闭合成进程池（应用关闭时调用）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_local_workers() -> int:
+    """合成进程数，默认保留一个核心给 Web 服务"""
+    if settings.TTS_LOCAL_WORKERS > 0:
+        return settings.TTS_LOCAL_WORKERS
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+# ==================== Provider ====================
+
+class LocalTTSProvider(TTSProvider):
+    """本地 Piper TTS 提供商（进程池并行合成）"""
+
+    def __init__(self, model_dir: Optional[str] = None):
+        self.model_dir = Path(model_dir or settings.TTS_LOCAL_MODEL_DIR)
+        self.voices = self._scan_voices()
+        if not PIPER_AVAILABLE:
+            print("[LocalTTS] 警告: 未安装 piper-tts，请执行 pip install piper-tts")
+        elif not self.voices:
+            print(f"[LocalTTS] 警告: 模型目录 {self.model_dir} 中没有 .onnx 模型")
+        if not _ffmpeg_available():
+            print("[LocalTTS] 警告: 未找到 ffmpeg，无法编码 MP3")
+
+    def _scan_voices(self) -> List[Dict]:
+        if not self.model_dir.is_dir():
+            return []
+        voices = []
+        for model in sorted(self.model_dir.glob("*.onnx")):
+            voices.append({"id": model.stem, "name": model.stem, "voice": model.stem, "gender": ""})
+        return voices
+
+    def _resolve_model(self, voice: str) -> Optional[str]:
+        """
+        语音 ID 转换为模型路径
+
+        传入的语音不是本地模型时（如前端默认的 zh-CN-XiaoxiaoNeural）
+        使用 TTS_LOCAL_DEFAULT_VOICE，未配置则使用第一个模型
+        """
+        ids = [v["id"] for v in self.voices]
+        if voice not in ids:
+            voice = settings.TTS_LOCAL_DEFAULT_VOICE if settings.TTS_LOCAL_DEFAULT_VOICE in ids else None
+            voice = voice or (ids[0] if ids else None)
+        if voice is None:
+            return None
+        return str(self.model_dir / f"{voice}.onnx")
+
+    async def generate_audio(self, text: str, voice: str, output_path: str) -> TTSResult:
+        if not PIPER_AVAILABLE:
+            print("[LocalTTS] 合成失败: 未安装 piper-tts")
+            return TTSResult(False)
+        model_path = self._resolve_model(voice)
+        if model_path is None:
+            print(f"[LocalTTS] 合成失败: 模型目录 {self.model_dir} 中没有可用模型")
+            return TTSResult(False)
+
+        pool = _get_pool(self._resolve_model(""))
+        loop = asyncio.get_running_loop()
+        try:
+            # 占用一个合成进程名额，排队遵循进程级限流器的优先级与轮转
+            async with self.rate_limited(text):
+                timings, duration_ms = await loop.run_in_executor(
+                    pool, _synthesize_in_worker, model_path, text, output_path
+                )
+            return TTSResult(True, timings, duration_ms)
+        except BrokenProcessPool as e:
+            print(f"[LocalTTS] 合成进程异常退出，重建进程池: {e}")
+            _discard_pool(pool)
+        except Exception as e:
+            print(f"[LocalTTS] 合成失败: {e}")
+        return TTSResult(False)
+
+    def get_voices(self) -> List[Dict]:
+        return self.voices
+
+    def get_name(self) -> str:
+        return "local"
+
+    def get_supported_formats(self) -> List[str]:
+        return ["mp3"]
+
+    def get_rate_budget(self) -> Dict:
+        # CPU 合成没有请求频率限制，同时进行的请求数等于合成进程数，多出的请求在限流器中排队
+        workers = get_local_workers()
+        return {
+            'max_in_flight': workers,
+            'reserved_slots': 1 if workers > 1 else 0,
+        }
@@ -0,0 +1,143 @@
+"""
+模拟 TTS 引擎
+不联网，生成指定时长的静音音频和逐词时间戳，可配置延迟、抖动与失败率，
+用于压测合成流水线（并发、写库、进度统计）以及离线开发
+
+结果是确定性的：同一文本第 N 次请求的延迟与成败只由 (seed, N, 文本) 决定，与并发顺序无关
+"""
+import asyncio
+import math
+import random
+import re
+import threading
+import wave
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from .base import TTSProvider, TTSResult
+
+settings = get_settings()
+
+# MPEG-2 Layer III, 24kHz, 48kbps, 单声道的静音帧（每帧 24ms），与 edge-tts 输出格式一致
+SILENT_MP3_FRAME = bytes([0xFF, 0xF3, 0x64, 0xC0]) + bytes(140)
+MP3_FRAME_MS = 24
+WAV_SAMPLE_RATE = 24000
+# 时间戳单位：100 纳秒
+TICKS_PER_MS = 10_000
+
+# 朗读单元：连续的英文/数字为一个词，其余非空白字符各为一个字（标点只占停顿，不产生时间戳）
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9']+|\S")
+_PUNCTUATION = set("，。！？；：、,.!?;:…—-\"'“”‘’()（）《》【】[]")
+
+
+class MockTTSProvider(TTSProvider):
+    """模拟 TTS 提供商（TTS_PROVIDER=mock）"""
+
+    def __init__(
+        self,
+        latency_ms: Optional[float] = None,
+        latency_per_char_ms: Optional[float] = None,
+        jitter_ms: Optional[float] = None,
+        failure_rate: Optional[float] = None,
+        ms_per_char: Optional[int] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = settings.TTS_MOCK_LATENCY_MS if latency_ms is None else latency_ms
+        self.latency_per_char_ms = (
+            settings.TTS_MOCK_LATENCY_PER_CHAR_MS if latency_per_char_ms is None else latency_per_char_ms
+        )
+        self.jitter_ms = settings.TTS_MOCK_JITTER_MS if jitter_ms is None else jitter_ms
+        self.failure_rate = settings.TTS_MOCK_FAILURE_RATE if failure_rate is None else failure_rate
+        self.ms_per_char = settings.TTS_MOCK_MS_PER_CHAR if ms_per_char is None else ms_per_char
+        self.seed = settings.TTS_MOCK_SEED if seed is None else seed
+        self.voices = [
+            {"id": "mock", "name": "模拟", "voice": "mock", "gender": ""},
+        ]
+
+        # 每个文本已请求的次数（重试时得到新的随机结果）
+        self._attempts: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.requests = 0
+        self.failures = 0
+
+    def _next_random(self, text: str) -> random.Random:
+        with self._lock:
+            attempt = self._attempts[text]
+            self._attempts[text] += 1
+            self.requests += 1
+        return random.Random(f"{self.seed}:{attempt}:{text}")
+
+    def make_timings(self, text: str) -> Tuple[List[dict], int]:
+        """
+        生成逐词时间戳 (WordBoundary 格式) 与音频总时长
+
+        每个字（英文按字母数）朗读 ms_per_char 毫秒，标点停顿 ms_per_char 毫秒
+
+        Returns:
+            (timings, duration_ms)
+        """
+        timings = []
+        position = 0
+        for token in _TOKEN_PATTERN.findall(text):
+            length = len(token) * self.ms_per_char
+            if token not in _PUNCTUATION:
+                timings.append({
+                    "text": token,
+                    "offset": position * TICKS_PER_MS,
+                    "duration": length * TICKS_PER_MS,
+                })
+            position += length
+        return timings, position
+
+    async def generate_audio(self, text: str, voice: str, output_path: str) -> TTSResult:
+        rng = self._next_random(text)
+        # 延迟 = 固定开销 + 按字数增长的合成耗时 + 抖动，与真实引擎一样随文本变长
+        delay = self.latency_ms + self.latency_per_char_ms * len(text)
+        delay = max(0.0, delay + rng.uniform(-self.jitter_ms, self.jitter_ms))
+
+        async with self.rate_limited(text):
+            await asyncio.sleep(delay / 1000)
+            if rng.random() < self.failure_rate:
+                with self._lock:
+                    self.failures += 1
+                print(f"[MockTTS] 模拟失败: {text[:20]}")
+                return TTSResult(False)
+
+        timings, duration_ms = self.make_timings(text)
+        return TTSResult(True, timings, write_silence(output_path, duration_ms))
+
+    def get_voices(self) -> List[Dict]:
+        return self.voices
+
+    def get_name(self) -> str:
+        return "mock"
+
+    def get_supported_formats(self) -> List[str]:
+        return ["mp3", "wav"]
+
+    def get_rate_budget(self) -> Dict:
+        return {'max_in_flight': settings.TTS_MOCK_MAX_IN_FLIGHT}
+
+
+def write_silence(output_path: str, duration_ms: int) -> int:
+    """
+    写入指定时长的静音音频，.wav 输出 16 位单声道 WAV，其余输出 MP3（按帧向上取整）
+
+    Returns:
+        实际写入的音频时长（毫秒）
+    """
+    if output_path.lower().endswith(".wav"):
+        samples = WAV_SAMPLE_RATE * duration_ms // 1000
+        with wave.open(output_path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(WAV_SAMPLE_RATE)
+            wav.writeframes(bytes(2 * samples))
+        return samples * 1000 // WAV_SAMPLE_RATE
+    frames = max(1, math.ceil(duration_ms / MP3_FRAME_MS))
+    with open(output_path, "wb") as f:
+        f.write(SILENT_MP3_FRAME * frames)
+    return frames * MP3_FRAME_MS
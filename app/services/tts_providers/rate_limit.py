@@ -0,0 +1,316 @@
+"""
+TTS 引擎进程级限流
+同一进程内所有合成调用（任务队列、单段试听、命令行导出）共享同一个按引擎划分的令牌桶，
+多个书籍同时合成时总请求数不会超过引擎预算；等待中的请求先按优先级放行，
+同一优先级内按来源 (flow) 轮转，大任务排队再长也不会饿死单段试听
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+# 优先级（数值越小越优先）：编辑器单段试听 > 章节/选中段落任务 > 整本书任务
+PRIORITY_INTERACTIVE = 0
+PRIORITY_CHAPTER = 1
+PRIORITY_BOOK = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_CHAPTER: "chapter",
+    PRIORITY_BOOK: "book",
+}
+
+# 当前协程所属的限流来源（如 "job:12"、"paragraph:345"）及优先级，未设置时按整书任务处理
+DEFAULT_FLOW = "default"
+_current_flow: ContextVar[str] = ContextVar("tts_rate_flow", default=DEFAULT_FLOW)
+_current_priority: ContextVar[int] = ContextVar("tts_rate_priority", default=PRIORITY_BOOK)
+# 当前协程累计的排队等待秒数，调用方据此从引擎耗时中扣除排队时间
+_wait_seconds: ContextVar[float] = ContextVar("tts_rate_wait", default=0.0)
+
+
+@contextmanager
+def rate_flow(key: str, priority: int = PRIORITY_BOOK):
+    """
+    设置当前上下文的限流来源与优先级，期间创建的协程（如 asyncio.gather 中的任务）继承该设置
+
+    使用示例:
+        with rate_flow(f"job:{job_id}", PRIORITY_CHAPTER):
+            await tts._synthesize_batch_async(...)
+    """
+    flow_token = _current_flow.set(key)
+    priority_token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(priority_token)
+        _current_flow.reset(flow_token)
+
+
+def current_flow() -> str:
+    return _current_flow.get()
+
+
+def current_priority() -> int:
+    return _current_priority.get()
+
+
+def get_wait_seconds() -> float:
+    """当前协程在限流器中累计等待的秒数"""
+    return _wait_seconds.get()
+
+
+class _TokenBucket:
+    """令牌桶；rate 为 0 表示不限制"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, burst_seconds: float):
+        self.rate = rate
+        self.capacity = max(rate * burst_seconds, 1.0) if rate > 0 else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, cost: float) -> float:
+        """还需等待多少秒才能放行（超过桶容量的请求在桶满时放行）"""
+        if self.rate <= 0:
+            return 0.0
+        need = min(cost, self.capacity)
+        if self.tokens >= need:
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+    def consume(self, cost: float):
+        if self.rate > 0:
+            self.tokens -= cost
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "cost", "flow", "priority", "granted")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, cost: int, flow: str, priority: int):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.cost = cost
+        self.flow = flow
+        self.priority = priority
+        self.granted = False
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+
+
+class RateLimiter:
+    """
+    单个引擎的进程级限流器
+
+    - requests_per_second / chars_per_second: 请求数与字数令牌桶，允许 burst_seconds 秒的突发
+    - max_in_flight: 同时进行中的请求上限
+    - reserved_slots: 并发上限中只留给交互请求的名额，单段试听无需等待批量请求完成即可开始
+    - 等待者按优先级分道，高优先级有等待者时低优先级不放行；
+      同一优先级内按 flow 分队列轮转（每次放行一个请求后该 flow 移到队尾）
+    - 线程安全：不同线程/事件循环中的调用方共享同一实例，放行通过 call_soon_threadsafe 通知
+
+    使用示例:
+        async with limiter.acquire(cost=len(text)):
+            await communicate(...)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_second: float = 0,
+        chars_per_second: float = 0,
+        max_in_flight: int = 0,
+        burst_seconds: float = 1.0,
+        reserved_slots: int = 0
+    ):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        # 批量请求可用的并发上限（至少 1）
+        self.bulk_in_flight = max(1, max_in_flight - reserved_slots) if max_in_flight > 0 else 0
+        self._requests = _TokenBucket(requests_per_second, burst_seconds)
+        self._chars = _TokenBucket(chars_per_second, burst_seconds)
+        self._lock = threading.Lock()
+        # 每个优先级一组 flow 队列
+        self._lanes: List["OrderedDict[str, Deque[_Waiter]]"] = [
+            OrderedDict() for _ in PRIORITY_NAMES
+        ]
+        self.in_flight = 0
+
+        # 统计信息
+        self.granted = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def unlimited(self) -> bool:
+        return self._requests.rate <= 0 and self._chars.rate <= 0 and self.max_in_flight <= 0
+
+    @asynccontextmanager
+    async def acquire(
+        self,
+        cost: int = 1,
+        flow: Optional[str] = None,
+        priority: Optional[int] = None
+    ) -> AsyncIterator[None]:
+        """占用一次请求额度（额度不足或前面有更高优先级/其他 flow 在等待时排队）"""
+        if self.unlimited:
+            yield
+            return
+
+        if priority is None:
+            priority = current_priority()
+        priority = min(max(priority, 0), len(self._lanes) - 1)
+        waiter = _Waiter(asyncio.get_running_loop(), max(cost, 1), flow or current_flow(), priority)
+        started = time.monotonic()
+        with self._lock:
+            self._lanes[priority].setdefault(waiter.flow, deque()).append(waiter)
+            delay = self._dispatch()
+
+        try:
+            while not waiter.future.done():
+                # 令牌不足时到点自行重新调度；仅受并发上限阻塞时等待其他请求释放
+                await asyncio.wait({waiter.future}, timeout=delay)
+                if not waiter.future.done():
+                    with self._lock:
+                        delay = self._dispatch()
+        except BaseException:
+            with self._lock:
+                if waiter.granted:
+                    self.in_flight -= 1
+                else:
+                    self._remove(waiter)
+                self._dispatch()
+            raise
+
+        waited = time.monotonic() - started
+        _wait_seconds.set(_wait_seconds.get() + waited)
+        with self._lock:
+            self.wait_seconds += waited
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self._dispatch()
+
+    def _remove(self, waiter: _Waiter):
+        flows = self._lanes[waiter.priority]
+        queue = flows.get(waiter.flow)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            del flows[waiter.flow]
+
+    def _next_lane(self) -> Optional[int]:
+        for priority, flows in enumerate(self._lanes):
+            if flows:
+                return priority
+        return None
+
+    def _dispatch(self) -> Optional[float]:
+        """
+        按优先级、轮转顺序放行等待者（调用方持有锁）
+
+        Returns:
+            距离下次令牌足够的秒数；没有等待者或只受并发上限阻塞时返回 None
+        """
+        now = time.monotonic()
+        self._requests.refill(now)
+        self._chars.refill(now)
+
+        while True:
+            priority = self._next_lane()
+            if priority is None:
+                return None
+            limit = self.max_in_flight if priority == PRIORITY_INTERACTIVE else self.bulk_in_flight
+            if limit > 0 and self.in_flight >= limit:
+                # 高优先级等待时低优先级同样不放行，下一个空出的名额留给高优先级
+                return None
+            flows = self._lanes[priority]
+            flow, queue = next(iter(flows.items()))
+            waiter = queue[0]
+            delay = max(self._requests.delay(1), self._chars.delay(waiter.cost))
+            if delay > 0:
+                return delay
+
+            queue.popleft()
+            del flows[flow]
+            if queue:
+                # 该 flow 移到队尾，同优先级的其他 flow 先放行
+                flows[flow] = queue
+            try:
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+            except RuntimeError:
+                # 等待者的事件循环已关闭
+                continue
+            waiter.granted = True
+            self._requests.consume(1)
+            self._chars.consume(waiter.cost)
+            self.in_flight += 1
+            self.granted += 1
+        return None
+
+    def stats(self) -> Dict:
+        """当前并发、排队情况与累计等待时间"""
+        with self._lock:
+            waiting = {
+                flow: len(queue)
+                for flows in self._lanes for flow, queue in flows.items()
+            }
+            by_priority = {
+                PRIORITY_NAMES[priority]: sum(len(queue) for queue in flows.values())
+                for priority, flows in enumerate(self._lanes)
+            }
+            return {
+                'provider': self.name,
+                'requests_per_second': self._requests.rate,
+                'chars_per_second': self._chars.rate,
+                'max_in_flight': self.max_in_flight,
+                'reserved_slots': self.max_in_flight - self.bulk_in_flight if self.max_in_flight > 0 else 0,
+                'in_flight': self.in_flight,
+                'waiting': sum(waiting.values()),
+                'waiting_by_priority': by_priority,
+                'waiting_by_flow': waiting,
+                'granted': self.granted,
+                'wait_seconds': round(self.wait_seconds, 3),
+            }
+
+
+# 进程内共享的限流器（引擎名 -> RateLimiter）
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, budget: Optional[Dict] = None) -> RateLimiter:
+    """
+    获取引擎的共享限流器，首次调用时按 budget 创建
+
+    Args:
+        name: 引擎名称
+        budget: RateLimiter 的构造参数（requests_per_second / chars_per_second / max_in_flight /
+                burst_seconds / reserved_slots）
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = RateLimiter(name, **(budget or {}))
+            _limiters[name] = limiter
+        return limiter
+
+
+def get_all_rate_limiters() -> Dict[str, RateLimiter]:
+    with _limiters_lock:
+        return dict(_limiters)
@@ -0,0 +1,357 @@
+"""
+持久化 TTS 合成任务队列
+任务记录保存在 tts_jobs 表中，由后台 worker 以租约方式领取执行，
+服务重启或部署后未完成的任务会被自动回收并继续合成
+"""
+import asyncio
+import itertools
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Set
+
+from app import crud
+from app.config import get_settings
+from app.database import SessionLocal
+from app.services import events, lazy_import
+from app.services.concurrency import AdaptiveLimiter, register_limiter, unregister_limiter
+from app.services.tts_providers.rate_limit import PRIORITY_NAMES, rate_flow
+
+settings = get_settings()
+
+
+class TTSJobWorker:
+    """
+    TTS 任务 worker
+
+    - 在独立线程中运行自己的事件循环，不阻塞 API 请求
+    - 通过租约领取任务，执行期间定期心跳续约；每次执行使用独立的租约持有者，
+      租约丢失（已被回收、可能已被重新领取）的执行会被停止，不会影响新的执行
+    - 租约过期的任务重新入队，其范围内卡在 processing 的段落重置为 pending
+    - 任务按小批次领取待合成段落，批次之间响应暂停/取消
+    - 任务按优先级领取（单章/选中段落优先于整本书）；运行槽位已满时，
+      更高优先级的任务入队会让正在运行的最低优先级任务让出槽位并重新入队
+    - 数据库调用都通过 asyncio.to_thread 执行，等待写锁时不阻塞合成协程与心跳
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = None,
+        lease_seconds: int = None,
+        heartbeat_seconds: int = None,
+        poll_seconds: float = None
+    ):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._runs = itertools.count(1)
+        self.max_jobs = max_jobs or settings.TTS_WORKER_MAX_JOBS
+        self.lease_seconds = lease_seconds or settings.TTS_JOB_LEASE_SECONDS
+        self.heartbeat_seconds = heartbeat_seconds or settings.TTS_JOB_HEARTBEAT_SECONDS
+        self.poll_seconds = poll_seconds or settings.TTS_WORKER_POLL_SECONDS
+        self.reconcile_seconds = settings.TTS_COUNTER_RECONCILE_SECONDS
+
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = threading.Event()
+        self._wakeup: Optional[asyncio.Event] = None
+        # job_id -> 停止信号，用于 API 暂停/取消时立即通知正在执行的任务
+        self._job_stops: Dict[int, asyncio.Event] = {}
+        # 正在执行的任务的优先级，以及被要求让出槽位的任务
+        self._job_priorities: Dict[int, int] = {}
+        self._preempted: Set[int] = set()
+
+    def start(self):
+        """启动 worker 线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="tts-job-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30):
+        """停止 worker，正在合成的段落完成后任务重新入队"""
+        self._stopping.set()
+        self.wake()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """唤醒 worker 立即检查队列（新任务入队后调用）"""
+        if self._loop and self._wakeup and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def notify_job_changed(self, job_id: int):
+        """任务状态被 API 修改后调用，通知正在执行该任务的协程重新检查"""
+        if not self._loop or self._loop.is_closed():
+            return
+
+        def _signal():
+            stop = self._job_stops.get(job_id)
+            if stop:
+                stop.set()
+            if self._wakeup:
+                self._wakeup.set()
+
+        self._loop.call_soon_threadsafe(_signal)
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+
+    async def _main(self):
+        self._wakeup = asyncio.Event()
+
+        db = SessionLocal()
+        try:
+            reset = await asyncio.to_thread(crud.reset_orphan_processing_paragraphs, db)
+            if reset:
+                print(f"[TTS队列] 已将 {reset} 个中断的段落恢复为待合成")
+        finally:
+            db.close()
+
+        active: Set[asyncio.Task] = set()
+        last_reconcile = time.monotonic()
+        while not self._stopping.is_set():
+            db = SessionLocal()
+            try:
+                reclaimed = await asyncio.to_thread(crud.reclaim_expired_tts_jobs, db)
+                if reclaimed:
+                    print(f"[TTS队列] 回收了 {reclaimed} 个租约过期的任务")
+
+                # 定期校准状态计数，修正异常中断等造成的偏差
+                if time.monotonic() - last_reconcile >= self.reconcile_seconds:
+                    last_reconcile = time.monotonic()
+                    fixed = await asyncio.to_thread(self._reconcile_counters)
+                    if fixed:
+                        print(f"[TTS队列] 校准了 {fixed} 个书籍/章节的状态计数")
+
+                while len(active) < self.max_jobs:
+                    owner = f"{self.worker_id}#{next(self._runs)}"
+                    job = await asyncio.to_thread(crud.claim_next_tts_job, db, owner, self.lease_seconds)
+                    if job is None:
+                        break
+                    print(f"[TTS队列] 领取任务 {job.id} (书籍 {job.book_id}, 范围 {job.scope})")
+                    events.event_bus.publish(
+                        events.book_topic(job.book_id), "job", job_id=job.id, status="running"
+                    )
+                    task = asyncio.create_task(self._run_job(job.id, owner))
+                    active.add(task)
+                    task.add_done_callback(active.discard)
+
+                if len(active) >= self.max_jobs:
+                    await self._preempt_for_queued(db)
+            except Exception as e:
+                print(f"[TTS队列] 调度出错: {e}")
+            finally:
+                db.close()
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+        if active:
+            await asyncio.gather(*active, return_exceptions=True)
+
+    async def _preempt_for_queued(self, db):
+        """队列中有更高优先级的任务时，让最低优先级的运行中任务让出槽位"""
+        if self._preempted or not self._job_priorities:
+            return
+        queued = await asyncio.to_thread(crud.get_next_queued_tts_job, db)
+        if queued is None:
+            return
+        if self._preempted or not self._job_priorities:
+            return
+        victim = max(self._job_priorities, key=lambda job_id: (self._job_priorities[job_id], job_id))
+        if crud.get_job_priority(queued) >= self._job_priorities[victim]:
+            return
+        self._preempted.add(victim)
+        self._job_stops[victim].set()
+        print(f"[TTS队列] 任务 {victim} 让出槽位给更高优先级的任务 {queued.id}")
+
+    @staticmethod
+    def _reconcile_counters() -> int:
+        db = SessionLocal()
+        try:
+            return crud.reconcile_status_counters(db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _publish_job(db, job_id: int):
+        """任务结束/挂起后推送最新状态"""
+        job = crud.get_tts_job(db, job_id)
+        if job is not None:
+            events.event_bus.publish(
+                events.book_topic(job.book_id), "job",
+                job_id=job.id, status=job.status, completed=job.completed,
+                failed=job.failed, total=job.total, error=job.error
+            )
+
+    async def _heartbeat(self, job_id: int, owner: str, stop: asyncio.Event):
+        """
+        定期续约；租约丢失或任务状态被修改时发出停止信号
+
+        续约持续失败（如数据库被锁）到租约到期时同样停止：此时任务可能已被回收并重新领取。
+        """
+        db = SessionLocal()
+        renewed_at = time.monotonic()
+        try:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self.heartbeat_seconds)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    status = await asyncio.to_thread(crud.renew_tts_job_lease, db, job_id, owner, self.lease_seconds)
+                except Exception as e:
+                    await asyncio.to_thread(db.rollback)
+                    print(f"[TTS队列] 任务 {job_id} 续约失败: {e}")
+                    if time.monotonic() - renewed_at >= self.lease_seconds:
+                        print(f"[TTS队列] 任务 {job_id} 租约已到期，停止执行")
+                        stop.set()
+                    continue
+                if status is None:
+                    print(f"[TTS队列] 任务 {job_id} 租约已丢失，停止执行")
+                else:
+                    renewed_at = time.monotonic()
+                if status != "running":
+                    stop.set()
+        finally:
+            db.close()
+
+    async def _run_job(self, job_id: int, owner: str):
+        """执行单个任务，直到范围内没有待合成段落或收到停止信号"""
+        from app.services import tts
+
+        stop = asyncio.Event()
+        # 同一任务的上一次执行租约已丢失但仍在运行时，通知其停止
+        previous = self._job_stops.get(job_id)
+        if previous is not None:
+            previous.set()
+        self._job_stops[job_id] = stop
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, owner, stop))
+        db = SessionLocal()
+
+        def should_stop() -> bool:
+            return stop.is_set() or self._stopping.is_set()
+
+        try:
+            job = await asyncio.to_thread(crud.get_tts_job, db, job_id)
+            book_id = job.book_id
+            scope = job.scope
+            scope_chapter_id = job.chapter_id
+            voice = job.voice
+            priority = crud.get_job_priority(job)
+            self._job_priorities[job_id] = priority
+            max_concurrent = job.max_concurrent or 5
+            chunk_size = max(max_concurrent * 4, 50)
+            # 整个任务共用一个自适应限制器，并发窗口跨批次保持
+            limiter = AdaptiveLimiter(max_concurrent)
+            register_limiter(job_id, book_id, limiter)
+
+            while not should_stop():
+                # 领取即标记为 processing，同一本书上重叠的任务不会重复合成同一段落
+                paragraphs = await asyncio.to_thread(crud.claim_job_paragraphs, db, job, chunk_size)
+                claimed_ids = [p.id for p in paragraphs]
+                # 已解码的段落不足一批时，解码下一个延迟章节
+                if len(paragraphs) < chunk_size and scope != "batch":
+                    chapter_id = scope_chapter_id if scope == "chapter" else None
+                    decoded = await asyncio.to_thread(lazy_import.decode_next_chapter, book_id, chapter_id)
+                    if decoded and not paragraphs:
+                        continue
+                if not paragraphs:
+                    break
+
+                try:
+                    # 每个任务作为独立的限流来源，按任务优先级与其他任务共享引擎额度
+                    with rate_flow(f"job:{job_id}", priority):
+                        result = await tts._synthesize_batch_async(
+                            paragraphs, voice, max_concurrent, should_stop=should_stop, limiter=limiter
+                        )
+                finally:
+                    # 因停止信号未开始合成的段落放回 pending
+                    await asyncio.to_thread(crud.release_claimed_paragraphs, db, claimed_ids, job_id, owner)
+                await asyncio.to_thread(crud.update_tts_job_counts, db, job_id, result['completed'], result['failed'])
+                await asyncio.to_thread(crud.update_book_tts_progress, db, book_id)
+
+            if self._stopping.is_set():
+                # worker 退出：任务重新入队，下次启动时继续
+                await asyncio.to_thread(crud.release_tts_job, db, job_id, owner, "queued")
+                print(f"[TTS队列] 任务 {job_id} 已挂起，等待下次启动继续")
+            elif job_id in self._preempted:
+                # 让出槽位：重新入队，高优先级任务完成后继续
+                await asyncio.to_thread(crud.release_tts_job, db, job_id, owner, "queued")
+                print(f"[TTS队列] 任务 {job_id} ({PRIORITY_NAMES[priority]}) 已重新入队")
+            elif stop.is_set():
+                # 被暂停/取消，或租约已丢失：保留 API 设置的状态
+                await asyncio.to_thread(crud.release_tts_job, db, job_id, owner)
+                print(f"[TTS队列] 任务 {job_id} 已停止")
+            else:
+                await asyncio.to_thread(crud.release_tts_job, db, job_id, owner, "completed")
+                print(f"[TTS队列] 任务 {job_id} 已完成")
+            await asyncio.to_thread(self._publish_job, db, job_id)
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            await asyncio.to_thread(db.rollback)
+            await asyncio.to_thread(crud.release_tts_job, db, job_id, owner, "failed", str(e))
+            await asyncio.to_thread(self._publish_job, db, job_id)
+
+        finally:
+            stop.set()
+            await heartbeat
+            # 任务已被重新领取时，登记项属于新的执行
+            if self._job_stops.get(job_id) is stop:
+                unregister_limiter(job_id)
+                self._job_stops.pop(job_id, None)
+                self._job_priorities.pop(job_id, None)
+                self._preempted.discard(job_id)
+            db.close()
+            # 槽位空出，立即领取下一个任务
+            if self._wakeup:
+                self._wakeup.set()
+
+
+# 进程内唯一 worker
+_worker: Optional[TTSJobWorker] = None
+
+
+def get_worker() -> Optional[TTSJobWorker]:
+    """获取当前运行的 worker（未启动时返回 None）"""
+    return _worker
+
+
+def start_worker() -> TTSJobWorker:
+    """启动后台 worker（应用启动时调用）"""
+    global _worker
+    if _worker is None:
+        _worker = TTSJobWorker()
+    _worker.start()
+    return _worker
+
+
+def stop_worker():
+    """停止后台 worker（应用关闭时调用）"""
+    if _worker is not None:
+        _worker.stop()
+
+
+def notify_job_queued():
+    """新任务入队后唤醒 worker"""
+    if _worker is not None:
+        _worker.wake()
+
+
+def notify_job_changed(job_id: int):
+    """任务被暂停/取消/恢复后通知 worker"""
+    if _worker is not None:
+        _worker.notify_job_changed(job_id)
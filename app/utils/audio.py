@@ -2,8 +2,9 @@ import os
 import subprocess
 import shutil
 import sys
+import tempfile
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 # Python 3.13+ audioop 兼容性补丁
 try:
@@ -35,6 +36,197 @@ def get_audio_duration(audio_path: str) -> Optional[int]:
         return None
 
 
+def _mp3_frames(data: bytes) -> bytes:
+    """去掉 ID3v2 头部与 ID3v1 尾部标签，只保留 MPEG 帧数据"""
+    if data[:3] == b"ID3" and len(data) >= 10:
+        # ID3v2 标签大小为 4 字节 synchsafe 整数（每字节 7 位），不含 10 字节头
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+
+# MPEG Layer III 比特率 (kbps) 与采样率表
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    25: [11025, 12000, 8000],
+}
+
+
+def _parse_mp3_header(data: bytes, pos: int) -> Optional[Tuple[int, float]]:
+    """解析 pos 处的 Layer III 帧头，返回 (帧长度, 帧时长毫秒)；不是有效帧头时返回 None"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (data[pos + 1] >> 3) & 0x03
+    layer_bits = (data[pos + 1] >> 1) & 0x03
+    if version_bits == 1 or layer_bits != 1:
+        return None
+    version = {3: 1, 2: 2, 0: 25}[version_bits]
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 0x03
+    if bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (data[pos + 2] >> 1) & 0x01
+    samples = 1152 if version == 1 else 576
+    length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples * 1000 / sample_rate
+
+
+def parse_mp3_frames(data: bytes) -> List[Tuple[int, int, float]]:
+    """
+    解析 MP3 (Layer III) 码流中的帧
+
+    Returns:
+        [(帧起始字节, 帧长度, 帧时长毫秒), ...]；遇到无法识别的字节时向后搜索下一个帧头
+    """
+    frames = []
+    pos = 0
+    while pos + 4 <= len(data):
+        header = _parse_mp3_header(data, pos)
+        if header is None:
+            next_pos = data.find(b"\xff", pos + 1)
+            if next_pos < 0:
+                break
+            pos = next_pos
+            continue
+        length, duration = header
+        if pos + length > len(data):
+            break
+        frames.append((pos, length, duration))
+        pos += length
+    return frames
+
+
+class Mp3DurationCounter:
+    """
+    边接收 MP3 码流边累加帧时长（不解码、不落盘），合成结束时即得到精确时长
+
+    使用示例:
+        counter = Mp3DurationCounter()
+        async for chunk in stream:
+            counter.feed(chunk)
+        counter.duration_ms
+    """
+
+    def __init__(self):
+        # 尚未凑成完整帧的尾部字节
+        self._buffer = b""
+        # 待跳过的 ID3v2 标签字节数；None 表示还未检查文件头
+        self._skip: Optional[int] = None
+        self._first_frame = True
+        self.frames = 0
+        self._duration = 0.0
+
+    @property
+    def duration_ms(self) -> int:
+        return int(self._duration)
+
+    def feed(self, data: bytes):
+        data = self._buffer + data
+        if self._skip is None:
+            if len(data) < 10:
+                self._buffer = data
+                return
+            self._skip = 0
+            if data[:3] == b"ID3":
+                size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+                self._skip = 10 + size + (10 if data[5] & 0x10 else 0)
+        if self._skip:
+            skipped = min(self._skip, len(data))
+            data = data[skipped:]
+            self._skip -= skipped
+
+        pos = 0
+        while pos + 4 <= len(data):
+            header = _parse_mp3_header(data, pos)
+            if header is None:
+                next_pos = data.find(b"\xff", pos + 1)
+                if next_pos < 0:
+                    pos = len(data)
+                    break
+                pos = next_pos
+                continue
+            length, duration = header
+            if pos + length > len(data):
+                break
+            # 编码器写在第一帧的 Xing/Info 标签帧不含音频，与 mutagen 一致不计入时长
+            if not (self._first_frame and _is_info_frame(data[pos:pos + length])):
+                self.frames += 1
+                self._duration += duration
+            self._first_frame = False
+            pos += length
+        self._buffer = data[pos:]
+
+
+def _is_info_frame(frame: bytes) -> bool:
+    """VBR/CBR 信息帧的标签位于帧头与 side info 之后"""
+    return b"Xing" in frame[:64] or b"Info" in frame[:64]
+
+
+def split_mp3(audio_path: str, cut_points_ms: List[float], output_paths: List[str]) -> Optional[List[int]]:
+    """
+    在帧边界处把 MP3 切分为多个文件（不重新编码）
+
+    Args:
+        cut_points_ms: 升序的切分时间点，数量为 len(output_paths) - 1；每段从时间点之后的第一帧开始
+        output_paths: 各段输出路径
+
+    Returns:
+        各段时长（毫秒）；无法解析出帧时返回 None
+    """
+    with open(audio_path, "rb") as f:
+        data = _mp3_frames(f.read())
+    frames = parse_mp3_frames(data)
+    if not frames:
+        return None
+
+    pieces: List[List[Tuple[int, int, float]]] = [[] for _ in output_paths]
+    index = 0
+    elapsed = 0.0
+    for frame in frames:
+        while index < len(cut_points_ms) and elapsed >= cut_points_ms[index]:
+            index += 1
+        pieces[index].append(frame)
+        elapsed += frame[2]
+
+    durations = []
+    for output_path, piece in zip(output_paths, pieces):
+        with open(output_path, "wb") as out:
+            for start, length, _ in piece:
+                out.write(data[start:start + length])
+        durations.append(int(sum(duration for _, _, duration in piece)))
+    return durations
+
+
+def concat_mp3(audio_paths: List[str], output_path: str) -> bool:
+    """
+    按字节拼接同规格的 MP3 片段（如同一语音的分片合成结果）。
+    MPEG 帧相互独立，无需解码/重新编码；各片段的 ID3 标签会被去除。
+    """
+    tmp_path = f"{output_path}.tmp"
+    try:
+        with open(tmp_path, "wb") as out:
+            for audio_path in audio_paths:
+                with open(audio_path, "rb") as f:
+                    out.write(_mp3_frames(f.read()))
+        os.replace(tmp_path, output_path)
+        return True
+    except OSError as e:
+        print(f"[音频] 拼接 MP3 失败: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
 def merge_audio_to_wav(
     audio_paths: List[str],
     output_path: str,
@@ -48,16 +240,138 @@ def merge_audio_to_wav(
                        sample_rate=sample_rate, channels=channels)
 
 
+def _ffmpeg_available() -> bool:
+    """检查系统中是否安装了 ffmpeg"""
+    return shutil.which("ffmpeg") is not None
+
+
+def _probe_mp3_format(audio_path: str) -> Optional[Tuple[int, int]]:
+    """读取 MP3 的 (采样率, 声道数)，非 MP3 或读取失败返回 None"""
+    if not MUTAGEN_AVAILABLE or not audio_path.lower().endswith(".mp3"):
+        return None
+    try:
+        info = MP3(audio_path).info
+        return info.sample_rate, info.channels
+    except Exception:
+        return None
+
+
+def _can_stream_copy(audio_paths: List[str], sample_rate: int, channels: int) -> bool:
+    """所有输入均为采样率/声道与目标一致的 MP3 时，可直接拷贝码流而无需重新编码"""
+    return all(_probe_mp3_format(p) == (sample_rate, channels) for p in audio_paths)
+
+
+def _merge_with_ffmpeg(
+    audio_paths: List[str],
+    output_path: str,
+    output_format: str,
+    sample_rate: int,
+    channels: int,
+    bitrate: str,
+    stream_copy: bool
+) -> bool:
+    """
+    使用 ffmpeg concat demuxer 流式合并音频
+
+    ffmpeg 逐个读取输入文件，内存占用与总时长无关；
+    stream_copy 时直接拼接 MP3 帧，不解码也不重新编码。
+    """
+    list_fd, list_path = tempfile.mkstemp(suffix=".txt", prefix="concat_")
+    try:
+        with os.fdopen(list_fd, "w", encoding="utf-8") as f:
+            for path in audio_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        cmd = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-vn", "-map_metadata", "-1",
+        ]
+        if stream_copy:
+            cmd += ["-c", "copy"]
+        else:
+            cmd += ["-ar", str(sample_rate), "-ac", str(channels)]
+            if output_format == "mp3":
+                cmd += ["-c:a", "libmp3lame", "-b:a", bitrate]
+            elif output_format == "wav":
+                cmd += ["-c:a", "pcm_s16le"]  # 16位 WAV
+        cmd += ["-f", output_format, output_path]
+
+        proc = subprocess.run(cmd, capture_output=True)
+        if proc.returncode != 0:
+            err = proc.stderr.decode("utf-8", errors="ignore").strip()
+            print(f"[导出] ffmpeg 合并失败: {err[-500:]}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return False
+        return True
+    finally:
+        os.remove(list_path)
+
+
+def _merge_with_pydub(
+    audio_paths: List[str],
+    output_path: str,
+    output_format: str,
+    sample_rate: int,
+    channels: int,
+    bitrate: str
+) -> bool:
+    """使用 pydub 在内存中合并（ffmpeg 不可用或 concat 失败时的回退方案）"""
+    try:
+        from pydub import AudioSegment
+    except Exception as e:
+        print(f"[导出] 报错详情: {e}")
+        return False
+
+    # 创建空音频
+    combined = AudioSegment.empty()
+
+    for audio_path in audio_paths:
+        # 加载音频片段
+        try:
+            segment = AudioSegment.from_file(audio_path)
+            combined += segment
+        except Exception as e:
+            print(f"[导出] 警告: 加载音频失败 {audio_path}: {e}")
+            continue
+
+    if len(combined) == 0:
+        print("[导出] 错误: 没有可用的音频片段")
+        return False
+
+    # 转换参数：采样率、单声道
+    combined = combined.set_frame_rate(sample_rate)
+    combined = combined.set_channels(channels)
+
+    # 导出
+    export_params = {"format": output_format}
+    if output_format == "mp3":
+        export_params["bitrate"] = bitrate
+    elif output_format == "wav":
+        combined = combined.set_sample_width(2)  # 16位 WAV
+
+    combined.export(output_path, **export_params)
+    return True
+
+
 def merge_audio(
     audio_paths: List[str],
     output_path: str,
     output_format: str = "mp3",
     sample_rate: int = 24000,
     channels: int = 1,
-    bitrate: str = "64k"
+    bitrate: str = "64k",
+    stream_copy: bool = True
 ) -> bool:
     """
     将多个音频文件合并为单个音频文件。
+
+    合并策略（依次回退）:
+    1. ffmpeg concat + 码流拷贝：输入均为目标采样率/声道的 MP3（如 Edge TTS 输出）
+    2. ffmpeg concat + 重新编码：流式处理，内存占用恒定
+    3. pydub：在内存中解码合并，ffmpeg 不可用或以上两种方式都失败时使用
     
     Args:
         audio_paths: 音频文件路径列表
@@ -65,66 +379,65 @@ def merge_audio(
         output_format: 输出格式 ("mp3", "wav", "ogg")
         sample_rate: 采样率（默认 24kHz，有声书足够）
         channels: 声道数（默认单声道）
-        bitrate: MP3 比特率（默认 64k，有声书推荐值）
+        bitrate: MP3 比特率（默认 64k，有声书推荐值；码流拷贝时保持源比特率）
+        stream_copy: 是否允许码流拷贝
     
     Returns:
         是否成功
     """
-    try:
-        from pydub import AudioSegment
-    except Exception as e:
-        print(f"[导出] 报错详情: {e}")
+    # 过滤无音频的段落
+    valid_paths = []
+    for audio_path in audio_paths:
+        if audio_path and os.path.exists(os.path.abspath(audio_path)):
+            valid_paths.append(os.path.abspath(audio_path))
+    skipped = len(audio_paths) - len(valid_paths)
+
+    if not valid_paths:
+        print("[导出] 错误: 没有可用的音频片段")
         return False
-    
+
+    if skipped > 0:
+        print(f"[导出] 跳过了 {skipped} 个无音频的段落")
+
     try:
-        # 创建空音频
-        combined = AudioSegment.empty()
-        skipped = 0
-        
-        for audio_path in audio_paths:
-            if not audio_path:
-                skipped += 1
-                continue
-                
-            full_path = os.path.abspath(audio_path)
-            if not os.path.exists(full_path):
-                skipped += 1
-                continue
-            
-            # 加载音频片段
-            try:
-                segment = AudioSegment.from_file(full_path)
-                combined += segment
-            except Exception as e:
-                print(f"[导出] 警告: 加载音频失败 {audio_path}: {e}")
-                skipped += 1
-                continue
-        
-        if len(combined) == 0:
-            print("[导出] 错误: 没有可用的音频片段")
+        if _ffmpeg_available():
+            copy = (
+                stream_copy
+                and output_format == "mp3"
+                and _can_stream_copy(valid_paths, sample_rate, channels)
+            )
+            success = _merge_with_ffmpeg(
+                valid_paths, output_path, output_format,
+                sample_rate, channels, bitrate, copy
+            )
+            if not success and copy:
+                # 码流拷贝失败（如输入参数不一致），回退为重新编码
+                success = _merge_with_ffmpeg(
+                    valid_paths, output_path, output_format,
+                    sample_rate, channels, bitrate, False
+                )
+            if not success:
+                # ffmpeg concat 两种方式都失败（如个别文件损坏），回退为 pydub 逐个加载，跳过无法读取的片段
+                print("[导出] ffmpeg 合并失败，回退为 pydub")
+                success = _merge_with_pydub(
+                    valid_paths, output_path, output_format,
+                    sample_rate, channels, bitrate
+                )
+        else:
+            success = _merge_with_pydub(
+                valid_paths, output_path, output_format,
+                sample_rate, channels, bitrate
+            )
+
+        if not success:
             return False
-        
-        if skipped > 0:
-            print(f"[导出] 跳过了 {skipped} 个无音频的段落")
-        
-        # 转换参数：采样率、单声道
-        combined = combined.set_frame_rate(sample_rate)
-        combined = combined.set_channels(channels)
-        
-        # 导出
-        export_params = {"format": output_format}
-        if output_format == "mp3":
-            export_params["bitrate"] = bitrate
-        elif output_format == "wav":
-            combined = combined.set_sample_width(2)  # 16位 WAV
-        
-        combined.export(output_path, **export_params)
-        
+
         file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
-        duration_min = len(combined) / 60000
         fmt_label = output_format.upper()
+        duration_ms = get_audio_duration(output_path) if output_format == "mp3" else None
+        duration_label = f"时长: {duration_ms / 60000:.1f}分钟, " if duration_ms else ""
         print(f"[导出] {fmt_label} 已生成: {output_path} "
-              f"(时长: {duration_min:.1f}分钟, 大小: {file_size_mb:.1f}MB)")
+              f"({duration_label}大小: {file_size_mb:.1f}MB)")
         
         return True
         
@@ -133,4 +446,3 @@ def merge_audio(
         import traceback
         traceback.print_exc()
         return False
-
@@ -35,6 +35,9 @@ def create_zip_archive(output_base_dir: Path, book_title: str) -> Optional[Path]
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
             for root, dirs, files in os.walk(book_dir):
                 for file in files:
+                    # 跳过导出清单等隐藏文件
+                    if file.startswith('.'):
+                        continue
                     file_path = Path(root) / file
                     arcname = file_path.relative_to(book_dir)
                     zipf.write(file_path, arcname)
@@ -34,6 +34,44 @@ def split_to_sentences(text: str) -> List[str]:
     return result if result else [text]
 
 
+def split_into_chunks(text: str, max_chars: int) -> List[str]:
+    """
+    将长文本按句子边界拆分为不超过 max_chars 的片段（用于分片合成）。
+    相邻句子合并到同一片段；单句超长时在逗号等次级停顿处拆分，仍超长则按长度截断。
+    """
+    if not text or len(text) <= max_chars:
+        return [text] if text else []
+
+    # (片段, 是否位于句首)：句子之间拆分时丢失的空格需要补回（如英文句子）
+    pieces = []
+    for sentence in split_to_sentences(text):
+        if len(sentence) <= max_chars:
+            pieces.append((sentence, True))
+            continue
+        first = True
+        for clause in re.split(r'(?<=[，,、：:])', sentence):
+            while len(clause) > max_chars:
+                pieces.append((clause[:max_chars], first))
+                clause = clause[max_chars:]
+                first = False
+            if clause:
+                pieces.append((clause, first))
+                first = False
+
+    chunks = []
+    current = ""
+    for piece, sentence_start in pieces:
+        sep = " " if sentence_start and current and current[-1].isascii() and piece[0].isascii() else ""
+        if current and len(current) + len(sep) + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current += sep + piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
 def sanitize_filename(name: str) -> str:
     """清理文件名，移除不合法字符"""
     # 替换 Windows 不允许的字符
@@ -1,7 +1,7 @@
 
 import sys
 import os
-import shutil
+import argparse
 import asyncio
 from pathlib import Path
 
@@ -11,7 +11,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app.database import SessionLocal, init_db
 from app import crud, models
 from app.services import audiobook_exporter, tts
-from app.utils.audio import merge_audio
+from app.services.tts_providers.rate_limit import rate_flow
 from app.utils.files import get_zip_path, create_zip_archive
 from app.config import get_settings
 
@@ -83,24 +83,20 @@ async def run_synthesis(db, book_id, max_concurrent=20):
                 break
             print(f"\n🔄 第 {round_num} 轮重试 (剩余: {len(paragraphs)})...")
 
-        semaphore = asyncio.Semaphore(max_concurrent)
         pbar = tqdm(total=len(paragraphs), desc=f"合成进度 (第{round_num}轮)", unit="段")
-        
-        async def process_one(para):
-            async with semaphore:
-                try:
-                    success = await tts.synthesize_paragraph(db, para, voice)
-                    return success
-                except Exception:
-                    return False
-                finally:
-                    pbar.update(1)
 
-        results = await asyncio.gather(*[process_one(p) for p in paragraphs])
+        # 状态由 StatusSink 批量写回，这里只负责更新进度条
+        with rate_flow(f"cli:{book_id}"):
+            result = await tts._synthesize_batch_async(
+                paragraphs, voice, max_concurrent,
+                on_result=lambda task, success: pbar.update(1)
+            )
         pbar.close()
+        # 批量写回使用独立 Session，丢弃本会话中的旧状态
+        db.expire_all()
         
-        success_count = sum(1 for r in results if r)
-        fail_count = len(paragraphs) - success_count
+        success_count = result['completed']
+        fail_count = result['failed']
         print(f"  ✅ 成功: {success_count}, ❌ 失败: {fail_count}")
         
         if fail_count == 0:
@@ -117,7 +113,7 @@ async def run_synthesis(db, book_id, max_concurrent=20):
     print(f"📊 最终合成结果: {final_completed}/{final_total}")
     return final_completed > 0
 
-def export_with_progress(db, book_id):
+def export_with_progress(db, book_id, workers=None, force=False):
     """Run export with tqdm progress bar"""
     book = crud.get_book(db, book_id)
     if not book:
@@ -136,75 +132,35 @@ def export_with_progress(db, book_id):
         print("❌ 错误: 该书籍没有任何已完成的音频。请先运行合成任务。")
         return
 
-    # 1. Prepare
     settings = get_settings()
     output_base_dir = Path(settings.OUTPUT_DIR)
+    workers = workers or settings.EXPORT_WORKERS
     
-    print("正在分析章节分组...")
-    groups = audiobook_exporter.group_chapters_by_duration(db, book_id)
-    
-    if not groups:
-        print("没有可导出的章节 (可能没有完成的音频)")
-        return
+    # 分组合并由 audiobook_exporter 完成（workers > 1 时使用进程池），这里只负责进度条
+    pbar = None
 
-    # Prepare output dir
-    book_dir = output_base_dir / audiobook_exporter.sanitize_filename(book.title)
-    if book_dir.exists():
-        # Keep old files? Better clear them for a fresh export
-        shutil.rmtree(book_dir)
-    book_dir.mkdir(parents=True, exist_ok=True)
-    
-    total_steps = len(groups)
-    success_count = 0
-    
-    # 2. Process with Progress Bar
-    pbar = tqdm(groups, desc="导出进度", unit="段")
-    
-    for group in pbar:
-        folder_name = audiobook_exporter._get_group_folder_name(group['chapter_indices'])
-        pbar.set_postfix_str(f"处理: {folder_name}")
-        
-        # Create segment dir
-        segment_dir = book_dir / folder_name
-        segment_dir.mkdir(parents=True, exist_ok=True)
-        
-        mp3_path = segment_dir / f"{folder_name}.mp3"
-        lrc_path = segment_dir / f"{folder_name}.lrc"
-        
-        # 生成 LRC
-        try:
-            lrc_content = audiobook_exporter.generate_lrc(
-                group['paragraphs'],
-                book_title=book.title,
-                author=book.author
-            )
-            with open(lrc_path, 'w', encoding='utf-8') as f:
-                f.write(lrc_content)
-        except Exception as e:
-            pbar.write(f"❌ LRC 生成失败 ({folder_name}): {e}")
-            continue
+    def on_progress(done, total, result):
+        nonlocal pbar
+        if pbar is None:
+            pbar = tqdm(total=total, desc=f"导出进度 ({workers} 进程)", unit="段")
+        pbar.set_postfix_str(f"完成: {result['folder']}")
+        pbar.update(1)
+        if not result['wav_generated']:
+            pbar.write(f"⚠️ 音频合并失败，跳过: {result['folder']}")
 
-        # 合并音频为 MP3
-        audio_paths = [p.audio_path for p in group['paragraphs']]
-        wav_success = merge_audio(audio_paths, str(mp3_path), output_format="mp3", bitrate="64k")
-        
-        if wav_success:
-            success_count += 1
-        else:
-            # Cleanup on failure
-            if lrc_path.exists():
-                lrc_path.unlink()
-            if segment_dir.exists():
-                # Only remove if empty
-                try:
-                    segment_dir.rmdir()
-                except OSError:
-                    pass
-            pbar.write(f"⚠️ 音频合并失败，跳过: {folder_name}")
+    result = audiobook_exporter.export_book(
+        db, book_id, str(output_base_dir), workers=workers, on_progress=on_progress, force=force
+    )
+    if pbar is not None:
+        pbar.close()
 
-    pbar.close()
-    
-    print(f"\n📊 导出统计: {success_count}/{total_steps} 个音频段成功")
+    if not result.get('total_segments'):
+        print(f"没有可导出的章节 ({result['message']})")
+        return
+
+    success_count = result['success_count']
+    print(f"\n📊 导出统计: {success_count}/{result['total_segments']} 个音频段成功"
+          f" (未变化复用 {result['reused_count']} 个)")
     
     # 3. Create ZIP
     if success_count > 0:
@@ -220,14 +176,25 @@ def export_with_progress(db, book_id):
         print("❌ 没有生成任何有效音频，跳过 ZIP 创建")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="VoiceBook 命令行合成/导出工具")
+    parser.add_argument("target", nargs="?", help="书籍 ID 或电子书文件路径")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="并发合并分组的进程数（默认读取 EXPORT_WORKERS）")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="忽略导出清单，全部重新合并")
+    return parser.parse_args()
+
+
 async def main():
+    args = parse_args()
     init_db()
     db = SessionLocal()
     try:
         book_id = None
         
-        if len(sys.argv) > 1:
-            arg = sys.argv[1]
+        if args.target:
+            arg = args.target
             if os.path.exists(arg):
                 # 如果是文件路径，先通过 decoder 获取或导入书籍
                 from app.services import decoder
@@ -277,7 +244,7 @@ async def main():
                 print("未合成音频，无法导出。")
                 return
 
-        export_with_progress(db, book_id)
+        export_with_progress(db, book_id, workers=args.workers, force=args.force)
 
     except KeyboardInterrupt:
         print("\n已取消")
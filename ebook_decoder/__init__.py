@@ -13,6 +13,7 @@ from .models import Book, Paragraph
 from .base_decoder import BaseDecoder
 from .pdf_decoder import PDFDecoder, calculate_timestamps
 from .decoder_factory import DecoderFactory
+from .parallel import iter_decoded_pages
 
 # 可选：EPUB 解码器
 try:
@@ -31,6 +32,7 @@ __all__ = [
     'EPUBDecoder',
     'DecoderFactory',
     'calculate_timestamps',
+    'iter_decoded_pages',
     'is_epub_available',
 ]
 
@@ -3,7 +3,7 @@
 定义所有电子书解码器的统一接口
 """
 from abc import ABC, abstractmethod
-from typing import List, Generator
+from typing import List, Generator, Iterator, Optional, Tuple
 from .models import Book, Paragraph
 
 
@@ -74,6 +74,27 @@ class BaseDecoder(ABC):
             for para in paragraphs:
                 yield para
     
+    def decode_all_pages_parallel(
+        self,
+        book_id: int = 0,
+        max_workers: Optional[int] = None
+    ) -> Iterator[Tuple[int, str, List[Paragraph]]]:
+        """
+        多进程解码所有页面（生成器模式）
+
+        页面按连续区间分给多个工作进程，每个进程独立打开一份文档；
+        适合解析受 GIL 限制、线程池无法提速的大文档
+
+        Args:
+            book_id: 书籍ID
+            max_workers: 最大进程数，默认 CPU 核心数 - 1
+
+        Yields:
+            按页码顺序返回 (页码, 章节标题, 段落列表)
+        """
+        from .parallel import default_workers, iter_decoded_pages
+        return iter_decoded_pages(self, book_id, max_workers or default_workers())
+
     @abstractmethod
     def decode_all_pages_concurrent(
         self, 
@@ -114,6 +135,15 @@ class BaseDecoder(ABC):
         """
         return f"Chapter {page_num + 1}"
     
+    def get_outline(self) -> List[Tuple[int, str, int]]:
+        """
+        获取文档目录（书签）
+        
+        Returns:
+            [(层级, 标题, 起始页码)] 列表，页码从 0 开始；默认无目录
+        """
+        return []
+    
     def split_into_paragraphs(self, text: str, min_length: int = 2) -> List[str]:
         """
         将文本分割成段落（改进版：防止小数点误断和孤立括号）
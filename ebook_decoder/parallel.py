@@ -0,0 +1,115 @@
+"""
+多进程页面解码
+将页面/章节按连续区间分给多个工作进程，每个进程独立打开一份文档（fitz 文档 / EPUB 压缩包 / 文本文件），
+结果按页码顺序返回。
+
+页面解码中的 PyMuPDF 文本提取、BeautifulSoup 解析和正则分段都受 GIL 限制，
+线程池无法提速，多进程可以随核心数线性扩展。
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional, Tuple, Type
+
+from .base_decoder import BaseDecoder
+from .models import Paragraph
+
+# 解码结果：(页码, 标题, 段落列表)
+DecodedPage = Tuple[int, str, List[Paragraph]]
+
+# 工作进程内打开的解码器
+_worker_decoder: Optional[BaseDecoder] = None
+
+
+def _init_worker(decoder_class: Type[BaseDecoder], file_path: str):
+    """工作进程初始化：打开一份独立的文档，整个进程生命周期内复用"""
+    global _worker_decoder
+    decoder = decoder_class(file_path)
+    _worker_decoder = decoder.__enter__()
+
+
+def _decode_chunk_in_worker(first: int, last: int, book_id: int) -> List[DecodedPage]:
+    """在工作进程中解码一段连续页面 [first, last)"""
+    return [decode_page_with_title(_worker_decoder, page_num, book_id) for page_num in range(first, last)]
+
+
+def decode_page_with_title(decoder: BaseDecoder, page_num: int, book_id: int = 0) -> DecodedPage:
+    """在当前进程中解码单页"""
+    paragraphs = decoder.decode_page(page_num, book_id)
+    title = decoder.get_chapter_title(page_num) if paragraphs else ""
+    return page_num, title, paragraphs
+
+
+def default_workers() -> int:
+    """默认进程数：CPU 核心数 - 1（至少 1）"""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def iter_decoded_pages(
+    decoder: BaseDecoder,
+    book_id: int = 0,
+    workers: int = 1,
+    start: int = 0
+) -> Iterator[DecodedPage]:
+    """
+    按页码顺序逐页产出 (页码, 标题, 段落列表)
+
+    Args:
+        decoder: 已打开的解码器（单进程解码及读取页数时使用）
+        workers: 工作进程数；<= 1 或页数不足两页时在当前进程中顺序解码
+        start: 起始页码
+
+    工作进程异常退出时，剩余页面回退到当前进程顺序解码。
+    分片按滑动窗口提交，同时最多 workers * 2 个分片在解码或等待读取，
+    调用方消费变慢时工作进程随之暂停，已解码但未读取的页面不会堆积在内存中。
+    """
+    page_count = decoder.get_page_count()
+    pages = range(start, page_count)
+    workers = min(workers, len(pages))
+
+    if workers <= 1:
+        for page_num in pages:
+            yield decode_page_with_title(decoder, page_num, book_id)
+        return
+
+    # 每个任务包含一段连续页面，兼顾调度开销与负载均衡
+    chunksize = max(1, min(32, len(pages) // (workers * 4)))
+    next_page = start
+    # spawn 启动子进程，避免 fork 带有后台线程的服务进程
+    context = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(type(decoder), decoder.file_path)
+    )
+    chunks = iter(range(start, page_count, chunksize))
+    window = deque()
+
+    def submit_next() -> bool:
+        first = next(chunks, None)
+        if first is None:
+            return False
+        window.append(pool.submit(_decode_chunk_in_worker, first, min(first + chunksize, page_count), book_id))
+        return True
+
+    try:
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+        while window:
+            decoded = window.popleft().result()
+            # 取走一个分片后再补充一个，保持窗口大小
+            submit_next()
+            for page in decoded:
+                next_page = page[0] + 1
+                yield page
+    except BrokenProcessPool as e:
+        print(f"[解码] 解码进程异常退出，剩余页面改为单进程解码: {e}")
+        for page_num in range(next_page, page_count):
+            yield decode_page_with_title(decoder, page_num, book_id)
+    finally:
+        # 调用方提前结束迭代时取消尚未开始的分片
+        pool.shutdown(wait=True, cancel_futures=True)
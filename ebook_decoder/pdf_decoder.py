@@ -34,6 +34,15 @@ class PDFDecoder(BaseDecoder):
         """获取总页数"""
         return len(self.doc)
     
+    def get_outline(self) -> List[Tuple[int, str, int]]:
+        """读取 PDF 书签目录（只读目录结构，不解析页面内容）"""
+        outline = []
+        for level, title, page in self.doc.get_toc(simple=True):
+            # 书签页码从 1 开始，指向文档外或无效页面时为 -1
+            if 1 <= page <= len(self.doc):
+                outline.append((level, title.strip(), page - 1))
+        return outline
+    
     def extract_page_text(self, page_num: int) -> str:
         """提取单页文本"""
         page = self.doc[page_num]
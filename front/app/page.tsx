@@ -16,10 +16,25 @@ function StudioContent() {
 
   const { data: paragraphs, error, isLoading, mutate: mutateParagraphs } = useSWR<Paragraph[]>(
     chapterId ? `paragraphs-${chapterId}` : null,
-    () => api.getParagraphs(chapterId!),
-    { refreshInterval: 5000 }
+    () => api.getParagraphs(chapterId!)
   );
 
+  // Paragraph status changes are pushed over SSE instead of polling
+  useEffect(() => {
+    if (!bookId || !chapterId) return;
+    const source = new EventSource(api.getProgressStreamUrl(bookId));
+    source.addEventListener("paragraph", (e) => {
+      const { paragraph_id, status } = JSON.parse((e as MessageEvent).data);
+      mutateParagraphs(
+        (current) => current?.map(p => p.id === paragraph_id ? { ...p, tts_status: status } : p),
+        { revalidate: false }
+      );
+    });
+    // Refetch when a job finishes so audio paths/durations are fresh
+    source.addEventListener("job", () => mutateParagraphs());
+    return () => source.close();
+  }, [bookId, chapterId, mutateParagraphs]);
+
   const [isPlaying, setIsPlaying] = useState(false);
   const [currentId, setCurrentId] = useState<string | undefined>(undefined);
   const [playbackRate, setPlaybackRate] = useState(1.0);
@@ -131,15 +146,19 @@ function StudioContent() {
     }
   };
 
-  const handleSynth = async (id: string, voiceId?: string) => {
-    if (!bookId) return;
-    try {
-      await api.synthesizeParagraph(bookId, Number(id), voiceId);
-      mutateParagraphs();
-    } catch (err) {
+  const handleSynth = (id: string, voiceId?: string) => {
+    if (!bookId || !audioRef.current) return;
+    // Play the new audio while it is being synthesized; status updates arrive over SSE
+    const audio = audioRef.current;
+    setCurrentId(id);
+    setIsPlaying(true);
+    audio.src = api.getParagraphStreamUrl(bookId, Number(id), voiceId);
+    audio.addEventListener("ended", () => mutateParagraphs(), { once: true });
+    audio.play().catch(err => {
       console.error("Synthesis failed", err);
+      setIsPlaying(false);
       alert("合成请求失败");
-    }
+    });
   };
 
   const handleBatchSynth = async (ids: string[]) => {
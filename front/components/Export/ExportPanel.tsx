@@ -48,24 +48,31 @@ export function ExportPanel({ isOpen, onClose, bookId }: ExportPanelProps) {
         });
     };
 
-    // Poll for status if exporting or just finished
+    // Export progress is pushed over SSE while the panel is open
+    const [groupProgress, setGroupProgress] = useState<{ done: number, total: number } | null>(null);
     React.useEffect(() => {
-        let interval: NodeJS.Timeout;
-        if (isExporting || (exportResult?.success && !hasExistingExport)) {
-            interval = setInterval(() => {
-                if (bookId) {
-                    api.getExportFiles(bookId).then(data => {
-                        if (data.files && data.files.length > 0) {
-                            setHasExistingExport(true);
-                            // If we were exporting, we can stop polling now (or keep polling until all done?)
-                            // For now, if we see files, we assume success enough to download
-                        }
-                    });
-                }
-            }, 3000);
-        }
-        return () => clearInterval(interval);
-    }, [isExporting, exportResult, hasExistingExport, bookId]);
+        if (!isOpen || !bookId) return;
+        const source = new EventSource(api.getExportStreamUrl(bookId));
+        source.addEventListener("export_started", (e) => {
+            const data = JSON.parse((e as MessageEvent).data);
+            setGroupProgress({ done: 0, total: data.rebuild_segments });
+        });
+        source.addEventListener("export_group", (e) => {
+            const data = JSON.parse((e as MessageEvent).data);
+            setGroupProgress({ done: data.done, total: data.total });
+        });
+        source.addEventListener("export_finished", (e) => {
+            const data = JSON.parse((e as MessageEvent).data);
+            setGroupProgress(null);
+            if (data.success) {
+                setExportResult(null);
+                setHasExistingExport(true);
+            } else {
+                setExportResult({ success: false, message: data.message });
+            }
+        });
+        return () => source.close();
+    }, [isOpen, bookId]);
 
     if (!isOpen) return null;
 
@@ -132,6 +139,9 @@ export function ExportPanel({ isOpen, onClose, bookId }: ExportPanelProps) {
                             <div className="text-sm">
                                 <p className="font-medium">{exportResult.success ? "导出任务进行中..." : "导出失败"}</p>
                                 <p className="mt-1 opacity-90">{exportResult.message}</p>
+                                {exportResult.success && groupProgress && groupProgress.total > 0 && (
+                                    <p className="mt-1 text-xs">已完成 {groupProgress.done}/{groupProgress.total} 个音频段</p>
+                                )}
                             </div>
                         </div>
                     )}
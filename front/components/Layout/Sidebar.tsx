@@ -1,6 +1,6 @@
 "use client";
 
-import React, { useState, useRef } from "react";
+import React, { useState, useRef, useEffect } from "react";
 import { BookOpen, Mic, Upload, ChevronRight, ChevronDown, Loader2, Trash2 } from "lucide-react";
 import { useRouter, useSearchParams } from "next/navigation";
 import useSWR from "swr";
@@ -157,13 +157,21 @@ function BookItem({ book, isExpanded, onToggle, currentChapterId, onChapterClick
 }) {
     const { data: chapters } = useSWR<Chapter[]>(isExpanded ? `chapters-${book.id}` : null, () => api.getChapters(book.id));
 
-    // Progress Polling
+    // Progress: initial fetch, then pushed over SSE while expanded
     const { data: progressData, mutate: mutateProgress } = useSWR(
         isExpanded ? `progress-${book.id}` : null,
-        () => api.getSynthesisProgress(book.id),
-        { refreshInterval: 3000 }
+        () => api.getSynthesisProgress(book.id)
     );
 
+    useEffect(() => {
+        if (!isExpanded) return;
+        const source = new EventSource(api.getProgressStreamUrl(book.id));
+        source.addEventListener("progress", (e) => {
+            mutateProgress(JSON.parse((e as MessageEvent).data), { revalidate: false });
+        });
+        return () => source.close();
+    }, [isExpanded, book.id, mutateProgress]);
+
     const isSynthesizing = progressData?.status === "synthesizing";
 
     const handleFullSynth = async (e: React.MouseEvent) => {
@@ -235,6 +243,12 @@ function BookItem({ book, isExpanded, onToggle, currentChapterId, onChapterClick
                                 <span>合成进度: {progressData.progress}%</span>
                                 {isSynthesizing && <Loader2 size={10} className="animate-spin text-book-accent" />}
                             </div>
+                            {isSynthesizing && progressData.throughput_per_min > 0 && (
+                                <div className="text-[10px] text-gray-400 mb-1">
+                                    {progressData.throughput_per_min} 段/分钟
+                                    {progressData.eta_seconds != null && ` · 剩余约 ${Math.ceil(progressData.eta_seconds / 60)} 分钟`}
+                                </div>
+                            )}
                             <div className="h-1 bg-gray-200 rounded-full overflow-hidden">
                                 <div
                                     className="h-full bg-book-accent transition-all duration-1000"
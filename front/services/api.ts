@@ -25,6 +25,18 @@ export interface Paragraph {
     sequence: number;
 }
 
+export interface SynthesisProgress {
+    status: string;
+    progress: number;
+    total_paragraphs: number;
+    pending: number;
+    processing: number;
+    completed: number;
+    failed: number;
+    throughput_per_min: number;
+    eta_seconds: number | null;
+}
+
 export interface Voice {
     id: string;
     name: string;
@@ -126,13 +138,7 @@ export const api = {
         return res.json();
     },
 
-    getSynthesisProgress: async (bookId: number): Promise<{
-        status: string;
-        progress: number;
-        total_paragraphs: number;
-        completed: number;
-        failed: number;
-    }> => {
+    getSynthesisProgress: async (bookId: number): Promise<SynthesisProgress> => {
         const res = await fetch(`${API_BASE}/books/${bookId}/progress`);
         if (!res.ok) throw new Error('Failed to fetch progress');
         return res.json();
@@ -153,6 +159,11 @@ export const api = {
         return res.json();
     },
 
+    // Server-Sent Events streams (use with EventSource instead of polling)
+    getProgressStreamUrl: (bookId: number) => `${API_BASE}/books/${bookId}/progress/stream`,
+
+    getExportStreamUrl: (bookId: number) => `${API_BASE}/books/${bookId}/export/stream`,
+
     getExportDownloadUrl: (bookId: number) => `${API_BASE}/books/${bookId}/export/download`,
 
     getBook: async (bookId: number): Promise<Book> => {
@@ -162,4 +173,8 @@ export const api = {
     },
 
     getAudioUrl: (bookId: number, paragraphId: number) => `${API_BASE}/audio/${bookId}/${paragraphId}`,
+
+    // Re-synthesizes the paragraph and streams the mp3 while it is generated (usable as <audio> src)
+    getParagraphStreamUrl: (bookId: number, paragraphId: number, voice: string = "zh-CN-XiaoxiaoNeural") =>
+        `${API_BASE}/books/${bookId}/paragraphs/${paragraphId}/stream?voice=${encodeURIComponent(voice)}`,
 };
@@ -0,0 +1,211 @@
+"""
+合成流水线压测
+使用模拟 TTS 引擎 (mock) 在合成书籍上运行 _synthesize_batch_async，
+统计不同并发上限下的吞吐 (段/秒)、引擎调用延迟 p50/p99、状态写库与进度统计开销。
+
+不联网，数据库与音频写入临时目录，不影响项目数据。
+
+使用示例:
+    python tests/bench_synthesis.py --paragraphs 10000 --concurrency 4,16,64
+    python tests/bench_synthesis.py --paragraphs 100000 --concurrency 64 --latency-ms 20 --failure-rate 0.01
+    python tests/bench_synthesis.py --concurrency 16,64 --fixed   # 关闭自适应并发，固定并发窗口
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 数据库与音频目录必须在导入 app 之前指定
+_BENCH_DIR = tempfile.mkdtemp(prefix="voicebook_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_BENCH_DIR}/bench.db"
+os.environ["AUDIO_DIR"] = os.path.join(_BENCH_DIR, "audio")
+os.environ["TTS_CACHE_ENABLED"] = "False"
+os.environ.setdefault("TTS_WORKER_ENABLED", "False")
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import crud
+from app.database import SessionLocal, init_db
+from app.services import tts
+from app.services.concurrency import AdaptiveLimiter
+from app.services.tts_providers.mock import MockTTSProvider
+
+# 合成文本用字
+_CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经"
+_PUNCTUATION = "，，，。！？"
+
+
+class TimedMockProvider(MockTTSProvider):
+    """记录每次引擎调用耗时（含进程级限流排队）的模拟引擎"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = []
+
+    async def generate_audio(self, text, voice, output_path):
+        start = time.perf_counter()
+        try:
+            return await super().generate_audio(text, voice, output_path)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def make_text(rng: random.Random, chars: int) -> str:
+    """生成约 chars 字的段落，每 8-20 字一个标点"""
+    parts = []
+    length = 0
+    while length < chars:
+        n = rng.randint(8, 20)
+        parts.append("".join(rng.choice(_CHARS) for _ in range(n)) + rng.choice(_PUNCTUATION))
+        length += n + 1
+    return "".join(parts)
+
+
+def create_book(db, paragraphs: int, chars: int, per_chapter: int, seed: int) -> int:
+    """创建合成书籍，返回书籍 ID"""
+    rng = random.Random(seed)
+    book = crud.create_book(db, f"压测书籍 {paragraphs} 段", "bench", "")
+    rows = []
+    chapter = None
+    for index in range(paragraphs):
+        if index % per_chapter == 0:
+            chapter = crud.create_chapter(db, book.id, index // per_chapter, f"第{index // per_chapter + 1}章")
+        rows.append({
+            'book_id': book.id,
+            'chapter_id': chapter.id,
+            'paragraph_index': index,
+            'content': make_text(rng, max(1, int(rng.gauss(chars, chars / 3)))),
+        })
+    crud.create_paragraphs_batch(db, rows)
+    return book.id
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_once(
+    book_id: int,
+    max_concurrent: int,
+    chunk_size: int,
+    provider: TimedMockProvider,
+    adaptive: bool
+) -> dict:
+    """按 tts_queue 的方式分批合成整本书，返回统计结果"""
+    db = SessionLocal()
+    try:
+        tasks = [
+            tts.ParagraphTask.from_paragraph(p)
+            for p in crud.get_book_paragraphs(db, book_id)
+        ]
+        limiter = AdaptiveLimiter(max_concurrent, adaptive=adaptive)
+        totals = {'completed': 0, 'failed': 0, 'flush_count': 0, 'rows_written': 0, 'flush_seconds': 0.0}
+        progress_seconds = 0.0
+
+        start = time.perf_counter()
+        for i in range(0, len(tasks), chunk_size):
+            result = await tts._synthesize_batch_async(
+                tasks[i:i + chunk_size], "mock", max_concurrent, provider=provider, limiter=limiter
+            )
+            totals['completed'] += result['completed']
+            totals['failed'] += result['failed']
+            for key in ('flush_count', 'rows_written', 'flush_seconds'):
+                totals[key] += result['db'][key]
+
+            # 进度统计（与 tts_queue 每批结束后的调用一致）
+            progress_start = time.perf_counter()
+            crud.update_book_tts_progress(db, book_id)
+            progress_seconds += time.perf_counter() - progress_start
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+
+    latencies = [s * 1000 for s in provider.latencies]
+    return {
+        'concurrency': max_concurrent,
+        'paragraphs': len(tasks),
+        'seconds': elapsed,
+        'throughput': len(tasks) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 0.50),
+        'p99_ms': _percentile(latencies, 0.99),
+        'mean_ms': statistics.fmean(latencies) if latencies else 0.0,
+        'final_concurrency': limiter.limit,
+        'progress_seconds': progress_seconds,
+        **totals,
+    }
+
+
+def print_report(rows):
+    header = (
+        f"{'并发':>6} {'段落':>8} {'耗时s':>8} {'段/秒':>9} {'p50ms':>8} {'p99ms':>8} "
+        f"{'失败':>6} {'窗口':>6} {'写库批':>7} {'写库s':>8} {'写库%':>7} {'进度s':>7}"
+    )
+    print()
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        db_share = r['flush_seconds'] / r['seconds'] * 100 if r['seconds'] else 0.0
+        print(
+            f"{r['concurrency']:>6} {r['paragraphs']:>8} {r['seconds']:>8.2f} {r['throughput']:>9.1f} "
+            f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['failed']:>6} {r['final_concurrency']:>6} "
+            f"{r['flush_count']:>7} {r['flush_seconds']:>8.3f} {db_share:>6.1f}% {r['progress_seconds']:>7.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成流水线压测（模拟 TTS 引擎）")
+    parser.add_argument("--paragraphs", type=int, default=10000, help="每本合成书籍的段落数")
+    parser.add_argument("--chars", type=int, default=60, help="段落平均字数")
+    parser.add_argument("--per-chapter", type=int, default=200, help="每章段落数")
+    parser.add_argument("--concurrency", default="4,16,64", help="逗号分隔的并发上限列表")
+    parser.add_argument("--chunk-size", type=int, default=0, help="每批段落数，默认与 tts_queue 一致")
+    parser.add_argument("--latency-ms", type=float, default=30, help="模拟引擎每次请求的固定延迟")
+    parser.add_argument("--latency-per-char-ms", type=float, default=1, help="模拟引擎每字合成耗时")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="延迟抖动 (±)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="随机失败比例")
+    parser.add_argument("--ms-per-char", type=int, default=5, help="每字音频时长（调小以减少磁盘占用）")
+    parser.add_argument("--fixed", action="store_true", help="关闭自适应并发，直接使用并发上限")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="保留临时数据库与音频目录")
+    args = parser.parse_args()
+
+    init_db()
+    print(f"[压测] 临时目录: {_BENCH_DIR}")
+    rows = []
+    try:
+        for max_concurrent in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                book_id = create_book(db, args.paragraphs, args.chars, args.per_chapter, args.seed)
+                print(f"[压测] 书籍 {book_id}: {args.paragraphs} 段，导入耗时 {time.perf_counter() - start:.2f}s")
+            finally:
+                db.close()
+
+            provider = TimedMockProvider(
+                latency_ms=args.latency_ms, latency_per_char_ms=args.latency_per_char_ms, jitter_ms=args.jitter_ms,
+                failure_rate=args.failure_rate, ms_per_char=args.ms_per_char, seed=args.seed
+            )
+            chunk_size = args.chunk_size or max(max_concurrent * 4, 50)
+            result = asyncio.run(run_once(book_id, max_concurrent, chunk_size, provider, not args.fixed))
+            print(f"[压测] 并发 {max_concurrent}: {result['throughput']:.1f} 段/秒")
+            rows.append(result)
+    finally:
+        if not args.keep:
+            shutil.rmtree(_BENCH_DIR, ignore_errors=True)
+
+    print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+测试共用的 TTS 引擎
+基于模拟引擎 (mock)：无延迟、不失败，每个字（含标点）对应一帧静音 MP3，并记录每次请求的文本
+"""
+from app.services.tts_providers.mock import MP3_FRAME_MS, SILENT_MP3_FRAME, MockTTSProvider
+
+__all__ = ["MP3_FRAME_MS", "SILENT_MP3_FRAME", "RecordingProvider"]
+
+
+class RecordingProvider(MockTTSProvider):
+    """
+    记录请求文本的模拟引擎
+
+    Args:
+        legacy: 按旧接口返回 (success, timings)，不带时长
+    """
+
+    def __init__(self, legacy: bool = False, **kwargs):
+        options = dict(
+            latency_ms=0, latency_per_char_ms=0, jitter_ms=0, failure_rate=0, ms_per_char=MP3_FRAME_MS, seed=1
+        )
+        options.update(kwargs)
+        super().__init__(**options)
+        self.legacy = legacy
+        self.texts = []
+
+    async def generate_audio(self, text, voice, output_path):
+        self.texts.append(text)
+        result = await super().generate_audio(text, voice, output_path)
+        if self.legacy:
+            return result.success, result.timings
+        return result
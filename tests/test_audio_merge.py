@@ -0,0 +1,142 @@
+"""
+音频合并测试
+测试 ffmpeg concat 列表文件（路径转义）、码流拷贝、重新编码回退、ffmpeg 失败回退 pydub，以及无 ffmpeg 时的 pydub 合并
+ffmpeg 通过 monkeypatch shutil.which / subprocess.run 模拟
+"""
+import subprocess
+import sys
+import wave
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.utils import audio
+from app.services.tts_providers.mock import SILENT_MP3_FRAME
+
+
+def _make_mp3(path: Path, frames: int = 10) -> str:
+    """24kHz 单声道 MP3（与 Edge TTS 输出规格一致）"""
+    path.write_bytes(SILENT_MP3_FRAME * frames)
+    return str(path)
+
+
+def _make_wav(path: Path, ms: int = 100) -> str:
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(24000)
+        w.writeframes(bytes(24 * ms * 2))
+    return str(path)
+
+
+class FakeFFmpeg:
+    """记录命令行与 concat 列表内容；fail_when(cmd) 为真时模拟 ffmpeg 报错"""
+
+    def __init__(self, fail_when=lambda cmd: False):
+        self.fail_when = fail_when
+        self.calls = []
+
+    def __call__(self, cmd, capture_output=False):
+        list_path = cmd[cmd.index("-i") + 1]
+        self.calls.append((cmd, Path(list_path).read_text(encoding="utf-8")))
+        if self.fail_when(cmd):
+            return subprocess.CompletedProcess(cmd, 1, b"", b"concat error")
+        Path(cmd[-1]).write_bytes(SILENT_MP3_FRAME * 20)
+        return subprocess.CompletedProcess(cmd, 0, b"", b"")
+
+
+def _use_ffmpeg(monkeypatch, fake: FakeFFmpeg):
+    monkeypatch.setattr(audio.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+    monkeypatch.setattr(audio.subprocess, "run", fake)
+
+
+def test_concat_list_escapes_quotes(tmp_path, monkeypatch):
+    """列表文件使用绝对路径，路径中的单引号按 concat 语法转义；列表文件用后删除"""
+    fake = FakeFFmpeg()
+    _use_ffmpeg(monkeypatch, fake)
+    paths = [_make_mp3(tmp_path / "a.mp3"), _make_mp3(tmp_path / "it's.mp3")]
+
+    assert audio.merge_audio(paths, str(tmp_path / "out.mp3"))
+
+    cmd, listing = fake.calls[0]
+    assert listing == f"file '{tmp_path / 'a.mp3'}'\nfile '{tmp_path}/it'\\''s.mp3'\n"
+    assert not Path(cmd[cmd.index("-i") + 1]).exists()
+
+
+def test_stream_copy(tmp_path, monkeypatch):
+    """输入均为目标规格的 MP3 时直接拷贝码流，不重新编码"""
+    fake = FakeFFmpeg()
+    _use_ffmpeg(monkeypatch, fake)
+    paths = [_make_mp3(tmp_path / f"{i}.mp3") for i in range(3)]
+
+    assert audio.merge_audio(paths, str(tmp_path / "out.mp3"), sample_rate=24000, channels=1)
+
+    assert len(fake.calls) == 1
+    cmd = fake.calls[0][0]
+    assert cmd[cmd.index("-c") + 1] == "copy"
+    assert "libmp3lame" not in cmd
+
+
+def test_reencode_when_format_differs(tmp_path, monkeypatch):
+    """采样率与目标不一致时直接重新编码"""
+    fake = FakeFFmpeg()
+    _use_ffmpeg(monkeypatch, fake)
+    paths = [_make_mp3(tmp_path / f"{i}.mp3") for i in range(2)]
+
+    assert audio.merge_audio(paths, str(tmp_path / "out.mp3"), sample_rate=16000)
+
+    cmd = fake.calls[0][0]
+    assert "copy" not in cmd
+    assert cmd[cmd.index("-ar") + 1] == "16000"
+    assert cmd[cmd.index("-c:a") + 1] == "libmp3lame"
+
+
+def test_stream_copy_failure_falls_back_to_reencode(tmp_path, monkeypatch):
+    """码流拷贝失败时回退为重新编码"""
+    fake = FakeFFmpeg(fail_when=lambda cmd: "copy" in cmd)
+    _use_ffmpeg(monkeypatch, fake)
+    paths = [_make_mp3(tmp_path / f"{i}.mp3") for i in range(2)]
+
+    assert audio.merge_audio(paths, str(tmp_path / "out.mp3"))
+
+    assert ["copy" in cmd for cmd, _ in fake.calls] == [True, False]
+    assert "libmp3lame" in fake.calls[1][0]
+
+
+def test_ffmpeg_failure_falls_back_to_pydub(tmp_path, monkeypatch):
+    """ffmpeg 两种方式都失败时回退为 pydub"""
+    fake = FakeFFmpeg(fail_when=lambda cmd: True)
+    _use_ffmpeg(monkeypatch, fake)
+    pydub_calls = []
+
+    def fake_pydub(paths, output_path, *args):
+        pydub_calls.append(paths)
+        Path(output_path).write_bytes(SILENT_MP3_FRAME * 20)
+        return True
+
+    monkeypatch.setattr(audio, "_merge_with_pydub", fake_pydub)
+    paths = [_make_mp3(tmp_path / f"{i}.mp3") for i in range(2)]
+
+    assert audio.merge_audio(paths, str(tmp_path / "out.mp3"))
+
+    assert len(fake.calls) == 2
+    assert pydub_calls == [paths]
+
+
+def test_pydub_without_ffmpeg(tmp_path, monkeypatch):
+    """没有 ffmpeg 时使用 pydub 合并；缺失的文件被跳过"""
+    monkeypatch.setattr(audio.shutil, "which", lambda name: None)
+
+    def no_ffmpeg(*args, **kwargs):
+        raise AssertionError("ffmpeg 不可用时不应调用")
+
+    monkeypatch.setattr(audio.subprocess, "run", no_ffmpeg)
+    paths = [_make_wav(tmp_path / "a.wav"), str(tmp_path / "missing.wav"), _make_wav(tmp_path / "b.wav")]
+    output = tmp_path / "out.wav"
+
+    assert audio.merge_audio(paths, str(output), output_format="wav", sample_rate=16000)
+
+    with wave.open(str(output), "rb") as w:
+        assert (w.getframerate(), w.getnchannels(), w.getsampwidth()) == (16000, 1, 2)
+        assert w.getnframes() == 16 * 200
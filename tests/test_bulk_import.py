@@ -0,0 +1,156 @@
+"""
+批量导入测试
+测试 Core 批量插入时内存中计算的统计与实际数据一致、单事务只提交一次，以及失败时整体回滚（使用内存数据库）
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.database import Base
+from app.services import decoder
+
+
+def _make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _chapters(count: int = 3, paragraphs: int = 4):
+    return [
+        {
+            'chapter_index': i + 1,
+            'title': f"第{i + 1}章",
+            'paragraphs': [
+                {'paragraph_index': j + 1, 'content': f"第{i + 1}章第{j + 1}段。" * (j + 1)}
+                for j in range(paragraphs)
+            ]
+        }
+        for i in range(count)
+    ]
+
+
+def test_bulk_import_stats():
+    """书籍/章节统计与状态计数在内存中计算，与按段落表统计的结果一致"""
+    db = _make_db()
+    commits = []
+    event.listen(db, "after_commit", lambda session: commits.append(1))
+
+    book_id = crud.bulk_import_book(db, "测试书", "测试", "test.txt", _chapters())
+
+    assert len(commits) == 1
+    book = crud.get_book(db, book_id)
+    paragraphs = crud.get_book_paragraphs(db, book_id)
+    assert (book.total_chapters, book.total_paragraphs) == (3, 12)
+    assert book.total_duration_ms == sum(p.estimated_duration_ms for p in paragraphs)
+    assert book.import_status == "completed"
+    assert {p.tts_status for p in paragraphs} == {"pending"}
+    assert all(p.char_count == len(p.content) for p in paragraphs)
+
+    chapters = crud.get_book_chapters(db, book_id)
+    assert [c.title for c in chapters] == ["第1章", "第2章", "第3章"]
+    assert [len(crud.get_chapter_paragraphs(db, c.id)) for c in chapters] == [4, 4, 4]
+    assert all(c.total_paragraphs == c.pending_paragraphs == 4 for c in chapters)
+    # 计数与段落表一致，无需校准
+    assert crud.reconcile_status_counters(db, book_id) == 0
+
+
+def test_bulk_insert_accumulates():
+    """分批插入时书籍统计逐批累加"""
+    db = _make_db()
+    book = crud.create_book(db, "测试书", "测试", "test.txt")
+    chapters = _chapters(count=4)
+
+    crud.bulk_insert_chapters(db, book.id, chapters[:1])
+    crud.bulk_insert_chapters(db, book.id, chapters[1:])
+    db.commit()
+
+    db.refresh(book)
+    assert (book.total_chapters, book.total_paragraphs, book.pending_paragraphs) == (4, 16, 16)
+    assert db.query(func.count(models.Paragraph.id)).scalar() == 16
+
+
+def test_bulk_import_rollback():
+    """插入失败时整体回滚，不留下书籍"""
+    db = _make_db()
+    chapters = _chapters()
+    chapters[-1]['paragraphs'][0]['content'] = None
+
+    with pytest.raises(Exception):
+        crud.bulk_import_book(db, "测试书", "测试", "test.txt", chapters)
+
+    assert db.query(models.Book).count() == 0
+    assert db.query(models.Chapter).count() == 0
+
+
+def test_decode_single_transaction(tmp_path, monkeypatch):
+    """IMPORT_BATCH_SIZE 为 0 时整本书一次提交"""
+    monkeypatch.setattr(decoder.settings, "IMPORT_BATCH_SIZE", 0)
+    monkeypatch.setattr(decoder.settings, "DECODE_CACHE_ENABLED", False)
+    path = tmp_path / "book.txt"
+    path.write_text("".join(f"第{i}章 标题{i}\n正文{i}，这是一段正文。\n\n" for i in range(1, 6)), encoding="utf-8")
+    db = _make_db()
+    commits = []
+    event.listen(db, "after_commit", lambda session: commits.append(1))
+
+    book_id, message = decoder.decode_ebook(db, str(path))
+
+    assert book_id, message
+    assert len(commits) == 1
+    book = crud.get_book(db, book_id)
+    assert (book.total_chapters, book.total_paragraphs, book.import_status) == (5, 5, "completed")
+
+
+def test_bulk_insert_without_returning(monkeypatch):
+    """方言不支持 executemany RETURNING 时逐行插入章节，段落仍归属正确的章节"""
+    db = _make_db()
+    monkeypatch.setattr(
+        db.get_bind().dialect, "insert_executemany_returning_sort_by_parameter_order", False
+    )
+
+    book_id = crud.bulk_import_book(db, "测试书", "测试", "test.txt", _chapters())
+
+    for chapter in crud.get_book_chapters(db, book_id):
+        contents = [p.content for p in crud.get_chapter_paragraphs(db, chapter.id)]
+        assert all(content.startswith(chapter.title) for content in contents)
+    assert crud.reconcile_status_counters(db, book_id) == 0
+
+
+def test_huge_chapter_split_into_batches(tmp_path, monkeypatch):
+    """单个超长章节在章节内按段落分批提交，续写到同一章节"""
+    monkeypatch.setattr(decoder.settings, "IMPORT_BATCH_SIZE", 4)
+    monkeypatch.setattr(decoder.settings, "DECODE_CACHE_ENABLED", False)
+
+    def huge_chapter(d):
+        yield "第一章", [f"第{i}段。" for i in range(10)]
+        yield "第二章", ["甲。", "乙。"]
+
+    monkeypatch.setattr(decoder, "iter_chapters", huge_chapter)
+    path = tmp_path / "book.txt"
+    path.write_text("占位", encoding="utf-8")
+    db = _make_db()
+    batch_sizes = []
+    event.listen(db, "before_commit", lambda session: batch_sizes.append(
+        session.query(func.count(models.Paragraph.id)).scalar()
+    ))
+
+    book_id, message = decoder.decode_ebook(db, str(path))
+
+    assert book_id, message
+    # 每次提交最多新增一批（4 条）段落
+    inserted = [b - a for a, b in zip([0] + batch_sizes, batch_sizes)]
+    assert max(inserted) <= 4 and sum(inserted) == 12
+    chapters = crud.get_book_chapters(db, book_id)
+    assert [(c.title, c.total_paragraphs, c.pending_paragraphs) for c in chapters] == \
+        [("第一章", 10, 10), ("第二章", 2, 2)]
+    paragraphs = crud.get_chapter_paragraphs(db, chapters[0].id)
+    assert [p.paragraph_index for p in paragraphs] == list(range(1, 11))
+    assert crud.get_book(db, book_id).total_paragraphs == 12
+    assert crud.reconcile_status_counters(db, book_id) == 0
@@ -0,0 +1,48 @@
+"""
+超长段落分片合成测试
+测试按句子拆分、片段并行合成后的音频拼接与时间戳平移
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services import tts
+from app.utils.audio import get_audio_duration
+from app.utils.text import split_into_chunks
+from tests.fakes import MP3_FRAME_MS as FRAME_MS, RecordingProvider
+
+
+def test_split_into_chunks():
+    """按句子边界拼成不超过上限的片段，超长单句在逗号处拆分"""
+    text = "第一句话。" * 6 + "很长的一句，" * 10 + "结束！"
+    chunks = split_into_chunks(text, 20)
+    assert "".join(chunks) == text
+    assert all(len(c) <= 20 for c in chunks)
+    assert chunks[0] == "第一句话。" * 4
+
+    assert split_into_chunks("短句。", 20) == ["短句。"]
+    assert split_into_chunks("One. Two. Three.", 9) == ["One. Two.", "Three."]
+
+
+def test_chunked_generation(tmp_path, monkeypatch):
+    """分片合成后拼接为一个文件，时间戳连续递增"""
+    monkeypatch.setattr(tts.settings, "TTS_CHUNK_CHARS", 10)
+    provider = RecordingProvider(latency_ms=10)
+    text = "这是一个句子。" * 6
+    output = str(tmp_path / "p.mp3")
+
+    success, timings = asyncio.run(tts._generate_audio(provider, text, "voice", output))
+
+    assert success
+    assert len(provider.texts) > 1
+    assert "".join(provider.texts) == text
+    assert get_audio_duration(output) == len(text) * FRAME_MS
+    # 每个字一个时间戳（标点只占停顿），后续片段按已拼接的时长平移
+    assert [t["offset"] for t in timings] == [
+        i * FRAME_MS * tts.TICKS_PER_MS for i, ch in enumerate(text) if ch != "。"
+    ]
+    # 临时片段已清理
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["p.mp3"]
@@ -0,0 +1,76 @@
+"""
+自适应并发控制测试
+测试 AIMD 加性增、乘性减与并发上限
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.concurrency import AdaptiveLimiter
+
+
+async def _run(limiter, success=True, latency=0.1, cost=100):
+    async with limiter.slot() as slot:
+        slot.record(success, latency, cost)
+
+
+def test_additive_increase():
+    """健康请求满一个窗口后并发加一，且不超过上限"""
+    limiter = AdaptiveLimiter(max_limit=6, initial=2, min_limit=1, adaptive=True)
+
+    async def main():
+        for _ in range(2):
+            await _run(limiter)
+        assert limiter.limit == 3
+        for _ in range(100):
+            await _run(limiter)
+        assert limiter.limit == 6
+
+    asyncio.run(main())
+
+
+def test_multiplicative_decrease_once_per_window():
+    """同一窗口内多次失败只减半一次；延迟骤增同样触发减半"""
+    limiter = AdaptiveLimiter(max_limit=20, initial=8, min_limit=1, adaptive=True)
+
+    async def main():
+        slots = []
+        for _ in range(3):
+            context = limiter.slot()
+            slots.append((context, await context.__aenter__()))
+        for context, slot in slots:
+            slot.record(False, 1.0, 100)
+            await context.__aexit__(None, None, None)
+        assert limiter.limit == 4
+
+        await _run(limiter, latency=0.1)
+        # 单字延迟超过基线 4 倍（如引擎内部重试退避）
+        await _run(limiter, latency=2.0)
+        assert limiter.limit == 2
+        assert limiter.stats()["decreases"] == 2
+
+    asyncio.run(main())
+
+
+def test_limit_bounds_in_flight():
+    """同时执行的请求数不超过当前窗口；关闭自适应时为固定并发"""
+    limiter = AdaptiveLimiter(max_limit=3, adaptive=False)
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        async with limiter.slot() as slot:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            slot.record(True, 0.01, 50)
+
+    async def main():
+        await asyncio.gather(*[work() for _ in range(10)])
+
+    asyncio.run(main())
+    assert peak == 3
+    assert limiter.limit == 3
+    assert limiter.in_flight == 0
@@ -0,0 +1,89 @@
+"""
+数据库引擎配置测试
+测试 SQLite 连接的 PRAGMA 设置、旧数据库的迁移与热点查询的索引
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app import models  # noqa: F401  注册模型
+from app.config import Settings
+from app.database import Base, create_db_engine
+from app.migrations import run_migrations
+
+
+def test_sqlite_pragmas(tmp_path):
+    """文件数据库的每个连接都启用 WAL、busy_timeout 等设置"""
+    config = Settings()
+    config.SQLITE_BUSY_TIMEOUT_MS = 1234
+    config.SQLITE_CACHE_SIZE_KB = 2048
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}", config)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        # NORMAL = 1
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -2048
+
+    assert engine.pool.size() == config.DB_POOL_SIZE
+    engine.dispose()
+
+
+def test_memory_database():
+    """内存数据库同样可以创建（测试常用）"""
+    engine = create_db_engine("sqlite://", Settings())
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_migration_adds_indexes(tmp_path):
+    """旧数据库（无复合索引、缺列）迁移后补齐索引和列，进度统计走覆盖索引"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'old.db'}", Settings())
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_paragraphs_book_status"))
+        conn.execute(text("DROP INDEX ix_chapters_book_order"))
+        conn.execute(text("ALTER TABLE books DROP COLUMN tts_voice"))
+
+    changes = run_migrations(engine, Base.metadata)
+    assert "paragraphs.ix_paragraphs_book_status" in changes
+    assert "chapters.ix_chapters_book_order" in changes
+    assert "books.tts_voice" in changes
+
+    inspector = inspect(engine)
+    assert "ix_paragraphs_book_status" in {i["name"] for i in inspector.get_indexes("paragraphs")}
+    assert "tts_voice" in {c["name"] for c in inspector.get_columns("books")}
+
+    with engine.connect() as conn:
+        plan = " ".join(str(row[-1]) for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT tts_status, count(id) FROM paragraphs "
+            "WHERE book_id = 1 GROUP BY tts_status"
+        )))
+    assert "COVERING INDEX ix_paragraphs_book_status" in plan
+
+    # 再次执行不应有变更
+    assert run_migrations(engine, Base.metadata) == []
+    engine.dispose()
+
+
+def test_job_claim_uses_index():
+    """worker 领取任务的查询（按优先级、id 排序）使用 (status, id) 索引"""
+    from app import crud
+
+    engine = create_db_engine("sqlite://", Settings())
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    query = db.query(models.TTSJob.id).filter(
+        models.TTSJob.status == "queued"
+    ).order_by(crud._job_priority_order(), models.TTSJob.id).limit(1)
+    sql = str(query.statement.compile(engine, compile_kwargs={"literal_binds": True}))
+
+    with engine.connect() as conn:
+        plan = " ".join(str(row[-1]) for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert "ix_tts_jobs_status_id" in plan
@@ -0,0 +1,171 @@
+"""
+解码缓存测试
+测试缓存 key、逐章写入与读取、未完整导入时不生效，以及重复导入同一文件时跳过解码
+"""
+import gzip
+import sys
+from pathlib import Path
+from types import ModuleType
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.database import Base
+from app.services import decoder
+from app.services import decode_cache
+from app.services.decode_cache import DecodeCache, hash_file, source_fingerprint
+
+CHAPTERS = [("第一章", ["甲。", "乙。"]), ("第二章", ["丙。"])]
+
+
+def _make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_cache_key(tmp_path):
+    """相同内容的文件得到相同哈希；解码器版本或解析选项不同则 key 不同"""
+    a, b = tmp_path / "a.txt", tmp_path / "b.txt"
+    a.write_text("内容", encoding="utf-8")
+    b.write_text("内容", encoding="utf-8")
+    assert hash_file(str(a)) == hash_file(str(b))
+
+    key = DecodeCache.make_key(hash_file(str(a)), ".txt@0.3.0", {'smart': False})
+    assert key == DecodeCache.make_key(hash_file(str(b)), ".txt@0.3.0", {'smart': False})
+    assert key != DecodeCache.make_key(hash_file(str(a)), ".txt@0.4.0", {'smart': False})
+    assert key != DecodeCache.make_key(hash_file(str(a)), ".txt@0.3.0", {'smart': True})
+
+
+def test_schema_version_miss(tmp_path, monkeypatch):
+    """缓存内容版本变化后旧条目不再命中"""
+    cache = DecodeCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    key = cache.make_key("hash", ".txt@0.3.0", {})
+    list(cache.record(key, {'title': "", 'author': ""}, iter(CHAPTERS)))
+
+    monkeypatch.setattr(decode_cache, "CACHE_SCHEMA_VERSION", decode_cache.CACHE_SCHEMA_VERSION + 1)
+    assert cache.make_key("hash", ".txt@0.3.0", {}) != key
+    assert cache.load(cache.make_key("hash", ".txt@0.3.0", {})) is None
+
+
+def test_source_fingerprint(tmp_path):
+    """解码源码改动后指纹变化（包按目录下全部 .py 计算）"""
+    def load(path: Path) -> ModuleType:
+        module = ModuleType(path.stem)
+        module.__file__ = str(path)
+        return module
+
+    package = tmp_path / "pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("", encoding="utf-8")
+    (package / "parser.py").write_text("SPLIT = 1\n", encoding="utf-8")
+    single = tmp_path / "single.py"
+    single.write_text("X = 1\n", encoding="utf-8")
+
+    before = source_fingerprint(load(package / "__init__.py"), load(single))
+    assert before == source_fingerprint(load(package / "__init__.py"), load(single))
+    (package / "parser.py").write_text("SPLIT = 2\n", encoding="utf-8")
+    assert source_fingerprint(load(package / "__init__.py"), load(single)) != before
+
+
+def test_record_and_load(tmp_path):
+    """完整迭代后写入缓存，可逐章读回"""
+    cache = DecodeCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    key = cache.make_key("hash", ".txt@0.3.0", {})
+    assert cache.load(key) is None
+
+    assert list(cache.record(key, {'title': "书", 'author': ""}, iter(CHAPTERS))) == CHAPTERS
+
+    meta, chapters = cache.load(key)
+    assert meta == {'title': "书", 'author': ""}
+    assert list(chapters) == CHAPTERS
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    # 重启后从目录重建索引
+    assert DecodeCache(str(tmp_path / "cache"), max_bytes=1024 * 1024).stats()["entries"] == 1
+
+
+def test_incomplete_not_cached(tmp_path):
+    """提前关闭或解码出错时不写入缓存，也不留下临时文件"""
+    cache = DecodeCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    key = cache.make_key("hash", ".txt@0.3.0", {})
+
+    recording = cache.record(key, {'title': "", 'author': ""}, iter(CHAPTERS))
+    next(recording)
+    recording.close()
+
+    def broken():
+        yield CHAPTERS[0]
+        raise ValueError("坏页")
+
+    with pytest.raises(ValueError):
+        list(cache.record(key, {'title': "", 'author': ""}, broken()))
+
+    assert cache.load(key) is None
+    assert list((tmp_path / "cache").glob("*/*")) == []
+
+
+def test_corrupted_entry(tmp_path):
+    """损坏的缓存条目视为未命中并被删除"""
+    cache = DecodeCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    key = cache.make_key("hash", ".txt@0.3.0", {})
+    list(cache.record(key, {'title': "", 'author': ""}, iter(CHAPTERS)))
+    cache._file(key).write_bytes(b"not gzip")
+
+    assert cache.load(key) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_reimport_from_cache(tmp_path, monkeypatch):
+    """同一内容换文件名重新导入时不再打开解码器，导入结果一致"""
+    cache = DecodeCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    monkeypatch.setattr(decoder, "get_decode_cache", lambda: cache)
+    monkeypatch.setattr(decoder.settings, "DECODE_CACHE_ENABLED", True)
+    content = "".join(f"第{i}章 标题{i}\n正文{i}，这是一段正文。\n\n" for i in range(1, 6))
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_text(content, encoding="utf-8")
+    second.write_text(content, encoding="utf-8")
+    db = _make_db()
+
+    first_id, _ = decoder.decode_ebook(db, str(first))
+    assert cache.stats()["entries"] == 1
+    # 缓存为紧凑的 gzip JSON Lines
+    with gzip.open(next((tmp_path / "cache").glob("*/*.jsonl.gz")), "rt", encoding="utf-8") as f:
+        assert len(f.readlines()) == 1 + 5
+
+    def no_decode(file_path):
+        raise AssertionError("缓存命中时不应打开解码器")
+
+    monkeypatch.setattr(decoder.DecoderFactory, "create", no_decode)
+    second_id, message = decoder.decode_ebook(db, str(second))
+
+    assert second_id and second_id != first_id, message
+    assert cache.stats()["hits"] == 1
+    book = crud.get_book(db, second_id)
+    assert book.title == "b"
+    assert [(c.title, c.total_paragraphs) for c in crud.get_book_chapters(db, second_id)] == \
+        [(c.title, c.total_paragraphs) for c in crud.get_book_chapters(db, first_id)]
+    assert [p.content for p in crud.get_book_paragraphs(db, second_id)] == \
+        [p.content for p in crud.get_book_paragraphs(db, first_id)]
+
+
+def test_decoder_change_misses(tmp_path, monkeypatch):
+    """解码源码指纹变化（未升 ebook_decoder 版本号）时重新解码，不使用旧缓存"""
+    cache = DecodeCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    monkeypatch.setattr(decoder, "get_decode_cache", lambda: cache)
+    monkeypatch.setattr(decoder.settings, "DECODE_CACHE_ENABLED", True)
+    path = tmp_path / "a.txt"
+    path.write_text("第1章 标题\n正文，这是一段正文。\n\n", encoding="utf-8")
+    db = _make_db()
+
+    decoder.decode_ebook(db, str(path))
+    monkeypatch.setattr(decoder, "source_fingerprint", lambda *modules: "changed")
+    book_id, message = decoder.decode_ebook(db, str(path))
+
+    assert book_id, message
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,66 @@
+"""
+事件总线测试
+测试跨线程发布、按主题订阅与吞吐统计
+"""
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.events import EventBus, ThroughputMeter, format_sse
+
+
+def test_publish_from_other_thread():
+    """其他线程发布的事件投递到订阅者所在的事件循环，其他主题收不到"""
+    bus = EventBus()
+
+    async def main():
+        with bus.subscribe("book:1") as sub, bus.subscribe("book:2") as other:
+            publisher = threading.Thread(
+                target=lambda: [bus.publish("book:1", "paragraph", paragraph_id=i) for i in range(3)]
+            )
+            publisher.start()
+            publisher.join()
+
+            received = []
+            while len(received) < 3:
+                received.extend(await sub.get_batch(timeout=1))
+            assert [e["paragraph_id"] for e in received] == [0, 1, 2]
+            assert await other.get_batch(timeout=0.05) == []
+        assert bus.subscriber_count("book:1") == 0
+
+    asyncio.run(main())
+
+
+def test_queue_overflow_drops_oldest():
+    """订阅者积压过多时丢弃最旧的事件"""
+    bus = EventBus()
+
+    async def main():
+        sub = bus.subscribe("t")
+        sub.queue = asyncio.Queue(maxsize=2)
+        for i in range(4):
+            bus.publish("t", "e", n=i)
+        await asyncio.sleep(0)
+        batch = await sub.get_batch(timeout=1)
+        assert [e["n"] for e in batch] == [2, 3]
+        assert sub.dropped == 2
+        sub.close()
+
+    asyncio.run(main())
+
+
+def test_throughput_and_format():
+    """吞吐量按段落/分钟计算，SSE 报文格式正确"""
+    meter = ThroughputMeter()
+    assert meter.rate_per_minute(1) == 0.0
+    meter.record(1, 10)
+    # 不足 5 秒按 5 秒计算
+    assert meter.rate_per_minute(1) == 120.0
+
+    text = format_sse({"type": "progress", "progress": 50})
+    assert text.startswith("event: progress\ndata: ")
+    assert text.endswith("\n\n")
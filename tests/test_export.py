@@ -4,17 +4,22 @@
 """
 import sys
 from pathlib import Path
+from types import SimpleNamespace
 
 # 添加项目根目录
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.database import SessionLocal, init_db
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, SessionLocal, init_db
 from app import crud
 from app.services.audiobook_exporter import (
     group_chapters_by_duration,
     generate_lrc,
     export_book,
     _split_to_sentences,
+    _group_fingerprint,
 )
 
 
@@ -71,8 +76,9 @@ def test_grouping():
         # 测试 LRC 生成
         if groups:
             print(f"\n📄 测试 LRC 生成 (第一个分组):")
+            paragraph_ids = [p.id for p in groups[0]['paragraphs']]
             lrc = generate_lrc(
-                groups[0]['paragraphs'],
+                crud.get_paragraphs_for_lrc(db, paragraph_ids),
                 book_title=book.title,
                 author=book.author
             )
@@ -88,6 +94,75 @@ def test_grouping():
         db.close()
 
 
+def test_grouping_query_count():
+    """测试分组查询次数与章节数无关（无 N+1）"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    book = crud.create_book(db, title="测试书", author="测试", file_path="test.txt")
+    for c in range(30):
+        chapter = crud.create_chapter(db, book_id=book.id, chapter_index=c + 1, title=f"第{c + 1}章")
+        crud.create_paragraphs_batch(db, [
+            {'book_id': book.id, 'chapter_id': chapter.id, 'paragraph_index': i + 1,
+             # 每分钟 300 字，1500 字约 5 分钟
+             'content': f"段落{i}。" + "字" * 1496}
+            for i in range(2)
+        ])
+
+    book_id = book.id
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    groups = group_chapters_by_duration(db, book_id)
+
+    # 章节一次 + 段落投影一次
+    assert len(statements) == 2
+    assert sum(len(g['paragraphs']) for g in groups) == 60
+    # 每组不少于 25 分钟（最后一组并入上一组）
+    assert all(g['total_duration_ms'] >= 25 * 60 * 1000 for g in groups)
+
+    # LRC 按分组加载正文，顺序与分组一致
+    paragraph_ids = [p.id for p in groups[0]['paragraphs']]
+    rows = crud.get_paragraphs_for_lrc(db, paragraph_ids, chunk_size=4)
+    assert [r.id for r in rows] == paragraph_ids
+    assert rows[0].content.startswith("段落0。")
+    assert generate_lrc(rows, book_title="测试书").startswith("[ti:测试书]")
+
+
+def test_group_fingerprint(tmp_path):
+    """测试增量导出指纹：输入不变时稳定，音频文件、LRC 文本/时间戳或元数据变化时改变"""
+    audio = tmp_path / "p_1.mp3"
+    audio.write_bytes(b"\xff" * 100)
+    book = SimpleNamespace(title="测试书", author="作者")
+    paragraph = SimpleNamespace(
+        id=1, audio_path=str(audio), audio_duration_ms=1000,
+        estimated_duration_ms=900, char_count=10
+    )
+    lrc_row = SimpleNamespace(id=1, content="第一段。", sentence_timings=None)
+    group = {'paragraphs': [paragraph]}
+
+    fingerprint, _ = _group_fingerprint(group, book, [lrc_row])
+    assert fingerprint == _group_fingerprint(group, book, [lrc_row])[0]
+
+    # 重新合成后文件大小变化
+    audio.write_bytes(b"\xff" * 200)
+    changed, _ = _group_fingerprint(group, book, [lrc_row])
+    assert changed != fingerprint
+
+    # 音频不变，只修改正文或补写句子时间戳
+    lrc_row.content = "第一段（修订）。"
+    edited, _ = _group_fingerprint(group, book, [lrc_row])
+    assert edited != changed
+    lrc_row.sentence_timings = '[{"text": "第一段（修订）。", "start_ms": 0, "end_ms": 1000}]'
+    timed, _ = _group_fingerprint(group, book, [lrc_row])
+    assert timed != edited
+
+    # 书名变化会影响 LRC 元数据
+    book.title = "新书名"
+    assert _group_fingerprint(group, book, [lrc_row])[0] != timed
+
+
 def test_export():
     """测试完整导出"""
     print("\n" + "=" * 50)
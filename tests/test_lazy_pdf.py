@@ -0,0 +1,197 @@
+"""
+大 PDF 延迟解码测试
+测试按书签划分章节、导入时不解码页面、按需解码与按章节顺序解码，以及后台预取完成后的结果与完整解码一致
+"""
+import sys
+import time
+from pathlib import Path
+
+import fitz
+import pytest
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.database import Base
+from app.services import decoder, lazy_import
+
+PAGES = 12
+
+
+@pytest.fixture
+def Session(tmp_path, monkeypatch):
+    """文件数据库（预取线程使用独立会话），页数达到 10 页即延迟解码"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(lazy_import, "SessionLocal", factory)
+    monkeypatch.setattr(lazy_import.settings, "LAZY_PDF_MIN_PAGES", 10)
+    monkeypatch.setattr(lazy_import.settings, "LAZY_PREFETCH_ENABLED", False)
+    monkeypatch.setattr(decoder.settings, "DECODE_CACHE_ENABLED", False)
+    return factory
+
+
+def _make_pdf(path: Path, toc=None) -> str:
+    doc = fitz.open()
+    for i in range(PAGES):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1} first paragraph.\n\nSecond paragraph of page {i + 1}.")
+    if toc:
+        doc.set_toc(toc)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_plan_chapters():
+    """一级书签为章节起点，书签前的页面单独成章；无书签时按固定页数分章"""
+    outline = [(1, "第一章", 2), (2, "第一节", 3), (1, "重复", 2), (1, "第二章", 6)]
+    assert lazy_import.plan_chapters(10, outline, 4) == [
+        ("第 1-2 页", 0, 2), ("第一章", 2, 6), ("第二章", 6, 10)
+    ]
+    assert lazy_import.plan_chapters(10, [], 4) == [
+        ("第 1-4 页", 0, 4), ("第 5-8 页", 4, 8), ("第 9-10 页", 8, 10)
+    ]
+
+
+def test_lazy_import_and_on_demand(tmp_path, Session):
+    """导入只写章节与页码范围；首次访问章节时解码，合成按章节顺序解码"""
+    path = _make_pdf(tmp_path / "book.pdf", toc=[[1, "第一章", 1], [1, "第二章", 5], [1, "第三章", 9]])
+    db = Session()
+
+    book_id, message = decoder.decode_ebook(db, path)
+
+    assert book_id, message
+    book = crud.get_book(db, book_id)
+    assert (book.import_status, book.total_chapters, book.total_paragraphs) == ("importing", 3, 0)
+    chapters = crud.get_book_chapters(db, book_id)
+    assert [(c.title, c.page_start, c.page_end, c.decode_status) for c in chapters] == [
+        ("第一章", 0, 4, "pending"), ("第二章", 4, 8, "pending"), ("第三章", 8, 12, "pending")
+    ]
+
+    # 首次访问第二章
+    assert lazy_import.ensure_chapter_decoded(db, chapters[1])
+    paragraphs = crud.get_chapter_paragraphs(db, chapters[1].id)
+    assert paragraphs[0].content.startswith("Page 5 first paragraph.")
+    assert [p.paragraph_index for p in paragraphs] == list(range(1, len(paragraphs) + 1))
+    db.expire_all()
+    assert chapters[1].total_paragraphs == chapters[1].pending_paragraphs == len(paragraphs)
+    assert crud.get_book(db, book_id).pending_paragraphs == len(paragraphs)
+
+    # 合成按章节顺序解码剩余章节
+    assert lazy_import.decode_next_chapter(book_id)
+    db.expire_all()
+    assert [c.decode_status for c in chapters] == ["decoded", "decoded", "pending"]
+    assert lazy_import.decode_next_chapter(book_id)
+    assert not lazy_import.decode_next_chapter(book_id)
+
+    db.expire_all()
+    book = crud.get_book(db, book_id)
+    assert book.import_status == "completed"
+    assert book.total_paragraphs == len(crud.get_book_paragraphs(db, book_id))
+    assert crud.reconcile_status_counters(db, book_id) == 0
+
+
+def test_prefetch_matches_full_decode(tmp_path, Session, monkeypatch):
+    """后台预取解码全部章节，段落内容与完整解码一致"""
+    path = _make_pdf(tmp_path / "book.pdf")
+    monkeypatch.setattr(lazy_import.settings, "LAZY_PDF_PAGES_PER_CHAPTER", 5)
+    db = Session()
+
+    monkeypatch.setattr(lazy_import.settings, "LAZY_PDF_MIN_PAGES", 0)
+    full_id, _ = decoder.decode_ebook(db, path)
+    monkeypatch.setattr(lazy_import.settings, "LAZY_PDF_MIN_PAGES", 10)
+    lazy_id, _ = decoder.decode_ebook(db, path)
+    assert [c.title for c in crud.get_book_chapters(db, lazy_id)] == ["第 1-5 页", "第 6-10 页", "第 11-12 页"]
+
+    prefetcher = lazy_import.LazyPrefetcher()
+    prefetcher.submit(lazy_id)
+    for _ in range(100):
+        db.expire_all()
+        if crud.get_book(db, lazy_id).import_status == "completed":
+            break
+        time.sleep(0.05)
+    prefetcher.stop()
+
+    assert crud.get_book(db, lazy_id).import_status == "completed"
+    assert [p.content for p in crud.get_book_paragraphs(db, lazy_id)] == \
+        [p.content for p in crud.get_book_paragraphs(db, full_id)]
+
+
+def _timeline(db, book_id):
+    return [(p.start_time_ms, p.end_time_ms) for p in crud.get_book_paragraphs(db, book_id)]
+
+
+def test_timeline_continues_across_chapters(tmp_path, Session, monkeypatch):
+    """乱序解码章节后，段落时间轴与完整解码一致（每章接着前一章的结束时间）"""
+    path = _make_pdf(tmp_path / "book.pdf", toc=[[1, "第一章", 1], [1, "第二章", 5], [1, "第三章", 9]])
+    db = Session()
+
+    monkeypatch.setattr(lazy_import.settings, "LAZY_PDF_MIN_PAGES", 0)
+    full_id, _ = decoder.decode_ebook(db, path)
+    monkeypatch.setattr(lazy_import.settings, "LAZY_PDF_MIN_PAGES", 10)
+    lazy_id, _ = decoder.decode_ebook(db, path)
+    chapters = crud.get_book_chapters(db, lazy_id)
+
+    for chapter in (chapters[2], chapters[0], chapters[1]):
+        assert lazy_import.ensure_chapter_decoded(db, chapter)
+
+    db.expire_all()
+    timeline = _timeline(db, lazy_id)
+    assert timeline[0][0] == 0
+    assert all(end == start for (_, end), (start, _) in zip(timeline, timeline[1:]))
+    assert timeline == _timeline(db, full_id)
+
+
+def test_failed_chapter_finishes_import(tmp_path, Session, monkeypatch):
+    """章节解码失败时标记为 failed，其余章节解码后书籍导入结束（failed）；重试成功后变为 completed"""
+    path = _make_pdf(tmp_path / "book.pdf", toc=[[1, "第一章", 1], [1, "第二章", 5], [1, "第三章", 9]])
+    db = Session()
+    book_id, _ = decoder.decode_ebook(db, path)
+    chapters = crud.get_book_chapters(db, book_id)
+    decode_pages = lazy_import._decode_pages
+
+    def broken_decode_pages(decoder, start, end):
+        if start == chapters[1].page_start:
+            raise RuntimeError("页面损坏")
+        return decode_pages(decoder, start, end)
+
+    monkeypatch.setattr(lazy_import, "_decode_pages", broken_decode_pages)
+    while lazy_import.decode_next_chapter(book_id):
+        pass
+    assert not lazy_import.ensure_chapter_decoded(db, chapters[1])
+
+    db.expire_all()
+    assert [c.decode_status for c in chapters] == ["decoded", "failed", "decoded"]
+    assert crud.get_book(db, book_id).import_status == "failed"
+    assert lazy_import._chapter_locks == {}
+
+    # 访问时重试
+    monkeypatch.setattr(lazy_import, "_decode_pages", decode_pages)
+    assert lazy_import.ensure_chapter_decoded(db, chapters[1])
+    db.expire_all()
+    assert crud.get_book(db, book_id).import_status == "completed"
+    assert lazy_import._chapter_locks == {}
+
+
+def test_book_job_total_grows_with_decoded_chapters(tmp_path, Session):
+    """整书任务创建时只计入已解码段落，之后每解码一章累加 total；章节任务不受影响"""
+    path = _make_pdf(tmp_path / "book.pdf", toc=[[1, "第一章", 1], [1, "第二章", 5], [1, "第三章", 9]])
+    db = Session()
+    book_id, _ = decoder.decode_ebook(db, path)
+    chapters = crud.get_book_chapters(db, book_id)
+    assert lazy_import.ensure_chapter_decoded(db, chapters[0])
+
+    decoded = len(crud.get_pending_paragraphs(db, book_id))
+    book_job = crud.create_tts_job(db, book_id, scope="book", total=decoded)
+    chapter_job = crud.create_tts_job(db, book_id, scope="chapter", chapter_id=chapters[0].id, total=decoded)
+    while lazy_import.decode_next_chapter(book_id):
+        pass
+
+    db.expire_all()
+    assert book_job.total == len(crud.get_book_paragraphs(db, book_id)) > decoded
+    assert chapter_job.total == decoded
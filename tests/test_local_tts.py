@@ -0,0 +1,69 @@
+"""
+本地离线 TTS 测试
+用假的 Piper 模型测试工作进程内的逐句合成、时间戳与 MP3 编码，以及语音到模型的解析
+"""
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.tts_providers import local
+from app.utils.audio import get_audio_duration
+
+SAMPLE_RATE = 16000
+
+
+class FakeChunk:
+    def __init__(self, audio: bytes):
+        self.audio_int16_bytes = audio
+
+
+class FakeConfig:
+    sample_rate = SAMPLE_RATE
+
+
+class FakeVoice:
+    """模拟 piper-tts 1.3：每个字 100ms 静音"""
+
+    config = FakeConfig()
+
+    def synthesize(self, text):
+        yield FakeChunk(bytes(2 * SAMPLE_RATE // 10 * len(text)))
+
+    def synthesize_wav(self, text, wav_file):
+        raise NotImplementedError
+
+
+def test_resolve_model(tmp_path, monkeypatch):
+    """本地模型按文件名识别；非本地语音回退到默认语音或第一个模型"""
+    for name in ("zh_CN-b", "zh_CN-a"):
+        (tmp_path / f"{name}.onnx").write_bytes(b"")
+    provider = local.LocalTTSProvider(str(tmp_path))
+
+    assert [v["id"] for v in provider.get_voices()] == ["zh_CN-a", "zh_CN-b"]
+    assert provider._resolve_model("zh_CN-b") == str(tmp_path / "zh_CN-b.onnx")
+    assert provider._resolve_model("zh-CN-XiaoxiaoNeural") == str(tmp_path / "zh_CN-a.onnx")
+
+    monkeypatch.setattr(local.settings, "TTS_LOCAL_DEFAULT_VOICE", "zh_CN-b")
+    assert provider._resolve_model("zh-CN-XiaoxiaoNeural") == str(tmp_path / "zh_CN-b.onnx")
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="需要 ffmpeg")
+def test_synthesize_in_worker(tmp_path, monkeypatch):
+    """逐句合成，句子之间插入静音，时间戳为句子级 100ns 单位"""
+    monkeypatch.setitem(local._worker_voices, "fake.onnx", FakeVoice())
+    output = str(tmp_path / "p.mp3")
+
+    timings, duration_ms = local._synthesize_in_worker("fake.onnx", "你好。再见！\n好的", output)
+
+    assert [t["text"] for t in timings] == ["你好。", "再见！", "好的"]
+    ms = local.TICKS_PER_SECOND // 1000
+    assert [t["offset"] // ms for t in timings] == [0, 500, 1000]
+    assert [t["duration"] // ms for t in timings] == [300, 300, 200]
+    # 编码后时长与 PCM 总长一致（允许 MP3 帧对齐误差），并由工作进程直接返回
+    assert abs(duration_ms - 1200) < 100
+    assert abs(get_audio_duration(output) - duration_ms) <= 1
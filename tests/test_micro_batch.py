@@ -0,0 +1,123 @@
+"""
+短段落合并请求 (micro-batching) 测试
+测试打包规则，以及合并音频按句子边界切分回各段落
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services import tts
+from app.utils.audio import get_audio_duration
+from app.utils.text import split_to_sentences
+from tests.fakes import MP3_FRAME_MS as FRAME_MS, RecordingProvider
+
+# 句子之间的停顿帧数
+GAP_FRAMES = 10
+
+
+class SentenceProvider(RecordingProvider):
+    """模拟 edge-tts 7.x：每个字一帧，句子之间有停顿，返回 SentenceBoundary 时间戳"""
+
+    def make_timings(self, text):
+        frames = 0
+        timings = []
+        for line in text.split("\n"):
+            for sentence in split_to_sentences(line):
+                timings.append({
+                    "text": sentence,
+                    "offset": frames * FRAME_MS * tts.TICKS_PER_MS,
+                    "duration": len(sentence) * FRAME_MS * tts.TICKS_PER_MS,
+                })
+                frames += len(sentence) + GAP_FRAMES
+        return timings, frames * FRAME_MS
+
+
+def _task(paragraph_id: int, content: str, chapter_id: int = 1) -> tts.ParagraphTask:
+    return tts.ParagraphTask(paragraph_id, 1, content, 0, chapter_id)
+
+
+def test_pack_micro_batches(monkeypatch):
+    """只打包同一章节内相邻的短段落"""
+    monkeypatch.setattr(tts.settings, "TTS_MICRO_BATCH_MAX_CHARS", 10)
+    monkeypatch.setattr(tts.settings, "TTS_MICRO_BATCH_MAX_PARAGRAPHS", 3)
+    tasks = [
+        _task(1, "第一章"), _task(2, "你好。"), _task(3, "这是一个比较长的段落，超过了短段落的字数。"),
+        _task(4, "好的！"), _task(5, "嗯。"), _task(6, "走吧。"), _task(7, "是。"),
+        _task(8, "第二章", chapter_id=2),
+    ]
+    groups = [[t.id for t in group] for group in tts._pack_micro_batches(tasks)]
+    assert groups == [[1, 2], [3], [4, 5, 6], [7], [8]]
+
+
+def test_packed_synthesis_split(tmp_path, monkeypatch):
+    """合并请求的音频按段落切分，各段落得到自己的音频、时长和时间戳"""
+    monkeypatch.setattr(tts, "AUDIO_DIR", tmp_path)
+    monkeypatch.setattr(tts.settings, "TTS_CACHE_ENABLED", False)
+    provider = SentenceProvider()
+    tasks = [_task(1, "第一章"), _task(2, "你好。再见。"), _task(3, "他说：好的！")]
+
+    results = asyncio.run(tts._synthesize_group(tasks, "voice", provider))
+
+    assert len(provider.texts) == 1
+    assert provider.texts[0] == "第一章。\n你好。再见。\n他说：好的！"
+    assert [r["tts_status"] for r in results] == ["completed"] * 3
+
+    first, second, third = results
+    # 每段从上一段结束后的停顿中点开始切分
+    assert first["audio_duration_ms"] == (4 + GAP_FRAMES // 2) * FRAME_MS
+    assert second["audio_duration_ms"] == (3 + 3 + GAP_FRAMES * 2) * FRAME_MS
+    assert get_audio_duration(third["audio_path"]) == third["audio_duration_ms"]
+
+    timings = json.loads(second["sentence_timings"])
+    assert [t["text"] for t in timings] == ["你好。", "再见。"]
+    assert timings[0]["offset"] == GAP_FRAMES // 2 * FRAME_MS * tts.TICKS_PER_MS
+    # 合并请求的临时文件已清理
+    assert sorted(p.name for p in (tmp_path / "book_1").iterdir()) == ["p_1.mp3", "p_2.mp3", "p_3.mp3"]
+
+
+class UnalignedProvider(SentenceProvider):
+    """合并请求不返回时间戳（无法切分），记录同时进行的请求数"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def make_timings(self, text):
+        timings, duration_ms = super().make_timings(text)
+        return ([] if "\n" in text else timings), duration_ms
+
+    async def generate_audio(self, text, voice, output_path):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return await super().generate_audio(text, voice, output_path)
+        finally:
+            self.in_flight -= 1
+
+
+def test_unaligned_fallback_keeps_slot(tmp_path, monkeypatch):
+    """无法切分时在本组的并发名额内依次逐段合成，缓存只查询一次"""
+    from app.services.concurrency import LimiterSlot
+    from app.services.tts_cache import AudioCache
+
+    monkeypatch.setattr(tts, "AUDIO_DIR", tmp_path)
+    monkeypatch.setattr(tts.settings, "TTS_CACHE_ENABLED", True)
+    cache = AudioCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+    monkeypatch.setattr(tts, "get_audio_cache", lambda: cache)
+    provider = UnalignedProvider()
+    tasks = [_task(1, "第一章"), _task(2, "你好。"), _task(3, "再见。")]
+    slot = LimiterSlot(0)
+
+    results = asyncio.run(tts._synthesize_group(tasks, "voice", provider, slot))
+
+    assert [r["tts_status"] for r in results] == ["completed"] * 3
+    assert provider.texts[1:] == ["第一章", "你好。", "再见。"]
+    assert provider.max_in_flight == 1
+    assert slot.sample is not None and slot.sample[0]
+    assert (cache.hits, cache.misses) == (0, 3)
@@ -0,0 +1,69 @@
+"""
+模拟 TTS 引擎测试
+测试生成的音频时长与时间戳一致、结果可复现，以及失败注入
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services import tts
+from app.services.tts_providers.mock import MockTTSProvider
+from app.utils.audio import get_audio_duration
+
+
+def _provider(**kwargs) -> MockTTSProvider:
+    options = dict(latency_ms=0, latency_per_char_ms=0, jitter_ms=0, failure_rate=0, ms_per_char=48, seed=1)
+    options.update(kwargs)
+    return MockTTSProvider(**options)
+
+
+def test_registered():
+    """通过工厂按名称获取"""
+    assert tts.TTSFactory.get_provider("mock").get_name() == "mock"
+
+
+def test_audio_and_timings(tmp_path):
+    """逐词时间戳（标点只占停顿），音频为时长一致的有效 MP3"""
+    provider = _provider()
+    output = str(tmp_path / "p.mp3")
+
+    success, timings = asyncio.run(provider.generate_audio("你好，Hello world!", "mock", output))
+
+    assert success
+    assert [t["text"] for t in timings] == ["你", "好", "Hello", "world"]
+    assert timings[2]["offset"] == 3 * 48 * tts.TICKS_PER_MS
+    assert timings[2]["duration"] == 5 * 48 * tts.TICKS_PER_MS
+    # 2 字 + 逗号 + 5 + 空格不计 + 5 + 叹号 = 14 个单位
+    assert get_audio_duration(output) == 14 * 48
+
+
+def test_wav_output(tmp_path):
+    """.wav 路径输出 WAV"""
+    output = tmp_path / "p.wav"
+    asyncio.run(_provider().generate_audio("你好", "mock", str(output)))
+    assert output.read_bytes()[:4] == b"RIFF"
+
+
+def test_deterministic_failures(tmp_path):
+    """同一种子下失败的段落相同；重试时重新抽样"""
+    texts = [f"第{i}段。" for i in range(200)]
+
+    async def run(provider):
+        results = await asyncio.gather(*[
+            provider.generate_audio(text, "mock", str(tmp_path / f"{i}.mp3"))
+            for i, text in enumerate(texts)
+        ])
+        return [ok for ok, _ in results]
+
+    first = asyncio.run(run(_provider(failure_rate=0.2)))
+    second = asyncio.run(run(_provider(failure_rate=0.2)))
+    assert first == second
+    assert 0 < first.count(False) < len(texts)
+
+    provider = _provider(failure_rate=0.2)
+    asyncio.run(run(provider))
+    retried = asyncio.run(run(provider))
+    assert retried != first
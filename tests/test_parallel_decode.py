@@ -0,0 +1,92 @@
+"""
+多进程解码测试
+测试多进程解码与单进程解码结果一致（页码顺序、标题、段落），以及分片按滑动窗口提交
+"""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import fitz
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ebook_decoder import DecoderFactory, iter_decoded_pages, parallel
+
+
+def _make_pdf(path: Path, pages: int):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1} first paragraph.\n\nSecond paragraph of page {i + 1}.")
+    doc.save(str(path))
+    doc.close()
+
+
+def _decode(path: Path, workers: int):
+    with DecoderFactory.create(str(path)) as decoder:
+        return [
+            (page_num, title, [p.content for p in paras])
+            for page_num, title, paras in iter_decoded_pages(decoder, workers=workers)
+        ]
+
+
+def test_parallel_pdf(tmp_path):
+    """PDF 多进程解码按页码顺序返回，内容与顺序解码一致"""
+    path = tmp_path / "book.pdf"
+    _make_pdf(path, 12)
+
+    serial = _decode(path, 1)
+    parallel = _decode(path, 2)
+
+    assert parallel == serial
+    assert [page for page, _, _ in parallel] == list(range(12))
+    assert parallel[5][2][0].startswith("Page 6 first paragraph.")
+
+
+def test_parallel_txt_titles(tmp_path):
+    """TXT 章节标题在工作进程中获取"""
+    path = tmp_path / "book.txt"
+    path.write_text(
+        "".join(f"第{i}章 标题{i}\n内容{i}，这是一段正文。\n\n" for i in range(1, 6)),
+        encoding="utf-8"
+    )
+
+    parallel = _decode(path, 2)
+
+    assert parallel == _decode(path, 1)
+    assert [title for _, title, _ in parallel] == [f"第{i}章 标题{i}" for i in range(1, 6)]
+
+
+class FakePool(ThreadPoolExecutor):
+    """代替 ProcessPoolExecutor 的单线程池，记录提交的分片数"""
+
+    submitted = 0
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None, initargs=()):
+        FakePool.submitted = 0
+        super().__init__(max_workers=1, initializer=initializer, initargs=initargs)
+
+    def submit(self, fn, *args, **kwargs):
+        FakePool.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_submission_window(tmp_path, monkeypatch):
+    """消费方未读取时最多提交 workers * 2 个分片，每取走一个分片补充一个"""
+    monkeypatch.setattr(parallel, "ProcessPoolExecutor", FakePool)
+    path = tmp_path / "book.txt"
+    path.write_text(
+        "".join(f"第{i}章 标题{i}\n内容{i}，这是一段正文。\n\n" for i in range(1, 41)),
+        encoding="utf-8"
+    )
+
+    with DecoderFactory.create(str(path)) as decoder:
+        pages = iter_decoded_pages(decoder, workers=2)
+        # 40 页、2 个进程：每个分片 5 页，共 8 个分片
+        assert next(pages)[0] == 0
+        assert FakePool.submitted == 5
+        rest = list(pages)
+
+    assert FakePool.submitted == 8
+    assert [page for page, _, _ in rest] == list(range(1, 40))
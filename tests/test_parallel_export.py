@@ -0,0 +1,159 @@
+"""
+并行导出测试
+测试分组任务的顺序执行与进程池并发（结果按分组顺序返回、乱序完成、子进程出错、进度回调），
+以及 EXPORT_WORKERS 与命令行 --workers 的传递
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.database import Base
+from app.services import audiobook_exporter
+
+
+def _tasks(tmp_path, count: int = 4):
+    return [
+        {
+            'folder': f"{i + 1:03d}",
+            'chapter_indices': [i + 1],
+            'duration_ms': 1000 * (i + 1),
+            'segment_dir': str(tmp_path / f"{i + 1:03d}"),
+            'mp3_path': str(tmp_path / f"{i + 1:03d}" / "out.mp3"),
+            'lrc_path': str(tmp_path / f"{i + 1:03d}" / "out.lrc"),
+            'lrc_content': "",
+            'audio_paths': [],
+        }
+        for i in range(count)
+    ]
+
+
+def _fake_export_group(task):
+    """后面的分组先完成；folder 为 002 的分组在子进程中出错"""
+    time.sleep(0.02 * (5 - task['chapter_indices'][0]))
+    if task['folder'] == "002":
+        raise RuntimeError("子进程崩溃")
+    result = audiobook_exporter._failed_group_result(task)
+    result.update(wav_generated=True, lrc_generated=True, wav_path=task['mp3_path'])
+    return result
+
+
+class FakePool(ThreadPoolExecutor):
+    """代替 ProcessPoolExecutor 的线程池（monkeypatch 的函数在线程中可见）"""
+
+    def __init__(self, max_workers=None, mp_context=None):
+        FakePool.max_workers = max_workers
+        super().__init__(max_workers=max_workers)
+
+
+def test_sequential(tmp_path, monkeypatch):
+    """workers=1 时在当前进程中按顺序执行，每个分组完成后回调进度"""
+    calls = []
+
+    def fake_export_group(task):
+        calls.append(task['folder'])
+        return dict(audiobook_exporter._failed_group_result(task), wav_generated=True)
+
+    monkeypatch.setattr(audiobook_exporter, "_export_group", fake_export_group)
+    progress = []
+
+    results = audiobook_exporter._run_group_tasks(
+        _tasks(tmp_path), 1, lambda done, total, result: progress.append((done, total, result['folder']))
+    )
+
+    assert calls == ["001", "002", "003", "004"]
+    assert [r['folder'] for r in results] == calls
+    assert progress == [(1, 4, "001"), (2, 4, "002"), (3, 4, "003"), (4, 4, "004")]
+
+
+def test_pool_results_in_order(tmp_path, monkeypatch):
+    """乱序完成时结果仍按分组顺序返回；子进程出错的分组记为失败；进度按完成顺序回调"""
+    monkeypatch.setattr(audiobook_exporter, "ProcessPoolExecutor", FakePool)
+    monkeypatch.setattr(audiobook_exporter, "_export_group", _fake_export_group)
+    tasks = _tasks(tmp_path)
+    progress = []
+
+    results = audiobook_exporter._run_group_tasks(
+        tasks, 8, lambda done, total, result: progress.append((done, total, result['folder']))
+    )
+
+    assert FakePool.max_workers == 4
+    assert [r['folder'] for r in results] == ["001", "002", "003", "004"]
+    assert [r['wav_generated'] for r in results] == [True, False, True, True]
+    assert results[1] == audiobook_exporter._failed_group_result(tasks[1])
+    assert [done for done, _, _ in progress] == [1, 2, 3, 4]
+    assert {total for _, total, _ in progress} == {4}
+    # 后面的分组先完成
+    assert [folder for _, _, folder in progress] == ["004", "003", "002", "001"]
+
+
+def test_spawn_pool(tmp_path):
+    """真实的 spawn 进程池：没有音频的分组在子进程中合并失败，按分组顺序返回"""
+    tasks = _tasks(tmp_path, count=2)
+
+    results = audiobook_exporter._run_group_tasks(tasks, 2)
+
+    assert [r['folder'] for r in results] == ["001", "002"]
+    assert [r['wav_generated'] for r in results] == [False, False]
+
+
+def _make_book():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    book = crud.create_book(db, title="测试书", author="测试", file_path="test.txt")
+    chapter = crud.create_chapter(db, book_id=book.id, chapter_index=1, title="第一章")
+    crud.create_paragraphs_batch(db, [
+        {'book_id': book.id, 'chapter_id': chapter.id, 'paragraph_index': 1, 'content': "段落。"}
+    ])
+    paragraph = crud.get_book_paragraphs(db, book.id)[0]
+    crud.update_paragraph_status(db, paragraph.id, "completed")
+    return db, book
+
+
+def test_export_workers_setting(tmp_path, monkeypatch):
+    """未指定 workers 时使用 EXPORT_WORKERS"""
+    db, book = _make_book()
+    monkeypatch.setattr(audiobook_exporter.settings, "EXPORT_WORKERS", 3)
+    seen = []
+
+    def fake_run(tasks, workers, on_progress=None):
+        seen.append(workers)
+        return [audiobook_exporter._failed_group_result(task) for task in tasks]
+
+    monkeypatch.setattr(audiobook_exporter, "_run_group_tasks", fake_run)
+
+    audiobook_exporter.export_book(db, book.id, str(tmp_path / "out"))
+    audiobook_exporter.export_book(db, book.id, str(tmp_path / "out"), workers=2)
+
+    assert seen == [3, 2]
+
+
+def test_cli_workers(monkeypatch):
+    """命令行 --workers 传递给 export_book，未指定时使用 EXPORT_WORKERS"""
+    import cli_export
+
+    db, book = _make_book()
+    monkeypatch.setattr(sys, "argv", ["cli_export.py", str(book.id), "-w", "3"])
+    assert cli_export.parse_args().workers == 3
+
+    seen = []
+
+    def fake_export_book(db, book_id, output_base_dir=None, workers=None, on_progress=None, force=False):
+        seen.append(workers)
+        return {'message': "", 'total_segments': 0}
+
+    monkeypatch.setattr(cli_export.audiobook_exporter, "export_book", fake_export_book)
+    monkeypatch.setattr(cli_export.get_settings(), "EXPORT_WORKERS", 5)
+
+    cli_export.export_with_progress(db, book.id, workers=3)
+    cli_export.export_with_progress(db, book.id)
+
+    assert seen == [3, 5]
@@ -0,0 +1,142 @@
+"""
+TTS 进程级限流测试
+测试令牌桶速率、并发上限、跨来源轮转公平性和优先级
+"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.tts_providers.rate_limit import (
+    PRIORITY_BOOK, PRIORITY_CHAPTER, PRIORITY_INTERACTIVE, RateLimiter, get_wait_seconds, rate_flow
+)
+
+
+def test_fair_across_flows():
+    """大任务排满队列时，新来源的单个请求在一轮之内放行"""
+    limiter = RateLimiter("test", max_in_flight=1)
+    order = []
+
+    async def request(flow: str, index: int):
+        with rate_flow(flow):
+            async with limiter.acquire():
+                order.append((flow, index))
+                await asyncio.sleep(0.001)
+
+    async def main():
+        book = [asyncio.create_task(request("job:1", i)) for i in range(20)]
+        await asyncio.sleep(0)
+        preview = asyncio.create_task(request("paragraph:7", 0))
+        await asyncio.gather(*book, preview)
+
+    asyncio.run(main())
+    assert len(order) == 21
+    assert order.index(("paragraph:7", 0)) <= 2
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_requests_per_second():
+    """请求速率不超过令牌桶速率，排队时间计入当前协程"""
+    limiter = RateLimiter("test", requests_per_second=50, burst_seconds=0.1)
+
+    async def one():
+        async with limiter.acquire():
+            pass
+        return get_wait_seconds()
+
+    async def main():
+        started = time.monotonic()
+        waits = await asyncio.gather(*[one() for _ in range(25)])
+        return time.monotonic() - started, waits
+
+    elapsed, waits = asyncio.run(main())
+    # 桶容量 5，其余 20 个按 50/s 放行，约 0.4s
+    assert elapsed >= 0.3
+    assert max(waits) >= 0.3
+    assert limiter.stats()["granted"] == 25
+
+
+def test_shared_across_threads():
+    """不同线程的事件循环共享同一个并发上限"""
+    limiter = RateLimiter("test", max_in_flight=2)
+    peak = [0]
+    lock = threading.Lock()
+
+    async def worker():
+        for _ in range(10):
+            async with limiter.acquire():
+                with lock:
+                    peak[0] = max(peak[0], limiter.in_flight)
+                await asyncio.sleep(0.002)
+
+    threads = [threading.Thread(target=asyncio.run, args=(worker(),)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    stats = limiter.stats()
+    assert peak[0] <= 2
+    assert stats["granted"] == 30
+    assert stats["in_flight"] == 0
+
+
+def test_interactive_reserved_slot():
+    """批量请求占满可用名额时，交互请求使用保留名额立即开始"""
+    limiter = RateLimiter("test", max_in_flight=3, reserved_slots=1)
+    release = None
+    started = []
+
+    async def bulk(index: int):
+        with rate_flow("job:1", PRIORITY_BOOK):
+            async with limiter.acquire():
+                started.append(("bulk", index))
+                await release.wait()
+
+    async def interactive():
+        with rate_flow("paragraph:9", PRIORITY_INTERACTIVE):
+            async with limiter.acquire():
+                started.append(("interactive", 0))
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(bulk(i)) for i in range(10)]
+        await asyncio.sleep(0.01)
+        assert limiter.in_flight == 2
+        await asyncio.wait_for(interactive(), timeout=1)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert started[2] == ("interactive", 0)
+
+
+def test_priority_lanes():
+    """名额空出时高优先级等待者先于低优先级放行"""
+    limiter = RateLimiter("test", max_in_flight=1)
+    order = []
+
+    async def request(flow: str, priority: int):
+        with rate_flow(flow, priority):
+            async with limiter.acquire():
+                order.append(priority)
+                await asyncio.sleep(0.001)
+
+    async def main():
+        tasks = [asyncio.create_task(request("job:1", PRIORITY_BOOK)) for _ in range(5)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(request("job:2", PRIORITY_CHAPTER)) for _ in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("paragraph:1", PRIORITY_INTERACTIVE)))
+        await asyncio.gather(*tasks)
+        return limiter.stats()
+
+    stats = asyncio.run(main())
+    # 第一个整书请求已先行放行，其后依次为交互、章节、整书
+    assert order == [PRIORITY_BOOK, PRIORITY_INTERACTIVE] + [PRIORITY_CHAPTER] * 3 + [PRIORITY_BOOK] * 4
+    assert stats["waiting"] == 0
@@ -0,0 +1,89 @@
+"""
+状态计数测试
+测试书籍/章节各状态段落数随状态变化同步更新，以及偏差校准（使用内存数据库）
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.database import Base
+
+
+def _make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _actual_counts(db, book_id):
+    rows = db.query(models.Paragraph.tts_status, func.count(models.Paragraph.id)).filter(
+        models.Paragraph.book_id == book_id
+    ).group_by(models.Paragraph.tts_status).all()
+    counts = {status: 0 for status in crud.STATUS_COUNTER_COLUMNS}
+    counts.update(dict(rows))
+    return counts
+
+
+def _book_counts(db, book_id):
+    db.expire_all()
+    return crud.get_status_counts(crud.get_book(db, book_id))
+
+
+def test_counters_follow_transitions():
+    """创建、合成、批量写回、重置、删除后计数与实际一致"""
+    db = _make_db()
+    book = crud.create_book(db, title="测试书", author="测试", file_path="test.txt")
+    book_id = book.id
+    chapters = [crud.create_chapter(db, book_id, i + 1, f"第{i + 1}章") for i in range(2)]
+    for chapter in chapters:
+        crud.create_paragraphs_batch(db, [
+            {'book_id': book_id, 'chapter_id': chapter.id, 'paragraph_index': i + 1, 'content': f"段落{i}。"}
+            for i in range(5)
+        ])
+    assert _book_counts(db, book_id)["pending"] == 10
+
+    paragraphs = crud.get_book_paragraphs(db, book_id)
+    ids = [p.id for p in paragraphs]
+    crud.update_paragraph_status(db, ids[0], "processing")
+    crud.update_paragraph_audio(db, ids[1], "a.mp3", 1000)
+    crud.bulk_update_paragraph_results(db, [
+        {'id': ids[2], 'tts_status': "completed", 'audio_path': "b.mp3"},
+        {'id': ids[3], 'tts_status': "failed", 'tts_error': "超时"},
+        {'id': ids[4], 'audio_duration_ms': 100},
+    ])
+    assert _book_counts(db, book_id) == _actual_counts(db, book_id)
+    assert _book_counts(db, book_id) == {"pending": 6, "processing": 1, "completed": 2, "failed": 1}
+
+    crud.reset_paragraphs_to_pending(db, book_id, ids[:4])
+    crud.update_paragraph(db, ids[5], "新内容。")
+    crud.delete_paragraph(db, ids[6])
+    assert _book_counts(db, book_id) == _actual_counts(db, book_id)
+
+    crud.delete_chapter(db, chapters[1].id)
+    assert _book_counts(db, book_id) == _actual_counts(db, book_id)
+    chapter = crud.get_chapter(db, chapters[0].id)
+    assert sum(crud.get_status_counts(chapter).values()) == 5
+
+
+def test_reconcile_fixes_drift():
+    """计数被破坏后校准恢复"""
+    db = _make_db()
+    book = crud.create_book(db, title="测试书", author="测试", file_path="test.txt")
+    book_id = book.id
+    chapter = crud.create_chapter(db, book_id, 1, "第一章")
+    crud.create_paragraphs_batch(db, [
+        {'book_id': book_id, 'chapter_id': chapter.id, 'paragraph_index': i + 1, 'content': "内容。"}
+        for i in range(3)
+    ])
+
+    db.query(models.Book).update({models.Book.pending_paragraphs: 99})
+    db.commit()
+    assert crud.reconcile_status_counters(db) == 1
+    assert _book_counts(db, book_id)["pending"] == 3
+    assert crud.reconcile_status_counters(db, book_id) == 0
@@ -0,0 +1,150 @@
+"""
+段落状态批量写回测试
+"""
+import asyncio
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import crud
+from app.database import Base
+from app.services.status_sink import StatusSink
+
+
+def _make_session_factory():
+    # 写回在线程池中执行，内存库需要跨线程共享同一连接
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def _make_book(db, count: int = 5):
+    book = crud.create_book(db, title="测试书", author="测试", file_path="test.txt")
+    chapter = crud.create_chapter(db, book_id=book.id, chapter_index=1)
+    crud.create_paragraphs_batch(db, [
+        {'book_id': book.id, 'chapter_id': chapter.id, 'paragraph_index': i + 1, 'content': f"段落{i}。"}
+        for i in range(count)
+    ])
+    return book, [p.id for p in crud.get_pending_paragraphs(db, book.id)]
+
+
+def _make_file_session_factory(path: Path):
+    # 文件库 + 极短的 busy timeout，外部连接持有写锁时写回立即报 database is locked
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 0.01})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def _lock_database(path: Path) -> sqlite3.Connection:
+    """用独立连接持有写锁，模拟其他进程长时间写库"""
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    conn.isolation_level = None
+    conn.execute("BEGIN IMMEDIATE")
+    return conn
+
+
+def _completed(pid: int) -> dict:
+    return dict(
+        tts_status="completed", tts_error=None,
+        audio_path=f"audio/p_{pid}.mp3", audio_duration_ms=1000, sentence_timings=None
+    )
+
+
+def test_sink_batches_and_merges():
+    """同一段落的多次提交合并为一行，按批次写回"""
+    Session = _make_session_factory()
+    db = Session()
+    book = crud.create_book(db, title="测试书", author="测试", file_path="test.txt")
+    chapter = crud.create_chapter(db, book_id=book.id, chapter_index=1)
+    crud.create_paragraphs_batch(db, [
+        {'book_id': book.id, 'chapter_id': chapter.id, 'paragraph_index': i + 1, 'content': f"段落{i}。"}
+        for i in range(5)
+    ])
+    ids = [p.id for p in crud.get_pending_paragraphs(db, book.id)]
+
+    async def run():
+        async with StatusSink(batch_size=3, flush_interval_ms=50, session_factory=Session) as sink:
+            for pid in ids:
+                sink.submit(pid, tts_status="processing", tts_error=None)
+            for pid in ids[:4]:
+                sink.submit(
+                    pid, tts_status="completed", tts_error=None,
+                    audio_path=f"audio/p_{pid}.mp3", audio_duration_ms=1000, sentence_timings=None
+                )
+            sink.submit(ids[4], tts_status="failed", tts_error="TTS 合成失败")
+        return sink
+
+    sink = asyncio.run(run())
+    assert sink.rows_written >= 5
+
+    db.expire_all()
+    statuses = {p.id: p for p in crud.get_book_paragraphs(db, book.id)}
+    for pid in ids[:4]:
+        assert statuses[pid].tts_status == "completed"
+        assert statuses[pid].audio_duration_ms == 1000
+    assert statuses[ids[4]].tts_status == "failed"
+    assert statuses[ids[4]].tts_error == "TTS 合成失败"
+
+
+def test_locked_database_rows_kept(tmp_path):
+    """数据库被锁时写回失败的行留在缓冲中，解锁后最终写入"""
+    Session = _make_file_session_factory(tmp_path / "test.db")
+    db = Session()
+    book, ids = _make_book(db)
+    lock = _lock_database(tmp_path / "test.db")
+    threading.Timer(1.0, lock.rollback).start()
+
+    async def run():
+        async with StatusSink(batch_size=100, flush_interval_ms=20, session_factory=Session) as sink:
+            for pid in ids:
+                sink.submit(pid, **_completed(pid))
+            # 第一次 flush 重试用尽后失败，锁释放后的 flush 写入
+            await asyncio.sleep(1.5)
+        return sink
+
+    sink = asyncio.run(run())
+    lock.close()
+
+    assert sink.failed_flushes >= 1
+    db.expire_all()
+    assert {p.tts_status for p in crud.get_book_paragraphs(db, book.id)} == {"completed"}
+    assert crud.reconcile_status_counters(db, book.id) == 0
+
+
+def test_locked_database_on_close_raises(tmp_path):
+    """关闭时数据库仍被锁则抛出异常，缓冲中的行不会被静默丢弃"""
+    Session = _make_file_session_factory(tmp_path / "test.db")
+    db = Session()
+    book, ids = _make_book(db)
+    lock = _lock_database(tmp_path / "test.db")
+    sink = StatusSink(batch_size=100, flush_interval_ms=20, session_factory=Session)
+
+    async def run():
+        await sink.start()
+        for pid in ids:
+            sink.submit(pid, **_completed(pid))
+        await sink.close()
+
+    try:
+        with pytest.raises(OperationalError):
+            asyncio.run(run())
+    finally:
+        lock.rollback()
+        lock.close()
+
+    assert sorted(sink._pending) == sorted(ids)
+    assert {p.tts_status for p in crud.get_book_paragraphs(db, book.id)} == {"pending"}
@@ -0,0 +1,109 @@
+"""
+流式试听测试
+测试 Provider 默认的流式实现、分片流式合成的时间戳平移，以及试听与合成任务的段落领取互斥
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import crud
+from app.database import Base
+from app.services import tts
+from tests.fakes import MP3_FRAME_MS as FRAME_MS, SILENT_MP3_FRAME as SILENT_FRAME, RecordingProvider
+
+
+async def _collect(tts_provider, text):
+    timings = []
+    data = b"".join([chunk async for chunk in tts._stream_generate(tts_provider, text, "voice", timings)])
+    return data, timings
+
+
+def test_default_stream_audio():
+    """未实现流式的引擎退化为生成完整文件后分块产出"""
+    provider = RecordingProvider()
+    data, timings = asyncio.run(_collect(provider, "你好。"))
+    assert data == SILENT_FRAME * 3
+    assert timings == provider.make_timings("你好。")[0]
+
+
+def test_chunked_stream_offsets(monkeypatch):
+    """超长文本分片依次流式合成，后续片段的时间戳按已产出音频的时长平移"""
+    monkeypatch.setattr(tts.settings, "TTS_CHUNK_CHARS", 6)
+    provider = RecordingProvider()
+    data, timings = asyncio.run(_collect(provider, "第一句话。第二句话。"))
+
+    assert provider.texts == ["第一句话。", "第二句话。"]
+    assert data == SILENT_FRAME * 10
+    assert "".join(t["text"] for t in timings) == "第一句话第二句话"
+    assert timings[4]["offset"] == 5 * FRAME_MS * tts.TICKS_PER_MS
+
+
+def _setup_db(tmp_path, monkeypatch, provider):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(tts, "SessionLocal", Session)
+    monkeypatch.setattr(tts, "_default_provider", provider)
+    monkeypatch.setattr(tts, "AUDIO_DIR", tmp_path)
+    monkeypatch.setattr(tts.settings, "TTS_CACHE_ENABLED", False)
+
+    db = Session()
+    book = crud.create_book(db, title="测试书", author="测试", file_path="test.txt")
+    chapter = crud.create_chapter(db, book_id=book.id, chapter_index=1, title="第一章")
+    crud.create_paragraphs_batch(db, [
+        {'book_id': book.id, 'chapter_id': chapter.id, 'paragraph_index': 1, 'content': "你好。"}
+    ])
+    paragraph = crud.get_chapter_paragraphs(db, chapter.id)[0]
+    return db, book, paragraph
+
+
+async def _drain(task):
+    return b"".join([chunk async for chunk in tts.stream_paragraph(task, "voice")])
+
+
+def test_stream_claims_paragraph(tmp_path, monkeypatch):
+    """试听先领取段落（pending → processing），完成后计数与段落表一致"""
+    provider = RecordingProvider()
+    db, book, paragraph = _setup_db(tmp_path, monkeypatch, provider)
+    task = tts.ParagraphTask.from_paragraph(paragraph)
+
+    data = asyncio.run(_drain(task))
+
+    assert data == SILENT_FRAME * 3
+    assert provider.texts == ["你好。"]
+    db.expire_all()
+    assert crud.get_paragraph(db, paragraph.id).tts_status == "completed"
+    assert crud.get_status_counts(crud.get_book(db, book.id)) == {
+        "pending": 0, "processing": 0, "completed": 1, "failed": 0
+    }
+    assert crud.reconcile_status_counters(db) == 0
+
+
+def test_stream_waits_for_running_job(tmp_path, monkeypatch):
+    """段落已被任务领取时试听不重复合成，等待任务完成后返回任务的音频"""
+    monkeypatch.setattr(tts, "_STREAM_POLL_SECONDS", 0.01)
+    provider = RecordingProvider()
+    db, book, paragraph = _setup_db(tmp_path, monkeypatch, provider)
+    job = crud.create_tts_job(db, book.id, total=1)
+    assert [p.id for p in crud.claim_job_paragraphs(db, job)] == [paragraph.id]
+    task = tts.ParagraphTask.from_paragraph(paragraph)
+    audio_path = tmp_path / "job.mp3"
+    audio_path.write_bytes(b"job-audio")
+
+    async def run():
+        stream = asyncio.create_task(_drain(task))
+        await asyncio.sleep(0.05)
+        # 试听仍在等待，段落保持被任务领取
+        assert not stream.done()
+        crud.update_paragraph_audio(db, paragraph.id, str(audio_path), 100, None)
+        return await asyncio.wait_for(stream, timeout=5)
+
+    assert asyncio.run(run()) == b"job-audio"
+    assert provider.texts == []
+    assert crud.reconcile_status_counters(db) == 0
@@ -0,0 +1,125 @@
+"""
+流式导入测试
+测试逐页切片与整本切片一致、分批写库后的统计、导入过程中已提交章节可查询，以及解码失败时的导入状态
+"""
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.database import Base
+from app.services import decoder
+from ebook_decoder import DecoderFactory
+
+
+@pytest.fixture(autouse=True)
+def _no_decode_cache(monkeypatch):
+    """关闭解码缓存，确保每次导入都实际解码"""
+    monkeypatch.setattr(decoder.settings, "DECODE_CACHE_ENABLED", False)
+
+
+def _make_session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def _make_txt(tmp_path, chapters: int = 6, paragraphs: int = 5) -> Path:
+    path = tmp_path / "book.txt"
+    path.write_text("".join(
+        f"第{i}章 标题{i}\n" + "".join(f"正文{i}-{j}，这是一段正文。\n\n" for j in range(paragraphs))
+        for i in range(1, chapters + 1)
+    ), encoding="utf-8")
+    return path
+
+
+def test_text_chunks_match_full_text(tmp_path):
+    """逐页切片与整本拼接后切片结果一致"""
+    path = _make_txt(tmp_path)
+    with DecoderFactory.create(str(path)) as d:
+        full = "".join("\n".join(paras) + "\n\n" for _, paras in decoder.iter_chapters(d))
+        chunks = list(decoder._iter_text_chunks(d, chunk_size=37))
+
+    assert chunks == [full[i:i + 37] for i in range(0, len(full), 37)]
+
+
+def test_decode_in_batches(tmp_path, monkeypatch):
+    """分批提交后书籍/章节统计与实际段落一致，时间轴连续"""
+    monkeypatch.setattr(decoder.settings, "IMPORT_BATCH_SIZE", 4)
+    monkeypatch.setattr(decoder.settings, "IMPORT_QUEUE_SIZE", 1)
+    db = _make_session_factory(tmp_path)()
+
+    book_id, message = decoder.decode_ebook(db, str(_make_txt(tmp_path)))
+
+    assert book_id, message
+    book = crud.get_book(db, book_id)
+    assert book.import_status == "completed"
+    assert book.total_chapters == 6
+    assert book.pending_paragraphs == book.total_paragraphs
+    chapters = crud.get_book_chapters(db, book_id)
+    assert [c.title for c in chapters] == [f"第{i}章 标题{i}" for i in range(1, 7)]
+    for chapter in chapters:
+        paragraphs = crud.get_chapter_paragraphs(db, chapter.id)
+        assert chapter.total_paragraphs == chapter.pending_paragraphs == len(paragraphs)
+        assert [p.paragraph_index for p in paragraphs] == sorted(p.paragraph_index for p in paragraphs)
+
+    paragraphs = crud.get_book_paragraphs(db, book_id)
+    assert book.total_duration_ms == sum(p.estimated_duration_ms for p in paragraphs)
+    assert all(a.end_time_ms == b.start_time_ms for a, b in zip(paragraphs, paragraphs[1:]))
+
+
+def test_chapters_visible_during_import(tmp_path, monkeypatch):
+    """导入尚未结束时，已提交的章节和段落即可被其他会话读取"""
+    monkeypatch.setattr(decoder.settings, "IMPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(decoder.settings, "IMPORT_QUEUE_SIZE", 1)
+    Session = _make_session_factory(tmp_path)
+    seen = []
+
+    def fake_chapters(d):
+        yield "第一章", ["甲。", "乙。"]
+        yield "第二章", ["丙。", "丁。"]
+        # 等待写库端提交第一章后，从另一个会话读取
+        reader = Session()
+        for _ in range(100):
+            book = reader.query(models.Book).first()
+            chapters = crud.get_book_chapters(reader, book.id)
+            if chapters:
+                seen.append((book.import_status, chapters[0].title, chapters[0].pending_paragraphs))
+                break
+            time.sleep(0.05)
+        reader.close()
+        yield "第三章", ["戊。"]
+
+    monkeypatch.setattr(decoder, "iter_chapters", fake_chapters)
+    db = Session()
+
+    book_id, _ = decoder.decode_ebook(db, str(_make_txt(tmp_path)))
+
+    assert seen == [("importing", "第一章", 2)]
+    book = crud.get_book(db, book_id)
+    assert (book.import_status, book.total_chapters, book.total_paragraphs) == ("completed", 3, 5)
+
+
+def test_decode_failure(tmp_path, monkeypatch):
+    """解码中途出错时返回失败，已写入的部分保留且书籍标记为 failed"""
+    monkeypatch.setattr(decoder.settings, "IMPORT_BATCH_SIZE", 1)
+
+    def broken_chapters(d):
+        yield "第一章", ["甲。"]
+        raise ValueError("坏页")
+
+    monkeypatch.setattr(decoder, "iter_chapters", broken_chapters)
+    db = _make_session_factory(tmp_path)()
+
+    book_id, message = decoder.decode_ebook(db, str(_make_txt(tmp_path)))
+
+    assert book_id is None and "坏页" in message
+    book = db.query(models.Book).one()
+    assert (book.import_status, book.total_chapters, book.total_paragraphs) == ("failed", 1, 1)
@@ -0,0 +1,121 @@
+"""
+TTS 音频缓存测试
+测试内容寻址、命中/未命中计数、LRU 淘汰和命中时的硬链接
+"""
+import os
+import sys
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services import tts_cache
+from app.services.tts_cache import AudioCache, unlink_shared
+
+
+def _make_audio(path: Path, size: int) -> str:
+    path.write_bytes(b"\xff" * size)
+    return str(path)
+
+
+def test_cache_key():
+    """相同文本/语音/引擎得到相同 key，任一不同则 key 不同"""
+    key = AudioCache.make_key("你好", "zh-CN-XiaoxiaoNeural", "edge")
+    assert key == AudioCache.make_key("你好", "zh-CN-XiaoxiaoNeural", "edge")
+    assert key != AudioCache.make_key("你好", "zh-CN-YunxiNeural", "edge")
+    assert key != AudioCache.make_key("你好", "zh-CN-XiaoxiaoNeural", "local")
+    assert key != AudioCache.make_key("你好。", "zh-CN-XiaoxiaoNeural", "edge")
+
+
+def test_put_and_fetch(tmp_path):
+    """写入后可以取回音频与时间戳"""
+    cache = AudioCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    src = _make_audio(tmp_path / "src.mp3", 100)
+    timings = [{"text": "你好", "offset": 0, "duration": 5000000}]
+
+    key = cache.make_key("你好", "xiaoxiao", "edge")
+    assert cache.fetch(key, str(tmp_path / "miss.mp3")) is None
+
+    cache.put(key, src, timings, 500)
+    dest = tmp_path / "dest.mp3"
+    entry = cache.fetch(key, str(dest))
+
+    assert entry is not None
+    assert entry["timings"] == timings
+    assert entry["duration_ms"] == 500
+    assert dest.read_bytes() == Path(src).read_bytes()
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_fetch_hard_link(tmp_path):
+    """命中时硬链接到目标路径而不复制；重新合成前断开链接，缓存条目不受影响"""
+    cache = AudioCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    key = cache.make_key("你好", "xiaoxiao", "edge")
+    cache.put(key, _make_audio(tmp_path / "src.mp3", 100))
+    cached = Path(cache.get(key)["audio_path"])
+
+    dest = tmp_path / "dest.mp3"
+    _make_audio(dest, 10)
+    assert cache.fetch(key, str(dest)) is not None
+    assert os.path.samefile(dest, cached)
+    assert cached.stat().st_nlink == 2
+    # 再次命中同一目标不出错，也不留下临时文件
+    assert cache.fetch(key, str(dest)) is not None
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["cache", "dest.mp3", "src.mp3"]
+
+    unlink_shared(str(dest))
+    assert not dest.exists()
+    assert cached.read_bytes() == b"\xff" * 100
+    # 未与缓存共享的文件保持不变
+    unlink_shared(str(tmp_path / "src.mp3"))
+    assert (tmp_path / "src.mp3").exists()
+
+
+def test_fetch_copy_fallback(tmp_path, monkeypatch):
+    """不支持硬链接时退回复制"""
+    def no_link(src, dst):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(tts_cache.os, "link", no_link)
+    cache = AudioCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    key = cache.make_key("你好", "xiaoxiao", "edge")
+    cache.put(key, _make_audio(tmp_path / "src.mp3", 100))
+
+    dest = tmp_path / "dest.mp3"
+    assert cache.fetch(key, str(dest)) is not None
+    assert dest.read_bytes() == b"\xff" * 100
+    assert not os.path.samefile(dest, cache.get(key)["audio_path"])
+
+
+def test_lru_eviction(tmp_path):
+    """超过容量时淘汰最久未使用的条目"""
+    cache = AudioCache(str(tmp_path / "cache"), max_bytes=2500)
+    keys = [cache.make_key(f"段落{i}", "xiaoxiao", "edge") for i in range(3)]
+
+    cache.put(keys[0], _make_audio(tmp_path / "a.mp3", 1000))
+    cache.put(keys[1], _make_audio(tmp_path / "b.mp3", 1000))
+    # 访问第一个，使第二个成为最久未使用
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], _make_audio(tmp_path / "c.mp3", 1000))
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_index_reload(tmp_path):
+    """重启后从磁盘重建索引"""
+    cache_dir = str(tmp_path / "cache")
+    cache = AudioCache(cache_dir, max_bytes=1024 * 1024)
+    key = cache.make_key("未完待续", "xiaoxiao", "edge")
+    cache.put(key, _make_audio(tmp_path / "a.mp3", 100), None, 300)
+
+    reloaded = AudioCache(cache_dir, max_bytes=1024 * 1024)
+    entry = reloaded.get(key)
+    assert entry is not None
+    assert entry["duration_ms"] == 300
@@ -0,0 +1,323 @@
+"""
+TTS 任务队列测试
+测试任务领取、租约续约与过期回收（使用内存数据库）
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.database import Base
+
+
+def _make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _make_book(db, paragraph_count=3):
+    book = crud.create_book(db, title="测试书", author="测试", file_path="test.txt")
+    chapter = crud.create_chapter(db, book_id=book.id, chapter_index=1, title="第一章")
+    crud.create_paragraphs_batch(db, [
+        {'book_id': book.id, 'chapter_id': chapter.id, 'paragraph_index': i + 1, 'content': f"段落{i}。"}
+        for i in range(paragraph_count)
+    ])
+    return book
+
+
+def test_claim_is_exclusive():
+    """同一任务只能被一个 worker 领取"""
+    db = _make_db()
+    book = _make_book(db)
+    job = crud.create_tts_job(db, book.id, total=3)
+
+    claimed = crud.claim_next_tts_job(db, "worker-a", lease_seconds=60)
+    assert claimed is not None and claimed.id == job.id
+    assert claimed.status == "running"
+    assert crud.claim_next_tts_job(db, "worker-b", lease_seconds=60) is None
+
+    assert crud.renew_tts_job_lease(db, job.id, "worker-a", 60) == "running"
+    assert crud.renew_tts_job_lease(db, job.id, "worker-b", 60) is None
+
+
+def test_reclaim_expired_lease():
+    """租约过期后任务重新入队，该任务领取的 processing 段落恢复为 pending"""
+    db = _make_db()
+    book = _make_book(db)
+    job = crud.create_tts_job(db, book.id, total=3)
+    crud.claim_next_tts_job(db, "worker-a", lease_seconds=60)
+    crud.claim_job_paragraphs(db, job, limit=1)
+
+    # 模拟 worker 崩溃：租约已过期
+    job = crud.get_tts_job(db, job.id)
+    job.lease_expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+
+    assert crud.reclaim_expired_tts_jobs(db) == 1
+    job = crud.get_tts_job(db, job.id)
+    assert job.status == "queued"
+    assert job.lease_owner is None
+    assert len(crud.get_pending_paragraphs(db, book.id)) == 3
+
+    reclaimed = crud.claim_next_tts_job(db, "worker-b", lease_seconds=60)
+    assert reclaimed is not None and reclaimed.lease_owner == "worker-b"
+
+
+def test_reclaim_keeps_live_claims():
+    """整本书任务租约过期时，同一本书上存活的单章任务领取的段落保持 processing"""
+    db = _make_db()
+    book = _make_book(db, paragraph_count=4)
+    book_job = crud.create_tts_job(db, book.id, scope="book", total=4)
+    chapter_job = crud.create_tts_job(db, book.id, scope="chapter", chapter_id=1, total=4)
+    crud.claim_next_tts_job(db, "worker-a", lease_seconds=60)
+    crud.claim_next_tts_job(db, "worker-b", lease_seconds=60)
+    live = crud.claim_job_paragraphs(db, chapter_job, limit=2)
+    crud.claim_job_paragraphs(db, book_job, limit=2)
+
+    book_job = crud.get_tts_job(db, book_job.id)
+    book_job.lease_expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+
+    assert crud.reclaim_expired_tts_jobs(db) == 1
+    processing = [p for p in crud.get_book_paragraphs(db, book.id) if p.tts_status == "processing"]
+    assert [p.id for p in processing] == [p.id for p in live]
+    assert {p.claimed_by_job_id for p in processing} == {chapter_job.id}
+    assert crud.reconcile_status_counters(db, book.id) == 0
+
+
+def test_release_after_lost_lease():
+    """租约已被回收并重新领取后，旧的执行不会放回新执行领取的段落"""
+    db = _make_db()
+    book = _make_book(db)
+    job = crud.create_tts_job(db, book.id, total=3)
+    crud.claim_next_tts_job(db, "worker-a#1", lease_seconds=60)
+    old_ids = [p.id for p in crud.claim_job_paragraphs(db, job)]
+
+    job = crud.get_tts_job(db, job.id)
+    job.lease_expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+    crud.reclaim_expired_tts_jobs(db)
+    crud.claim_next_tts_job(db, "worker-a#2", lease_seconds=60)
+    new_ids = [p.id for p in crud.claim_job_paragraphs(db, job)]
+    assert new_ids == old_ids
+
+    assert crud.release_claimed_paragraphs(db, old_ids, job.id, "worker-a#1") == 0
+    assert crud.renew_tts_job_lease(db, job.id, "worker-a#1", 60) is None
+    assert crud.release_claimed_paragraphs(db, new_ids, job.id, "worker-a#2") == 3
+
+
+def test_orphan_processing_reset():
+    """没有存活任务的 processing 段落在启动时被恢复"""
+    db = _make_db()
+    book = _make_book(db)
+    paragraph = crud.get_pending_paragraphs(db, book.id)[0]
+    crud.update_paragraph_status(db, paragraph.id, "processing")
+
+    assert crud.reset_orphan_processing_paragraphs(db) == 1
+    assert len(crud.get_pending_paragraphs(db, book.id)) == 3
+
+
+def test_pause_resume_cancel():
+    """暂停/恢复/取消只在允许的状态下生效"""
+    db = _make_db()
+    book = _make_book(db)
+    job = crud.create_tts_job(db, book.id)
+
+    assert crud.set_tts_job_status(db, job.id, "paused", ("queued", "running"))
+    assert crud.claim_next_tts_job(db, "worker-a", lease_seconds=60) is None
+    assert not crud.set_tts_job_status(db, job.id, "paused", ("queued", "running"))
+    assert crud.set_tts_job_status(db, job.id, "queued", ("paused",))
+    assert crud.set_tts_job_status(db, job.id, "cancelled", ("queued", "running", "paused"))
+    assert crud.get_active_tts_job(db, book.id, scope="book") is None
+
+
+def test_claim_by_priority():
+    """单章/选中段落任务优先于先入队的整本书任务被领取"""
+    db = _make_db()
+    book = _make_book(db)
+    book_job = crud.create_tts_job(db, book.id, scope="book", total=3)
+    chapter_job = crud.create_tts_job(db, book.id, scope="chapter", chapter_id=1, total=3)
+
+    assert crud.get_next_queued_tts_job(db).id == chapter_job.id
+    assert crud.claim_next_tts_job(db, "worker-a", lease_seconds=60).id == chapter_job.id
+    assert crud.claim_next_tts_job(db, "worker-a", lease_seconds=60).id == book_job.id
+
+
+def test_overlapping_jobs_claim_disjoint():
+    """同一本书上的整本书任务与单章任务领取到的段落互不重叠"""
+    db = _make_db()
+    book = _make_book(db, paragraph_count=6)
+    book_job = crud.create_tts_job(db, book.id, scope="book", total=6)
+    chapter_job = crud.create_tts_job(db, book.id, scope="chapter", chapter_id=1, total=6)
+
+    first = crud.claim_job_paragraphs(db, chapter_job, limit=4)
+    second = crud.claim_job_paragraphs(db, book_job, limit=4)
+
+    assert [p.tts_status for p in first + second] == ["processing"] * 6
+    assert not {p.id for p in first} & {p.id for p in second}
+    assert crud.claim_job_paragraphs(db, book_job) == []
+    assert crud.reconcile_status_counters(db, book.id) == 0
+
+    # 未开始合成的段落放回 pending
+    assert crud.release_claimed_paragraphs(db, [p.id for p in second], chapter_job.id) == 0
+    assert crud.release_claimed_paragraphs(db, [p.id for p in second], book_job.id) == 2
+    assert len(crud.get_pending_paragraphs(db, book.id)) == 2
+    assert crud.reconcile_status_counters(db, book.id) == 0
+
+
+def test_claim_single_update():
+    """一批段落只用一条 UPDATE ... RETURNING 领取"""
+    from sqlalchemy import event
+
+    db = _make_db()
+    book = _make_book(db, paragraph_count=6)
+    job = crud.create_tts_job(db, book.id, total=6)
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+
+    claimed = crud.claim_job_paragraphs(db, job, limit=4)
+
+    assert [p.paragraph_index for p in claimed] == [1, 2, 3, 4]
+    updates = [sql for sql in statements if sql.startswith("UPDATE paragraphs")]
+    assert len(updates) == 1 and "RETURNING" in updates[0]
+
+
+def test_overlapping_jobs_synthesize_once(tmp_path, monkeypatch):
+    """两个任务同时合成同一本书时，每个段落只请求一次引擎"""
+    from app.services import lazy_import, status_sink, tts, tts_queue
+    from app.services.tts_providers.mock import MockTTSProvider
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    for module in (tts_queue, status_sink, lazy_import):
+        monkeypatch.setattr(module, "SessionLocal", Session)
+    provider = MockTTSProvider(latency_ms=20, latency_per_char_ms=0, jitter_ms=0, failure_rate=0, seed=1)
+    monkeypatch.setattr(tts, "_default_provider", provider)
+    monkeypatch.setattr(tts, "AUDIO_DIR", tmp_path)
+    monkeypatch.setattr(tts.settings, "TTS_CACHE_ENABLED", False)
+
+    db = Session()
+    book = _make_book(db, paragraph_count=40)
+    book_job = crud.create_tts_job(db, book.id, scope="book", max_concurrent=4, total=40)
+    chapter_job = crud.create_tts_job(db, book.id, scope="chapter", chapter_id=1, max_concurrent=4, total=40)
+
+    worker = tts_queue.TTSJobWorker(max_jobs=2, poll_seconds=0.05)
+    worker.start()
+    try:
+        for _ in range(200):
+            db.expire_all()
+            statuses = {crud.get_tts_job(db, job.id).status for job in (book_job, chapter_job)}
+            if statuses == {"completed"}:
+                break
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+
+    assert statuses == {"completed"}
+    assert provider.requests == 40
+    assert {p.tts_status for p in crud.get_book_paragraphs(db, book.id)} == {"completed"}
+    jobs = [crud.get_tts_job(db, job.id) for job in (book_job, chapter_job)]
+    assert sum(job.completed for job in jobs) == 40
+    assert crud.reconcile_status_counters(db, book.id) == 0
+
+
+def test_heartbeat_stops_on_lost_lease(tmp_path, monkeypatch):
+    """租约被回收，或续约持续失败到租约到期时，心跳发出停止信号"""
+    import asyncio
+
+    from sqlalchemy.exc import OperationalError
+
+    from app.services import tts_queue
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(tts_queue, "SessionLocal", Session)
+    db = Session()
+    book = _make_book(db)
+    job = crud.create_tts_job(db, book.id, total=3)
+    crud.claim_next_tts_job(db, "worker-a#1", lease_seconds=60)
+    worker = tts_queue.TTSJobWorker(lease_seconds=60, heartbeat_seconds=0.02)
+
+    async def beat(owner):
+        stop = asyncio.Event()
+        await asyncio.wait_for(worker._heartbeat(job.id, owner, stop), timeout=5)
+        return stop.is_set()
+
+    # 续约正常时不停止
+    async def healthy():
+        stop = asyncio.Event()
+        task = asyncio.create_task(worker._heartbeat(job.id, "worker-a#1", stop))
+        await asyncio.sleep(0.1)
+        stopped = stop.is_set()
+        stop.set()
+        await task
+        return stopped
+
+    assert not asyncio.run(healthy())
+    # 租约已被其他执行持有
+    assert asyncio.run(beat("worker-a#0"))
+
+    # 数据库持续被锁：租约到期后停止
+    def locked(*args):
+        raise OperationalError("UPDATE", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(tts_queue.crud, "renew_tts_job_lease", locked)
+    worker.lease_seconds = 0.1
+    started = time.monotonic()
+    assert asyncio.run(beat("worker-a#1"))
+    assert time.monotonic() - started >= 0.1
+
+
+def test_worker_db_calls_off_event_loop(tmp_path, monkeypatch):
+    """worker 的数据库调用都不在事件循环线程中执行"""
+    import threading
+
+    from app.services import lazy_import, status_sink, tts, tts_queue
+    from tests.fakes import RecordingProvider
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    for module in (tts_queue, status_sink, lazy_import):
+        monkeypatch.setattr(module, "SessionLocal", Session)
+    monkeypatch.setattr(tts, "_default_provider", RecordingProvider())
+    monkeypatch.setattr(tts, "AUDIO_DIR", tmp_path)
+    monkeypatch.setattr(tts.settings, "TTS_CACHE_ENABLED", False)
+
+    threads = []
+    for name in (
+        "reset_orphan_processing_paragraphs", "reclaim_expired_tts_jobs", "claim_next_tts_job",
+        "get_tts_job", "claim_job_paragraphs", "release_claimed_paragraphs", "update_tts_job_counts",
+        "update_book_tts_progress", "release_tts_job", "renew_tts_job_lease",
+    ):
+        def recorded(*args, _func=getattr(crud, name), **kwargs):
+            threads.append(threading.current_thread().name)
+            return _func(*args, **kwargs)
+        monkeypatch.setattr(tts_queue.crud, name, recorded)
+
+    db = Session()
+    book = _make_book(db, paragraph_count=5)
+    job = crud.create_tts_job(db, book.id, total=5)
+    worker = tts_queue.TTSJobWorker(max_jobs=1, poll_seconds=0.05, heartbeat_seconds=0.01)
+    worker.start()
+    try:
+        for _ in range(200):
+            db.expire_all()
+            if crud.get_tts_job(db, job.id).status == "completed":
+                break
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+
+    assert crud.get_tts_job(db, job.id).status == "completed"
+    assert threads and "tts-job-worker" not in threads
@@ -0,0 +1,63 @@
+"""
+引擎合成结果 (TTSResult) 测试
+测试旧接口兼容、流式帧时长统计，以及合成后直接使用引擎返回的时长而不再读取音频文件
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services import tts
+from app.services.tts_providers.base import TTSResult
+from app.utils.audio import Mp3DurationCounter
+from tests.fakes import MP3_FRAME_MS as FRAME_MS, SILENT_MP3_FRAME as SILENT_FRAME, RecordingProvider
+
+
+def test_result_compat():
+    """可按 (success, timings) 解包、按布尔值判断，旧返回值可规范化"""
+    success, timings = TTSResult(True, [{"text": "a"}], 100)
+    assert success and timings == [{"text": "a"}]
+    assert not TTSResult(False)
+
+    assert TTSResult.from_value((True, None)) == TTSResult(True)
+    assert TTSResult.from_value(False) == TTSResult(False)
+
+
+def test_duration_counter():
+    """任意切块喂入都能累计完整帧；跳过 ID3 标签与 Xing/Info 标签帧"""
+    info_frame = SILENT_FRAME[:40] + b"Info" + SILENT_FRAME[44:]
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"\x00" * 5
+    data = id3 + info_frame + SILENT_FRAME * 50
+
+    for size in (1, 7, 144, 1000):
+        counter = Mp3DurationCounter()
+        for i in range(0, len(data), size):
+            counter.feed(data[i:i + size])
+        assert counter.frames == 50
+        assert counter.duration_ms == 50 * FRAME_MS
+
+
+def test_provider_duration_used(tmp_path, monkeypatch):
+    """引擎返回时长时不再读取音频文件；旧接口仍回退到读取文件"""
+    monkeypatch.setattr(tts, "AUDIO_DIR", tmp_path)
+    monkeypatch.setattr(tts.settings, "TTS_CACHE_ENABLED", False)
+    reads = []
+    monkeypatch.setattr(tts, "get_audio_duration", lambda path: reads.append(path) or 1)
+    task = tts.ParagraphTask(1, 1, "你好世界。", 0)
+
+    result = asyncio.run(tts._synthesize_task(task, "voice", RecordingProvider()))
+    assert result["audio_duration_ms"] == 5 * FRAME_MS
+    assert reads == []
+
+    result = asyncio.run(tts._synthesize_task(task, "voice", RecordingProvider(legacy=True)))
+    assert result["audio_duration_ms"] == 1
+    assert len(reads) == 1
+
+
+def test_chunked_duration(tmp_path, monkeypatch):
+    """分片合成的总时长为各片段时长之和"""
+    monkeypatch.setattr(tts.settings, "TTS_CHUNK_CHARS", 6)
+    result = asyncio.run(tts._generate_audio(RecordingProvider(), "第一句话。第二句话。", "voice", str(tmp_path / "p.mp3")))
+    assert result.duration_ms == 10 * FRAME_MS